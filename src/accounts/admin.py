@@ -1,14 +1,12 @@
 # -*- coding: utf-8 -*-
 
-from random import randint
 from django.utils.translation import ugettext_lazy as _
 from django.contrib import admin, messages
 from django.contrib.auth.models import User as UserBase, Group
 from django.contrib.auth.admin import UserAdmin as UserBaseAdmin, GroupAdmin as GroupBaseAdmin
-from django.db.models import Count
 from django.db.transaction import atomic
 from django.shortcuts import get_object_or_404
-from accounts.models import User, Tutorial
+from accounts.models import User, Tutorial, distribute_to_tutorials
 from accounts.forms import AdminUserCreationForm, AdminUserChangeForm
 
 import accounts.views
@@ -26,7 +24,7 @@ class UserAdmin(UserBaseAdmin):
     list_filter = ('groups', 'tutorial', 'is_staff', 'is_superuser', 'is_active', 'programme')
     search_fields = ['username', 'first_name', 'last_name', 'mat_number', 'email']
     date_hierarchy = 'date_joined'
-    actions = ['set_active', 'set_inactive', 'set_tutor', 'distribute_to_tutorials', 'export_users']
+    actions = ['set_active', 'set_inactive', 'set_tutor', 'distribute_to_tutorials', 'redistribute_to_tutorials', 'export_users']
     readonly_fields = ('last_login', 'date_joined', 'useful_links',)
     # exclude user_permissions
     fieldsets = (
@@ -81,19 +79,19 @@ class UserAdmin(UserBaseAdmin):
 
     @atomic
     def distribute_to_tutorials(self, request, queryset):
-        """ Distribute selected users evenly to all tutorials """
-        users = list(queryset)
-        for user in users:
-            # remove tutorial from users so we can find the tutorial with the least amount of users
-            user.tutorial = None
-            user.save()
-        while(users):
-            # get random user and put him in the least populated tutorial
-            user = users.pop(randint(0, len(users)-1))
-            tutorial = Tutorial.objects.annotate(Count('user')).order_by('user__count')[0]
-            user.tutorial = tutorial
-            user.save()
-        self.message_user(request, "All users were successfully distributed.")
+        """ Distribute selected users without tutorial evenly to all tutorials """
+        self.report_distribution(request, distribute_to_tutorials(queryset))
+
+    @atomic
+    def redistribute_to_tutorials(self, request, queryset):
+        """ Distribute all selected users evenly to all tutorials, ignoring their current tutorials """
+        self.report_distribution(request, distribute_to_tutorials(queryset, keep_existing=False))
+
+    def report_distribution(self, request, full):
+        if full:
+            self.message_user(request, "%i users could not be distributed, as all tutorials are full." % len(full), messages.WARNING)
+        else:
+            self.message_user(request, "All users were successfully distributed.")
 
     def export_users(self, request, queryset):
         from django.http import HttpResponse
@@ -167,7 +165,7 @@ admin.site.register(Group, GroupAdmin)
 
 class TutorialAdmin(admin.ModelAdmin):
     model = Tutorial
-    list_display = ('name', 'view_url', 'tutors_flat',)
+    list_display = ('name', 'view_url', 'tutors_flat', 'capacity',)
 
     class Media:
         css = {
@@ -10,11 +10,12 @@ from django.utils.translation import ugettext_lazy as _
 from django.contrib.auth.models import Group
 from django import forms
 from django.contrib.auth.forms import UserCreationForm as UserBaseCreationForm, UserChangeForm as UserBaseChangeForm
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage
 from django.utils.http import int_to_base36
 from django.utils.safestring import mark_safe
 from django import forms
 from configuration import get_settings
+from utilities.models import queue_mails
 
 from accounts.models import User
 
@@ -89,13 +90,13 @@ class MyRegistrationForm(UserBaseCreationForm):
 
         if get_settings().account_manual_validation:
             t = loader.get_template('registration/registration_email_manual_to_staff.html')
-            send_mail(_("Account activation on %s for %s (%s) ") % (settings.SITE_NAME, user.username, str(user)), t.render(c), None, [staff.email for staff in User.objects.all().filter(is_staff=True)])
+            staff_mail = EmailMessage(_("Account activation on %s for %s (%s) ") % (settings.SITE_NAME, user.username, str(user)), t.render(c), None, [staff.email for staff in User.objects.all().filter(is_staff=True)])
 
             t = loader.get_template('registration/registration_email_manual_to_user.html')
-            send_mail(_("Account activation on %s") % settings.SITE_NAME, t.render(c), None, [user.email])
+            queue_mails([staff_mail, EmailMessage(_("Account activation on %s") % settings.SITE_NAME, t.render(c), None, [user.email])])
         else:
             t = loader.get_template('registration/registration_email.html')
-            send_mail(_("Account activation on %s") % settings.SITE_NAME, t.render(c), None, [user.email])
+            queue_mails([EmailMessage(_("Account activation on %s") % settings.SITE_NAME, t.render(c), None, [user.email])])
 
         return user
 
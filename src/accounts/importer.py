@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+"""
+Bulk import of per-user data (tutorial assignments, user texts) from CSV files.
+
+The rows are read chunk by chunk. For every chunk, the users are fetched with one query
+and the changed users are written with one bulk_update, all in one transaction. Invalid
+rows are skipped and reported with their line numbers.
+"""
+
+import itertools
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from accounts.models import User, Tutorial
+
+class ImportRowError(Exception):
+    pass
+
+class ImportReport:
+    """ The outcome of an import: the number of rows applied and [(line number, message)...] for the others. """
+
+    def __init__(self):
+        self.succeeded = 0
+        self.not_present = 0
+        self.errors = []
+
+    @property
+    def failed(self):
+        return len(self.errors) - self.not_present
+
+def import_rows(rows, mat_column, apply, fields, chunk_size=500):
+    """ Calls apply(user, row) for every row with the user whose matriculation number is in column mat_column,
+    and saves the fields of the changed users. apply raises ImportRowError or ValidationError for invalid rows. """
+    report = ImportReport()
+    numbered_rows = numbered(rows)
+    with transaction.atomic():
+        while True:
+            chunk = list(itertools.islice(numbered_rows, chunk_size))
+            if not chunk:
+                return report
+            changed = import_chunk(chunk, mat_column, apply, fields, report)
+            User.objects.bulk_update(changed, fields)
+
+def numbered(rows):
+    """ Yields (line number, row) for the rows. For a csv.reader, this is the line in the file the row starts on, as quoted values may span several lines. """
+    if not hasattr(rows, 'line_num'):
+        yield from enumerate(rows, 1)
+        return
+    previous_line = 0
+    for row in rows:
+        yield (previous_line + 1, row)
+        previous_line = rows.line_num
+
+def import_chunk(chunk, mat_column, apply, fields, report):
+    attnames = [User._meta.get_field(field).attname for field in fields]
+    mat_numbers = {}
+    for (line, row) in chunk:
+        try:
+            mat_numbers[line] = int(row[mat_column])
+        except (IndexError, ValueError):
+            report.errors.append((line, "No matriculation number in column %d" % mat_column))
+    users = {}
+    for user in User.objects.filter(mat_number__in=set(mat_numbers.values())):
+        users.setdefault(user.mat_number, []).append(user)
+
+    changed = {}
+    for (line, row) in chunk:
+        if line not in mat_numbers:
+            continue
+        matching_users = users.get(mat_numbers[line], [])
+        if not matching_users:
+            report.not_present += 1
+            report.errors.append((line, "No user with matriculation number %d" % mat_numbers[line]))
+            continue
+        if len(matching_users) > 1:
+            report.errors.append((line, "Several users with matriculation number %d" % mat_numbers[line]))
+            continue
+        user = matching_users[0]
+        previous = [getattr(user, attname) for attname in attnames]
+        try:
+            apply(user, row)
+        except (ImportRowError, ValidationError, IndexError) as e:
+            # the user may be changed by another row
+            for (attname, value) in zip(attnames, previous):
+                setattr(user, attname, value)
+            report.errors.append((line, "; ".join(e.messages) if isinstance(e, ValidationError) else str(e)))
+            continue
+        changed[user.pk] = user
+        report.succeeded += 1
+    return list(changed.values())
+
+def import_tutorial_assignment(rows, name_column, mat_column):
+    """ Assigns the users to the tutorials named in the rows. """
+    tutorials = {}
+    for tutorial in Tutorial.objects.all():
+        tutorials.setdefault(tutorial.name, []).append(tutorial)
+
+    def assign(user, row):
+        matching_tutorials = tutorials.get(row[name_column], [])
+        if len(matching_tutorials) != 1:
+            raise ImportRowError("%s tutorial named %s" % ("No" if not matching_tutorials else "Several", row[name_column]))
+        user.tutorial = matching_tutorials[0]
+    return import_rows(rows, mat_column, assign, ['tutorial'])
+
+def import_user_texts(rows):
+    """ Sets the user texts to the second column of the rows. """
+    other_fields = [field.name for field in User._meta.fields if field.name != 'user_text']
+    def set_text(user, row):
+        user.user_text = row[1]
+        user.clean_fields(exclude=other_fields)
+    return import_rows(rows, 0, set_text, ['user_text'])
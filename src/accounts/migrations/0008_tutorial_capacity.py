@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_custom_user_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tutorial',
+            name='capacity',
+            field=models.PositiveIntegerField(blank=True, help_text='The maximum number of students distributed to the tutorial. Leave empty for no limit.', null=True),
+        ),
+    ]
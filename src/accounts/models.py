@@ -2,19 +2,22 @@ import datetime
 import re
 import hashlib
 import random
+import heapq
 
 from functools import reduce
 
 from django.utils.translation import ugettext_lazy as _
 from django.conf import settings
-from django.db import models, utils
-from django.contrib.auth.models import User as BasicUser, UserManager
-from django.db.models import signals
+from django.db import models, utils, connection
+from django.contrib.auth.models import User as BasicUser, UserManager, Group
+from django.contrib.auth.hashers import make_password
+from django.db.models import signals, Count
 from django.core.validators import RegexValidator
 from django.core import serializers
 from django.db.transaction import atomic
 
 from configuration import get_settings
+from utilities.queries import chunks
 
 
 def validate_mat_number(value):
@@ -198,6 +201,7 @@ class Tutorial(models.Model):
     name = models.CharField(max_length=100, blank=True, help_text=_("The name of the tutorial"))
     # A Tutorial may have many tutors as well as a Tutor may have multiple tutorials
     tutors = models.ManyToManyField('User', limit_choices_to = {'groups__name': 'Tutor'}, related_name='tutored_tutorials', help_text = _("The tutors in charge of the tutorial."))
+    capacity = models.PositiveIntegerField(null=True, blank=True, help_text=_("The maximum number of students distributed to the tutorial. Leave empty for no limit."))
 
     def tutors_flat(self):
         return reduce(lambda x, y: x + ', ' + y.get_full_name(), self.tutors.all(), '')[2:]
@@ -205,3 +209,90 @@ class Tutorial(models.Model):
 
     def __str__(self):
         return("%s: %s" % (self.name, self.tutors_flat()))
+
+
+def sync_group_members(group, mat_numbers, remove_others=False, create_users=False):
+    """ Adds the users with the matriculation numbers to the group, creating stub users (in the group User)
+    for unknown numbers if create_users is set, and removes all other users from the group if remove_others is set.
+    Works on the listed numbers in chunks and bulk operations, so the number of queries grows with the list only,
+    not with the number of users. Returns the numbers of users added, removed, already in the group and created. """
+    Membership = BasicUser.groups.through
+    mat_numbers = sorted(set(mat_numbers))
+    with atomic():
+        known_mat_numbers = set()
+        listed = set()
+        for chunk in chunks(mat_numbers):
+            for (user_id, mat_number) in User.objects.filter(mat_number__in=chunk).values_list('id', 'mat_number'):
+                known_mat_numbers.add(mat_number)
+                listed.add(user_id)
+
+        new_mat_numbers = [mat_number for mat_number in mat_numbers if mat_number not in known_mat_numbers] if create_users else []
+        if new_mat_numbers:
+            created = create_stub_users(new_mat_numbers)
+            user_group = Group.objects.get(name='User')
+            if user_group != group:
+                Membership.objects.bulk_create([Membership(user_id=user_id, group_id=user_group.id) for user_id in created], batch_size=500)
+            listed.update(created)
+
+        members = set()
+        for chunk in chunks(sorted(listed)):
+            members.update(Membership.objects.filter(group=group, user_id__in=chunk).values_list('user_id', flat=True))
+        added = listed - members
+        Membership.objects.bulk_create([Membership(user_id=user_id, group_id=group.id) for user_id in sorted(added)], batch_size=500)
+        removed = 0
+        if remove_others:
+            (removed, _) = Membership.objects.filter(group=group).exclude(user__user__mat_number__in=mat_numbers).delete()
+    return {'added': len(added), 'removed': removed, 'already': len(members), 'created': len(new_mat_numbers)}
+
+def create_stub_users(mat_numbers):
+    """ Creates users named after their matriculation numbers, without password and email, and returns their ids.
+    bulk_create does not support model inheritance, so the rows of both tables are inserted by hand. """
+    password = make_password(None)
+    now = datetime.datetime.now()
+    BasicUser.objects.bulk_create([BasicUser(username=str(mat_number), password=password, email='', date_joined=now) for mat_number in mat_numbers], batch_size=500)
+    ids = {}
+    for chunk in chunks([str(mat_number) for mat_number in mat_numbers]):
+        ids.update((username, user_id) for (user_id, username) in BasicUser.objects.filter(username__in=chunk).values_list('id', 'username'))
+    rows = [(ids[str(mat_number)], mat_number, '') for mat_number in mat_numbers]
+    opts = User._meta
+    sql = "INSERT INTO %s (%s, %s, %s) VALUES (%%s, %%s, %%s)" % (
+        connection.ops.quote_name(opts.db_table),
+        connection.ops.quote_name(opts.get_field('user_ptr').column),
+        connection.ops.quote_name(opts.get_field('mat_number').column),
+        connection.ops.quote_name(opts.get_field('activation_key').column))
+    with connection.cursor() as cursor:
+        for chunk in chunks(rows):
+            cursor.executemany(sql, chunk)
+    return [row[0] for row in rows]
+
+def distribute_to_tutorials(users, keep_existing=True):
+    """ Assigns the users, in random order, to the tutorial with the fewest students which is not full yet.
+    Users who are in a tutorial stay there, unless keep_existing is unset. The tutorials are kept in a heap
+    ordered by their size, and the users are saved with one bulk_update.
+    Returns the users who could not be assigned, as all tutorials are full. """
+    users = list(users)
+    tutorials = list(Tutorial.objects.annotate(size=Count('user')).values_list('id', 'size', 'capacity'))
+    sizes = dict((tutorial_id, size) for (tutorial_id, size, capacity) in tutorials)
+    capacities = dict((tutorial_id, capacity) for (tutorial_id, size, capacity) in tutorials)
+    if not keep_existing:
+        for user in users:
+            if user.tutorial_id is not None:
+                sizes[user.tutorial_id] -= 1
+                user.tutorial = None
+    unassigned = [user for user in users if user.tutorial_id is None]
+    random.shuffle(unassigned)
+
+    heap = [(size, tutorial_id) for (tutorial_id, size) in sizes.items()]
+    heapq.heapify(heap)
+    full = []
+    for user in unassigned:
+        while heap and capacities[heap[0][1]] is not None and heap[0][0] >= capacities[heap[0][1]]:
+            heapq.heappop(heap)
+        if not heap:
+            full.append(user)
+            continue
+        (size, tutorial_id) = heap[0]
+        user.tutorial_id = tutorial_id
+        heapq.heapreplace(heap, (size + 1, tutorial_id))
+    User.objects.bulk_update(users, ['tutorial'], batch_size=500)
+    return full
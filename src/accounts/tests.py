@@ -1,5 +1,6 @@
 from utilities.TestSuite import TestCase
-from accounts.models import User
+from accounts.models import User, Tutorial, sync_group_members
+from utilities.queries import QueryCounter
 from django.contrib.auth.models import Group
 from django.urls import reverse
 from io import StringIO
@@ -51,7 +52,7 @@ class TestViews(TestCase):
               'remove_others' : False,
               'create_users': False},
             follow=True)
-        self.assertContains(response, "1 users added to group test, 0 removed, 0 already in group. 0 new users created.")
+        self.assertContains(response, "1 users added to group test, 0 removed, 0 already in group. 0 new users created")
         self.assertEqual(set( u.mat_number for u in User.objects.filter(groups = self.testgroup)),
                              set( u.mat_number for u in [user, user2]))
 
@@ -71,7 +72,7 @@ class TestViews(TestCase):
               'remove_others' : True,
               'create_users': False},
             follow=True)
-        self.assertContains(response, "1 users added to group test, 1 removed, 0 already in group. 0 new users created.")
+        self.assertContains(response, "1 users added to group test, 1 removed, 0 already in group. 0 new users created")
         self.assertEqual(set( u.mat_number for u in User.objects.filter(groups = self.testgroup)),
                              set( u.mat_number for u in [user]))
 
@@ -92,9 +93,70 @@ class TestViews(TestCase):
               'remove_others' : True,
               'create_users': True},
             follow=True)
-        self.assertContains(response, "2 users added to group test, 1 removed, 0 already in group. 1 new users created.")
+        self.assertContains(response, "2 users added to group test, 1 removed, 0 already in group. 1 new users created")
 
         user3 = User.objects.get(mat_number = 33333)
 
         self.assertEqual(set( u.mat_number for u in User.objects.filter(groups = self.testgroup)),
                              set( u.mat_number for u in [user, user3]))
+
+    def test_sync_group_members_queries(self):
+        with QueryCounter() as small:
+            sync_group_members(self.testgroup, range(40000, 40010), remove_others=True, create_users=True)
+        with QueryCounter() as large:
+            counts = sync_group_members(self.testgroup, range(50000, 51200), remove_others=True, create_users=True)
+        self.assertEqual(counts, {'added': 1200, 'removed': 10, 'already': 0, 'created': 1200})
+        self.assertEqual(User.objects.filter(groups = self.testgroup).count(), 1200)
+        self.assertEqual(User.objects.filter(groups__name = 'User', mat_number__gte = 50000).count(), 1200)
+        self.assertFalse(User.objects.get(mat_number = 50000).has_usable_password())
+        # a few more chunks, but not a query per user
+        self.assertLess(large.count, small.count + 20)
+
+    def test_import_tutorial_assignment(self):
+        tutorial = Tutorial.objects.create(name = 'Tutorial 2')
+        user2 = User.objects.create_user('user2', 'user@praktomat.com', 'demo')
+        user2.mat_number = 22222
+        user2.save()
+        f = StringIO("Tutorial 2;11111\nTutorial 2;22222\nTutorial 3;22222\nTutorial 2;44444\nTutorial 2;abc\n")
+        f.name = "foo.csv"
+        response = self.client.post(reverse('admin:import_tutorial_assignment'),
+            {'csv_file': f, 'delimiter': ';', 'quotechar': '|', 'name_coloum': 0, 'mat_coloum': 1}, follow=True)
+        self.assertContains(response, "2 assignments were imported successfully, 1 users not found, 2 failed.")
+        self.assertContains(response, "Line 3: No tutorial named Tutorial 3")
+        self.assertContains(response, "Line 5: No matriculation number in column 1")
+        self.assertEqual(set(tutorial.user_set.all()), set([User.objects.get(username = 'user'), user2]))
+
+    def test_import_user_texts(self):
+        f = StringIO("11111;|Good\nluck!|\n11111;%s\n" % ("x" * 501))
+        f.name = "foo.csv"
+        response = self.client.post(reverse('admin:import_user_texts'),
+            {'csv_file': f, 'delimiter': ';', 'quotechar': '|'}, follow=True)
+        self.assertContains(response, "1 user texts were imported successfully, 0 users not found, 1 failed.")
+        # the lines of the file, not the rows
+        self.assertContains(response, "Line 3: ")
+        self.assertEqual(User.objects.get(username = 'user').user_text, "Good\nluck!")
+
+    def test_distribute_to_tutorials(self):
+        tutorial1 = Tutorial.objects.get(name = 'Tutorial 1')
+        tutorial2 = Tutorial.objects.create(name = 'Tutorial 2')
+        tutorial3 = Tutorial.objects.create(name = 'Tutorial 3', capacity = 2)
+        users = [User.objects.create_user('student%d' % i, '', 'demo') for i in range(9)]
+        for user in users:
+            user.groups.add(Group.objects.get(name = 'User'))
+        selected = User.objects.filter(username__startswith = 'student') | User.objects.filter(username = 'user')
+        response = self.client.post(reverse('admin:accounts_user_changelist'),
+            {'action': 'distribute_to_tutorials', '_selected_action': [user.id for user in selected]}, follow=True)
+        self.assertContains(response, "All users were successfully distributed.")
+        # the user in tutorial 1 stays there
+        self.assertEqual(User.objects.get(username = 'user').tutorial, tutorial1)
+        self.assertEqual(sorted(tutorial.user_set.count() for tutorial in [tutorial1, tutorial2, tutorial3]), [2, 4, 4])
+        self.assertEqual(tutorial3.user_set.count(), 2)
+
+        tutorial1.capacity = 2
+        tutorial1.save()
+        tutorial2.capacity = 2
+        tutorial2.save()
+        response = self.client.post(reverse('admin:accounts_user_changelist'),
+            {'action': 'redistribute_to_tutorials', '_selected_action': [user.id for user in selected]}, follow=True)
+        self.assertContains(response, "4 users could not be distributed, as all tutorials are full.")
+        self.assertEqual([tutorial.user_set.count() for tutorial in [tutorial1, tutorial2, tutorial3]], [2, 2, 2])
@@ -7,17 +7,20 @@ from django.urls import reverse
 from django.template import Template, loader
 from django.conf import settings
 from accounts.forms import MyRegistrationForm, UserChangeForm, ImportForm, ImportTutorialAssignmentForm, ImportMatriculationListForm, ImportUserTextsForm
-from accounts.models import User, Tutorial
+from accounts.models import User, Tutorial, sync_group_members
 from accounts.decorators import local_user_required
+from accounts import importer
 from django.contrib.auth.models import Group
 from django.contrib.auth.decorators import login_required
 from django.contrib.sites.requests import RequestSite
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.utils.http import int_to_base36
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage
 from django.utils.translation import ugettext_lazy as _
 from configuration import get_settings
+from utilities.models import queue_mails
+from utilities.queries import QueryCounter
 
 import csv
 import io
@@ -58,7 +61,7 @@ def activation_allow(request, user_id):
         'activation_key': user.activation_key,
         'expiration_days': get_settings().acount_activation_days,
     }
-    send_mail(_("Account activation on %s") % settings.SITE_NAME, t.render(c), None, [user.email])
+    queue_mails([EmailMessage(_("Account activation on %s") % settings.SITE_NAME, t.render(c), None, [user.email])])
     return render(request, 'registration/registration_activation_allowed.html', { 'new_user': user, })
 
 @local_user_required
@@ -94,6 +97,7 @@ def import_user(request):
                 imported_user = User.import_user(form.files['file'])
                 messages.success(request, "The import was successfull. %i users imported." % imported_user.count())
                 if form.cleaned_data['require_reactivation']:
+                    activation_mails = []
                     for user in [user for user in imported_user if user.is_active]:
                         user.is_active = False
                         user.set_new_activation_key()
@@ -111,7 +115,8 @@ def import_user(request):
                                 'activation_key': user.activation_key,
                                 'expiration_days': get_settings().acount_activation_days,
                             }
-                            send_mail(_("Account activation on %s") % settings.SITE_NAME, t.render(c), None, [user.email])
+                            activation_mails.append(EmailMessage(_("Account activation on %s") % settings.SITE_NAME, t.render(c), None, [user.email]))
+                    queue_mails(activation_mails)
                 return HttpResponseRedirect(reverse('admin:accounts_user_changelist'))
             except:
                 raise
@@ -128,29 +133,14 @@ def import_tutorial_assignment(request):
     if request.method == 'POST':
         form = ImportTutorialAssignmentForm(request.POST, request.FILES)
         if form.is_valid():
-            file = form.files['csv_file']
-            file.seek(0)
+            reader = csv_reader(form)
             try:
-                reader = csv.reader(io.StringIO(file.read().decode('utf-8')), delimiter=str(form.cleaned_data['delimiter']), quotechar=str(form.cleaned_data['quotechar']))
-            except UnicodeDecodeError as e:
+                report = importer.import_tutorial_assignment(reader, form.cleaned_data['name_coloum'], form.cleaned_data['mat_coloum'])
+            except (UnicodeDecodeError, csv.Error) as e:
                 messages.error(request, "Import failed: %s" % str(e))
                 return render(request, 'admin/accounts/user/import_tutorial_assignment.html', {'form': form, 'title':"Import tutorial assignment"  })
-            succeeded = not_present = failed = 0
-            for row in reader:
-                try:
-                    matching_users = User.objects.filter(mat_number = row[form.cleaned_data['mat_coloum']])
-                    if not matching_users.exists():
-                        not_present += 1
-                        continue
-                    user = matching_users.get()
-                    tutorial = Tutorial.objects.get(name = row[form.cleaned_data['name_coloum']])
-                    user.tutorial = tutorial
-                    user.save()
-                    succeeded += 1
-                except:
-                    failed += 1
-            #assert False
-            messages.warning(request, "%i assignments were imported successfully, %i users not found, %i failed." % (succeeded, not_present, failed))
+            messages.warning(request, "%i assignments were imported successfully, %i users not found, %i failed." % (report.succeeded, report.not_present, report.failed))
+            report_errors(request, report)
             return HttpResponseRedirect(reverse('admin:accounts_user_changelist'))
     else:
         form = ImportTutorialAssignmentForm()
@@ -162,34 +152,34 @@ def import_user_texts(request):
     if request.method == 'POST':
         form = ImportUserTextsForm(request.POST, request.FILES)
         if form.is_valid():
-            file = form.files['csv_file']
-            file.seek(0)
+            reader = csv_reader(form)
             try:
-                reader = csv.reader(io.StringIO(file.read().decode('utf-8')), delimiter=str(form.cleaned_data['delimiter']), quotechar=str(form.cleaned_data['quotechar']))
-            except UnicodeDecodeError as e:
+                report = importer.import_user_texts(reader)
+            except (UnicodeDecodeError, csv.Error) as e:
                 messages.error(request, "Import failed: %s" % str(e))
                 return render(request, 'admin/accounts/user/import_user_texts.html', {'form': form, 'title':"Import user texts"  })
-            succeeded = not_present = failed = 0
-            for row in reader:
-                try:
-                    matching_users = User.objects.filter(mat_number = row[0])
-                    if not matching_users.exists():
-                        not_present += 1
-                        continue
-                    user = matching_users.get()
-                    user.user_text = row[1]
-                    user.clean_fields()
-                    user.save()
-                    succeeded += 1
-                except:
-                    failed += 1
-            #assert False
-            messages.warning(request, "%i user texts were imported successfully, %i users not found, %i failed." % (succeeded, not_present, failed))
+            messages.warning(request, "%i user texts were imported successfully, %i users not found, %i failed." % (report.succeeded, report.not_present, report.failed))
+            report_errors(request, report)
             return HttpResponseRedirect(reverse('admin:accounts_user_changelist'))
     else:
         form = ImportUserTextsForm()
     return render(request, 'admin/accounts/user/import_user_texts.html', {'form': form, 'title':"Import user texts"  })
 
+def csv_reader(form):
+    """ Reads the uploaded csv_file of the form line by line, instead of decoding it as a whole. """
+    file = form.files['csv_file']
+    file.seek(0)
+    return csv.reader(io.TextIOWrapper(file, encoding='utf-8', newline=''), delimiter=str(form.cleaned_data['delimiter']), quotechar=str(form.cleaned_data['quotechar']))
+
+# The number of errors of an import shown, the others are summarised
+MAX_REPORTED_IMPORT_ERRORS = 50
+
+def report_errors(request, report):
+    for (line, message) in report.errors[:MAX_REPORTED_IMPORT_ERRORS]:
+        messages.error(request, "Line %i: %s" % (line, message))
+    if len(report.errors) > MAX_REPORTED_IMPORT_ERRORS:
+        messages.error(request, "%i more lines could not be imported." % (len(report.errors) - MAX_REPORTED_IMPORT_ERRORS))
+
 @staff_member_required
 def import_matriculation_list(request, group_id):
     """ Set the group membership of all users according to an uploaded list of matriculation numbers. """
@@ -200,36 +190,13 @@ def import_matriculation_list(request, group_id):
             file = form.files['mat_number_file']
             file.seek(0)
             reader = csv.reader(io.StringIO(file.read().decode('utf-8')))
-            mats = set(int(row[0]) for row in reader)
-
-            nr_already = nr_added = nr_removed = nr_new_users = 0
-
-            # first create all users, if required
-            if form.cleaned_data['create_users']:
-                existing_mats = set(User.objects.values_list('mat_number', flat=True))
-                for new in mats - existing_mats:
-                    user = User.objects.create_user(new, '')
-                    user.groups.add(Group.objects.get(name='User'))
-                    user.mat_number = new
-                    user.save()
-                    nr_new_users += 1
-
-            for u in User.objects.all():
-                if u.mat_number in mats:
-                    if u.groups.filter(id=group.pk).exists():
-                        nr_already += 1
-                    else:
-                        u.groups.add(group)
-                        nr_added += 1
-                else:
-                    if form.cleaned_data['remove_others']:
-                        if u.groups.filter(id=group.pk).exists():
-                            u.groups.remove(group)
-                            nr_removed += 1
-                u.save()
+            mats = set(int(row[0]) for row in reader if row and row[0].strip())
+
+            with QueryCounter() as queries:
+                counts = sync_group_members(group, mats, form.cleaned_data['remove_others'], form.cleaned_data['create_users'])
             messages.success(request,
                 ("%i users added to group %s, %i removed, %i already in group. "+
-                "%i new users created.") % (nr_added, group.name, nr_removed, nr_already, nr_new_users))
+                "%i new users created (%i database queries).") % (counts['added'], group.name, counts['removed'], counts['already'], counts['created'], queries.count))
             return HttpResponseRedirect(reverse('admin:auth_group_change', args=[group_id]))
     else:
         form = ImportMatriculationListForm()
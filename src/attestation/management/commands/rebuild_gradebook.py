@@ -0,0 +1,14 @@
+"""
+Management utility to rebuild the gradebook read by the rating overviews.
+"""
+
+from django.core.management.base import BaseCommand
+
+from attestation.models import GradebookEntry, rebuild_gradebook
+
+class Command(BaseCommand):
+    help = 'Rebuild the gradebook from all final solutions and attestations, e.g. after changing them in bulk outside of the Praktomat.'
+
+    def handle(self, *args, **options):
+        rebuild_gradebook()
+        self.stdout.write("The gradebook has %d entries.\n" % GradebookEntry.objects.count())
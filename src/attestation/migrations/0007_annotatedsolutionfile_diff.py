@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attestation', '0006_limit_choices_to'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='annotatedsolutionfile',
+            name='anotated',
+            field=models.NullBooleanField(editable=False),
+        ),
+        migrations.AddField(
+            model_name='annotatedsolutionfile',
+            name='diff',
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
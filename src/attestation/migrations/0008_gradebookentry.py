@@ -0,0 +1,61 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_gradebook(apps, schema_editor):
+    """ Creates the entries like attestation.models.rebuild_gradebook did when this migration was written. """
+    GradebookEntry = apps.get_model('attestation', 'GradebookEntry')
+    Solution = apps.get_model('solutions', 'Solution')
+    Attestation = apps.get_model('attestation', 'Attestation')
+    entries = {}
+    def entry(user_id, task_id):
+        if (user_id, task_id) not in entries:
+            entries[user_id, task_id] = GradebookEntry(user_id=user_id, task_id=task_id)
+        return entries[user_id, task_id]
+
+    for solution in Solution.objects.filter(final=True).only('id', 'author_id', 'task_id'):
+        entry(solution.author_id, solution.task_id).solution_id = solution.id
+    latest = {}
+    latest_published = {}
+    for (attestation_id, published, final_grade_id, user_id, task_id) in Attestation.objects.order_by('id').values_list('id', 'published', 'final_grade_id', 'solution__author_id', 'solution__task_id'):
+        latest[user_id, task_id] = (attestation_id, final_grade_id)
+        if published:
+            latest_published[user_id, task_id] = (attestation_id, final_grade_id)
+    for ((user_id, task_id), (attestation_id, final_grade_id)) in latest.items():
+        if final_grade_id is not None:
+            entry(user_id, task_id).latest_attestation_id = attestation_id
+    for ((user_id, task_id), (attestation_id, final_grade_id)) in latest_published.items():
+        if final_grade_id is not None:
+            entry(user_id, task_id).attestation_id = attestation_id
+
+    GradebookEntry.objects.bulk_create([e for e in entries.values() if e.solution_id is not None or e.latest_attestation_id is not None], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_custom_user_text'),
+        ('solutions', '0008_solutionfile_encoding'),
+        ('tasks', '0008_on_delete_set_null'),
+        ('attestation', '0007_annotatedsolutionfile_diff'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradebookEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attestation', models.ForeignKey(help_text='The latest published attestation, if it is graded.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='attestation.Attestation')),
+                ('latest_attestation', models.ForeignKey(help_text='The latest attestation, published or not, if it is graded.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='attestation.Attestation')),
+                ('solution', models.ForeignKey(help_text='The final solution.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='solutions.Solution')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tasks.Task')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='accounts.User')),
+            ],
+            options={
+                'unique_together': {('user', 'task')},
+            },
+        ),
+        migrations.RunPython(build_gradebook, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.conf import settings
 from tasks.models import Task
 from solutions.models import Solution, SolutionFile
@@ -10,6 +12,7 @@ from django.contrib.sites.requests import RequestSite
 from django.contrib import messages
 from datetime import datetime
 from utilities.nub import nub
+from utilities.models import queue_mails
 import difflib
 import tempfile
 import zipfile
@@ -39,28 +42,49 @@ class Attestation(models.Model):
         self.published = True
         self.published_on = datetime.now()
         self.save()
+        queue_mails(Attestation.publication_emails([self], request, by))
 
-        email = self.solution.author.email
-        if not email:
-            return
-
-        # Send confirmation email
+    @classmethod
+    def publish_all(cls, attestations, request, by):
+        """ Publishes the attestations with a single update per chunk and queues the emails to the users. """
+        attestations = list(attestations.select_related('solution__author', 'solution__task', 'author'))
+        now = datetime.now()
+        with transaction.atomic():
+            for i in range(0, len(attestations), 500):
+                cls.objects.filter(id__in=[attestation.id for attestation in attestations[i:i + 500]]).update(published=True, published_on=now)
+            for attestation in attestations:
+                attestation.published = True
+                attestation.published_on = now
+            # update() sends no signals
+            attestations_published(attestations)
+            queue_mails(cls.publication_emails(attestations, request, by))
+
+    @staticmethod
+    def publication_emails(attestations, request, by):
+        """ The emails telling the users about their published attestations. """
         t = loader.get_template('attestation/attestation_email.html')
+        invisible_attestor = get_settings().invisible_attestor
+        attestation_reply_to = get_settings().attestation_reply_to
         c = {
-            'attest': self,
             'protocol': request.is_secure() and "https" or "http",
             'domain': RequestSite(request).domain,
             'site_name': settings.SITE_NAME,
             'by': by,
-            'invisible_attestor': get_settings().invisible_attestor,
+            'invisible_attestor': invisible_attestor,
         }
-        subject = _("New attestation for your solution of the task '%s'") % self.solution.task
-        body = t.render(c)
-        reply_to = ([self.author.email] if self.author.email and (not get_settings().invisible_attestor) else []) \
-                 + ([get_settings().attestation_reply_to]  if get_settings().attestation_reply_to else [])
-        headers = {'Reply-To': ', '.join(reply_to)} if reply_to else None
-        email = EmailMessage(subject, body, None, (email,), headers = headers)
-        email.send()
+        emails = []
+        for attest in attestations:
+            email = attest.solution.author.email
+            if not email:
+                continue
+            c['attest'] = attest
+            subject = _("New attestation for your solution of the task '%s'") % attest.solution.task
+            body = t.render(c)
+            reply_to = ([attest.author.email] if attest.author.email and (not invisible_attestor) else []) \
+                     + ([attestation_reply_to]  if attestation_reply_to else [])
+            headers = {'Reply-To': ', '.join(reply_to)} if reply_to else None
+            emails.append(EmailMessage(subject, body, None, (email,), headers = headers))
+        return emails
 
     def withdraw(self, request, by):
         self.published = False
@@ -92,8 +116,7 @@ class Attestation(models.Model):
         body = t.render(c)
         recipients = emails[0:1]
         bcc_recipients = emails[1:]
-        email = EmailMessage(subject, body, None, recipients, bcc_recipients)
-        email.send()
+        queue_mails([EmailMessage(subject, body, None, recipients, bcc_recipients)])
 
     @classmethod
     def export_Attestation(cls, qureyset):
@@ -103,9 +126,10 @@ class Attestation(models.Model):
         # fetch tasks, media objects, checker and serialize
         attestation_objects = list(qureyset)
         solution_objects = list([attestation.solution for attestation in attestation_objects])
-        annotatedsolutionfiles_objects = list(AnnotatedSolutionFile.objects.filter(attestation__in = attestation_objects).defer('content'))
+        annotatedsolutionfiles_objects = list(AnnotatedSolutionFile.objects.filter(attestation__in = attestation_objects).defer('content', 'diff'))
         for annotatedsolutionfile in annotatedsolutionfiles_objects:
             annotatedsolutionfile.content = ""
+            annotatedsolutionfile.diff = ""
             annotatedsolutionfile._meta.model_name = "annotatedsolutionfile" # *sigh*
         solutionfile_objects = list([annotatedsolutionfile.solution_file for annotatedsolutionfile in annotatedsolutionfiles_objects])
 
@@ -189,18 +213,68 @@ class AnnotatedSolutionFile(models.Model):
     attestation = models.ForeignKey(Attestation, on_delete=models.CASCADE)
     solution_file = models.ForeignKey(SolutionFile, on_delete=models.CASCADE)
     content = models.TextField(help_text = _('The content of the solution file annotated by the tutor.'), blank = True)
+    # Computed on save(): Whether the tutor changed the content, and if so, the changed lines of the diff shown by content_diff()
+    anotated = models.NullBooleanField(editable = False)
+    diff = models.TextField(blank = True, editable = False)
 
-    def has_anotations(self):
-        original = self.solution_file.content().replace("\r\n", "\n").replace("\r", "\n")
+    def save(self, *args, **kwargs):
+        self.update_diff()
+        super(AnnotatedSolutionFile, self).save(*args, **kwargs)
+
+    def original(self):
+        return self.solution_file.content().replace("\r\n", "\n").replace("\r", "\n")
+
+    def update_diff(self):
+        """ Computes the diff once, instead of on every view of the attestation. Only annotated files store it,
+        and only its hunks: every run of changed lines, after a line "@@ <number of the preceding original lines>". """
+        original = self.original()
         anotated = self.content.replace("\r\n", "\n").replace("\r", "\n")
-        return not original == anotated
+        self.anotated = not original == anotated
+        hunks = []
+        if self.anotated:
+            line = 0
+            in_hunk = False
+            for l in difflib.Differ().compare(original.splitlines(0), anotated.splitlines(0)):
+                l = l.strip("\n")
+                if l.startswith("  "):
+                    line += 1
+                    in_hunk = False
+                    continue
+                if not in_hunk:
+                    hunks.append("@@ %d" % line)
+                    in_hunk = True
+                if l.startswith("- "):
+                    line += 1
+                hunks.append(l)
+        self.diff = "\n".join(hunks)
+
+    def has_anotations(self):
+        if self.anotated is None:
+            # stored before the diff was computed on save()
+            self.update_diff()
+            if self.pk is not None:
+                AnnotatedSolutionFile.objects.filter(pk=self.pk).update(anotated=self.anotated, diff=self.diff)
+        return self.anotated
 
     def content_diff(self):
-        d = difflib.Differ()
-        original = self.solution_file.content().replace("\r\n", "\n").replace("\r", "\n").splitlines(0)
-        anotated = self.content.replace("\r\n", "\n").replace("\r", "\n").splitlines(0)
-        result = list(d.compare(original, anotated))
-        return "\n".join([l.strip("\n") for l in result])
+        """ The diff of the original and the annotated file, as difflib.Differ reports it. """
+        original = self.original().splitlines(0)
+        if not self.has_anotations():
+            # what difflib.Differ reports for unchanged lines
+            return "\n".join(["  " + l for l in original])
+        result = []
+        line = 0
+        for l in self.diff.split("\n"):
+            if l.startswith("@@ "):
+                hunk_start = int(l[3:])
+                result.extend("  " + o for o in original[line:hunk_start])
+                line = hunk_start
+            else:
+                if l.startswith("- "):
+                    line += 1
+                result.append(l)
+        result.extend("  " + o for o in original[line:])
+        return "\n".join(result)
 
     def __str__(self):
         return self.solution_file.__str__()
@@ -272,3 +346,119 @@ def model_fields_equal(this, that):
     this_fields = [field.name for field in this._meta.fields]
     that_fields = [field.name for field in that._meta.fields]
     return this_fields == that_fields and attributes_equal(this, that, this_fields)
+
+
+class GradebookEntry(models.Model):
+    """ The final solution of a user for a task and its latest graded attestations. Kept up to date by
+    update_gradebook_entry whenever a solution or attestation changes, so that the rating overviews
+    don't have to search all solutions and attestations. The final grade options are applied when reading. """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    task = models.ForeignKey(Task, on_delete=models.CASCADE)
+    solution = models.ForeignKey(Solution, null=True, related_name='+', on_delete=models.SET_NULL, help_text = _('The final solution.'))
+    attestation = models.ForeignKey(Attestation, null=True, related_name='+', on_delete=models.SET_NULL, help_text = _('The latest published attestation, if it is graded.'))
+    latest_attestation = models.ForeignKey(Attestation, null=True, related_name='+', on_delete=models.SET_NULL, help_text = _('The latest attestation, published or not, if it is graded.'))
+
+    class Meta:
+        unique_together = ('user', 'task')
+
+def graded(attestation):
+    """ Attestations without a grade are shown as if there was no attestation. """
+    return attestation if attestation is not None and attestation.final_grade_id is not None else None
+
+def update_gradebook_entry(user_id, task_id):
+    solution = Solution.objects.filter(author_id=user_id, task_id=task_id, final=True).first()
+    attestations = Attestation.objects.filter(solution__author_id=user_id, solution__task_id=task_id).order_by('id')
+    attestation = graded(attestations.filter(published=True).last())
+    latest_attestation = graded(attestations.last())
+    if solution is None and latest_attestation is None:
+        GradebookEntry.objects.filter(user_id=user_id, task_id=task_id).delete()
+    else:
+        GradebookEntry.objects.update_or_create(user_id=user_id, task_id=task_id, defaults={
+            'solution': solution,
+            'attestation': attestation,
+            'latest_attestation': latest_attestation,
+        })
+
+def rebuild_gradebook():
+    """ Builds all gradebook entries from scratch. """
+    entries = {}
+    def entry(user_id, task_id):
+        if (user_id, task_id) not in entries:
+            entries[user_id, task_id] = GradebookEntry(user_id=user_id, task_id=task_id)
+        return entries[user_id, task_id]
+
+    for solution in Solution.objects.filter(final=True).only('id', 'author_id', 'task_id'):
+        entry(solution.author_id, solution.task_id).solution_id = solution.id
+    attestations = Attestation.objects.order_by('id').values_list('id', 'published', 'final_grade_id', 'solution__author_id', 'solution__task_id')
+    latest = {}
+    latest_published = {}
+    for (attestation_id, published, final_grade_id, user_id, task_id) in attestations:
+        latest[user_id, task_id] = (attestation_id, final_grade_id)
+        if published:
+            latest_published[user_id, task_id] = (attestation_id, final_grade_id)
+    for ((user_id, task_id), (attestation_id, final_grade_id)) in latest.items():
+        if final_grade_id is not None:
+            entry(user_id, task_id).latest_attestation_id = attestation_id
+    for ((user_id, task_id), (attestation_id, final_grade_id)) in latest_published.items():
+        if final_grade_id is not None:
+            entry(user_id, task_id).attestation_id = attestation_id
+
+    with transaction.atomic():
+        GradebookEntry.objects.all().delete()
+        GradebookEntry.objects.bulk_create([e for e in entries.values() if e.solution_id is not None or e.latest_attestation_id is not None], batch_size=1000)
+
+def attestations_published(attestations):
+    """ Updates the gradebook and the statistics for attestations which were published without saving them. """
+    from attestation import statistics
+    task_ids = set(attestation.solution.task_id for attestation in attestations)
+    entries = dict(((entry.user_id, entry.task_id), entry) for entry in GradebookEntry.objects.filter(task_id__in=task_ids))
+    changed = []
+    for attestation in attestations:
+        if graded(attestation) is None:
+            continue
+        entry = entries.get((attestation.solution.author_id, attestation.solution.task_id))
+        if entry is None:
+            update_gradebook_entry(attestation.solution.author_id, attestation.solution.task_id)
+        elif entry.attestation_id is None or entry.attestation_id < attestation.id:
+            entry.attestation_id = attestation.id
+            changed.append(entry)
+    GradebookEntry.objects.bulk_update(changed, ['attestation'], batch_size=500)
+    for task_id in task_ids:
+        statistics.invalidate(task_id)
+
+@receiver(post_save, sender=Solution)
+@receiver(post_delete, sender=Solution)
+def solution_changed(sender, instance, **kwargs):
+    # a new final solution resets the final flag of the older ones, which are of the same user and task
+    update_gradebook_entry(instance.author_id, instance.task_id)
+
+@receiver(post_save, sender=Attestation)
+@receiver(post_delete, sender=Attestation)
+def attestation_changed(sender, instance, **kwargs):
+    try:
+        solution = instance.solution
+    except Solution.DoesNotExist:
+        # deleted along with its solution, whose signal updates the gradebook
+        return
+    update_gradebook_entry(solution.author_id, solution.task_id)
+
+@receiver(post_save, sender=Solution)
+@receiver(post_delete, sender=Solution)
+@receiver(post_save, sender=Attestation)
+@receiver(post_delete, sender=Attestation)
+@receiver(post_save, sender=Task)
+def statistics_changed(sender, instance, **kwargs):
+    """ Drops the cached statistics of the task. New checker results are covered by the solution,
+    which run_checks saves once all its checkers are done, instead of once per result. """
+    from attestation import statistics
+    try:
+        if sender is Task:
+            task_id = instance.id
+        elif sender is Solution:
+            task_id = instance.task_id
+        else:
+            task_id = instance.solution.task_id
+    except Solution.DoesNotExist:
+        # deleted along with its solution, whose signal drops the statistics
+        return
+    statistics.invalidate(task_id)
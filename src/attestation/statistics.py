@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+
+"""
+The statistics of a task, shown as charts by attestation.views.statistics.
+
+They are computed with a few grouped SQL aggregates (instead of one query per tutorial
+and tutor and a loop over all solutions per day), and cached in the 'statistics' cache.
+The cached statistics of a task are dropped whenever one of its solutions, attestations
+or checker results changes (see the receivers in attestation.models), by changing the
+version of the task which is part of the cache keys.
+"""
+
+import datetime
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.contrib.auth.models import Group
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count
+from django.db.models.functions import TruncDate, ExtractWeekDay, ExtractHour
+
+from accounts.models import User, Tutorial
+from attestation.models import Attestation
+from checker.basemodels import CheckerResult
+
+# The percentiles of the resource usage of the checkers shown in the charts
+PERCENTILES = (50, 90)
+
+def version_key(task_id):
+    return "statistics-version-%d" % task_id
+
+def invalidate(task_id):
+    """ The statistics of the task are computed anew when they are requested next. """
+    caches['statistics'].set(version_key(task_id), uuid4().hex, None)
+
+def task_statistics(task, user):
+    """ The statistics of the task as seen by the user (a tutor only sees the students of their tutorials). """
+    cache = caches['statistics']
+    version = cache.get(version_key(task.id))
+    if version is None:
+        cache.add(version_key(task.id), uuid4().hex, None)
+        version = cache.get(version_key(task.id))
+    scope = "tutor%d" % user.id if user.is_tutor and not user.is_trainer else "all"
+    key = "statistics-%d-%s-%s" % (task.id, scope, version)
+    statistics = cache.get(key)
+    if statistics is None:
+        statistics = compute_statistics(task, user)
+        cache.set(key, statistics)
+    return statistics
+
+def compute_statistics(task, user):
+    final_solutions = task.solution_set.filter(final=True)
+    unfinal_solutions = task.solution_set.filter(final=False)
+    users = Group.objects.get(name='User').user_set.filter(is_active=True)
+    tutorials = user.tutored_tutorials.all()
+    tutor = user.is_tutor and not user.is_trainer
+    if tutor:
+        final_solutions = final_solutions.filter(author__tutorial__in = tutorials)
+        unfinal_solutions = unfinal_solutions.filter(author__tutorial__in = tutorials)
+        users = User.objects.filter(tutorial__in = tutorials)
+
+    statistics = {
+        'user_count': users.count(),
+        'solution_count': final_solutions.count(),
+        'start': task.publication_date.date(),
+        'end': task.submission_date.date(),
+    }
+    statistics.update(submission_statistics(task, unfinal_solutions, final_solutions, statistics['user_count']))
+    statistics['attestations'] = attestation_counts(task, user if tutor else None, tutorials)
+    statistics['attestations']['all'] = statistics['solution_count']
+    statistics['grade_scale'] = grade_scale(task)
+    statistics['grade_charts'] = grade_charts(task, user if tutor else None, tutorials)
+    statistics['resource_charts'] = resource_charts(task)
+    return statistics
+
+def submission_statistics(task, unfinal_solutions, final_solutions, user_count):
+    """ The submissions per day and the submissions per weekday and hour [[weekday (0 is Monday), hour, submissions]...],
+    of the final solutions and of the others. """
+    per_day = {False: {}, True: {}}
+    activity = {False: [], True: []}
+    for (solutions, final) in [(unfinal_solutions, False), (final_solutions, True)]:
+        days = solutions.annotate(day=TruncDate('creation_date')).order_by().values_list('day').annotate(count=Count('id'))
+        per_day[final] = dict(days)
+        hours = solutions.annotate(weekday=ExtractWeekDay('creation_date'), hour=ExtractHour('creation_date')).order_by().values_list('weekday', 'hour').annotate(count=Count('id'))
+        # ExtractWeekDay counts from Sunday (1) to Saturday (7)
+        activity[final] = sorted([(weekday + 5) % 7, hour, count] for (weekday, hour, count) in hours)
+
+    submissions = []
+    submissions_final = []
+    acc_submissions = []
+    total = 0
+    for date in daterange(task.publication_date.date(), min(task.submission_date.date(), datetime.date.today())):
+        submissions.append(per_day[False].get(date, 0))
+        submissions_final.append(per_day[True].get(date, 0))
+        total += submissions_final[-1]
+        acc_submissions.append(total / user_count if user_count > 0 else 0)
+    return {
+        'submissions': submissions,
+        'submissions_final': submissions_final,
+        'acc_submissions': acc_submissions,
+        'activity': activity[False],
+        'activity_final': activity[True],
+    }
+
+def attestation_counts(task, tutor, tutorials):
+    attestations = Attestation.objects.filter(solution__task=task, final=True)
+    if tutor is not None:
+        attestations = attestations.filter(author__tutored_tutorials__in = tutorials)
+    counts = dict(attestations.order_by().values_list('published').annotate(count=Count('id', distinct=True)))
+    return {'final': counts.get(False, 0), 'published': counts.get(True, 0)}
+
+def grade_scale(task):
+    if task.final_grade_rating_scale is None:
+        return []
+    return [name.strip() for name in task.final_grade_rating_scale.ratingscaleitem_set.values_list('name', flat=True)]
+
+def grade_charts(task, tutor, tutorials):
+    """ The distributions [[position of the grade, attestations]...] of the final grades, overall and by tutorial and
+    attestation author (a tutor only gets their tutorials and attestations). Plagiarism is excluded. """
+    grades = (Attestation.objects.filter(solution__task=task, solution__plagiarism=False, final=True, final_grade__isnull=False)
+              .order_by().values_list('final_grade__position', 'solution__author__tutorial', 'author').annotate(count=Count('id')))
+
+    def distribution(selected):
+        counts = {}
+        for (position, tutorial_id, author_id, count) in grades:
+            if selected(tutorial_id, author_id):
+                counts[position] = counts.get(position, 0) + count
+        return [[position, count] for (position, count) in sorted(counts.items())]
+
+    charts = []
+    if tutor is None:
+        for t in Tutorial.objects.all():
+            charts.append({'title': "Final Grades for Students in Tutorial %s" % str(t),
+                           'desc': "This chart shows the distribution of final grades for students from Tutorial %s. Plagiarism is excluded." % str(t),
+                           'ratings': distribution(lambda tutorial_id, author_id: tutorial_id == t.id)})
+        for t in User.objects.filter(groups__name='Tutor'):
+            charts.append({'title': "Final Grades for Attestations created by %s" % str(t),
+                           'desc': "This chart shows the distribution of final grades for Attestations created by %s. Plagiarism is excluded." % str(t),
+                           'ratings': distribution(lambda tutorial_id, author_id: author_id == t.id)})
+    else:
+        tutorial_ids = set(tutorials.values_list('id', flat=True))
+        charts.append({'title': "Final grades (My Tutorials)",
+                       'desc': "This chart shows the distribution of final grades for students from any of your tutorials. Plagiarism is excluded.",
+                       'ratings': distribution(lambda tutorial_id, author_id: tutorial_id in tutorial_ids)})
+        charts.append({'title': "Final grades (My Attestations)",
+                       'desc': "This chart shows the distribution of final grades for your attestations. Plagiarism is excluded.",
+                       'ratings': distribution(lambda tutorial_id, author_id: author_id == tutor.id)})
+    charts.append({'title': "Final grades (overall)",
+                   'desc': "This chart shows the distribution of final grades for all students. Plagiarism is excluded.",
+                   'ratings': distribution(lambda tutorial_id, author_id: True)})
+    return charts
+
+def resource_charts(task):
+    """ The percentiles of the runtime, CPU time and memory usage of every checker of the task, overall and over time. """
+    checkers = task.get_checkers()
+    index = dict(((ContentType.objects.get_for_model(checker).id, checker.id), i) for (i, checker) in enumerate(checkers))
+    results = [[] for checker in checkers]
+    rows = (CheckerResult.objects.filter(solution__task=task).order_by('creation_date')
+            .values_list('content_type_id', 'object_id', 'creation_date', 'runtime', 'user_time', 'system_time', 'max_rss'))
+    for (content_type_id, object_id, creation_date, runtime, user_time, system_time, max_rss) in rows.iterator():
+        i = index.get((content_type_id, object_id))
+        if i is not None:
+            cpu_time = user_time + (system_time or 0) if user_time is not None else None
+            results[i].append((creation_date, runtime or None, cpu_time, max_rss))
+
+    charts = []
+    for (chart_id, title, axis_title, description, column) in [
+            ('runtime_chart', 'Solution runtimes', 'Runtime (ms)', 'Shows the time it took to process each of the checkers.', 1),
+            ('cpu_time_chart', 'CPU time', 'CPU time (ms)', 'Shows the CPU time (user and system) used by the programs each of the checkers executed, e.g. compilers or tests.', 2),
+            ('memory_chart', 'Memory usage', 'Peak memory (kB)', 'Shows the peak memory usage of the programs each of the checkers executed.', 3),
+            ]:
+        series = []
+        for i, checker in enumerate(checkers):
+            values = [{'date': result[0], 'value': result[column]} for result in results[i] if result[column]]
+            if values:
+                sorted_values = sorted(value['value'] for value in values)
+                series.append({
+                    'checker': "%d: %s" % (i, checker.title()),
+                    'count': len(values),
+                    'percentiles': dict((p, percentile(sorted_values, p)) for p in PERCENTILES + (100,)),
+                    'buckets': bucket_percentiles(values),
+                })
+        if series:
+            charts.append({'id': chart_id, 'title': title, 'axis_title': axis_title, 'desc': description, 'series': series})
+    return charts
+
+def percentile(sorted_values, p):
+    """ The p-th percentile (nearest rank) of the sorted values. """
+    return sorted_values[max(0, (len(sorted_values) * p + 99) // 100 - 1)]
+
+def bucket_percentiles(values, n = 20):
+    """ Divides the time span of the values ([{'date': ..., 'value': ...}], ordered by date) into n buckets
+    and returns the percentiles of each bucket [{'date': ..., 50: ..., 90: ...}...]. """
+    first = values[0]
+    last = values[-1]
+    buckets = [[] for x in range(n)]
+    span = last['date'] - first['date'] + datetime.timedelta(seconds=1)
+    for r in values:
+        i = timedelta_diff((r['date'] - first['date'])*n, span)
+        buckets[i].append(r['value'])
+    result = []
+    for i in range(n):
+        bucket = {'date': first['date'] + ((span//2)*(2*i+1) // n)}
+        buckets[i].sort()
+        for p in PERCENTILES:
+            bucket[p] = percentile(buckets[i], p) if buckets[i] else None
+        result.append(bucket)
+    return result
+
+def daterange(start_date, end_date):
+    for n in range((end_date - start_date).days + 1):
+        yield start_date + datetime.timedelta(n)
+
+def timedelta_diff(td1, td2):
+    # The result of "//" is a whole number, but with type float.
+    # Since you cannot use that to index a list, we explicitly convert it to int
+    return int(td1.total_seconds() // td2.total_seconds())
@@ -1,12 +1,22 @@
 from datetime import datetime, timedelta
+import difflib
+from unittest import mock
 
 from utilities.TestSuite import TestCase
 from django.test.client import Client
 from django.urls import reverse
+from django.test.client import RequestFactory
+from django.core.management import call_command
+from io import StringIO
+from django.core import mail
+import json
 
 from solutions.models import Solution
 from tasks.models import Task
-from attestation.models import Attestation
+from accounts.models import User
+from attestation.models import Attestation, AnnotatedSolutionFile, RatingScale, RatingScaleItem, GradebookEntry
+from utilities.models import OutgoingMail
+from attestation.views import user_task_attestation_map, user_attestations, gradebook
 
 class TestViews(TestCase):
         def setUp(self):
@@ -26,6 +36,11 @@ class TestViews(TestCase):
             response = self.client.get(reverse('attestation_list', args=[self.task.id]))
             self.assertEqual(response.status_code, 200)
 
+        def test_get_statistics(self):
+            response = self.client.get(reverse('statistics_json', args=[self.task.id]))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([chart['title'] for chart in response.json()['grade_charts']], ["Final grades (My Tutorials)", "Final grades (My Attestations)", "Final grades (overall)"])
+
         def test_get_new_attestation(self):
             response = self.client.get(reverse('new_attestation_for_solution', args=[self.solution.id]), follow=True)
             self.assertEqual(response.status_code, 200)
@@ -53,6 +68,55 @@ class TestViews(TestCase):
                             }, follow=True)
             self.assertRedirectsToView(response, 'attestation_list')
 
+        def test_annotated_file_diff(self):
+            solution_file = self.solution.solutionfile_set.all()[0]
+            anotated_file = AnnotatedSolutionFile(attestation = self.attestation, solution_file = solution_file, content = solution_file.content())
+            anotated_file.save()
+            self.assertFalse(anotated_file.has_anotations())
+            self.assertEqual(anotated_file.diff, "")
+            self.assertEqual(anotated_file.content_diff(), "\n".join(["  " + line for line in solution_file.content().splitlines()]))
+
+            anotated_file.content = "// Please comment your code\n" + solution_file.content()
+            anotated_file.save()
+            anotated_file = AnnotatedSolutionFile.objects.get(pk = anotated_file.pk)
+            self.assertTrue(anotated_file.has_anotations())
+            self.assertTrue(anotated_file.content_diff().startswith("+ // Please comment your code\n"))
+            # only the changed lines are stored
+            self.assertEqual(anotated_file.diff, "@@ 0\n+ // Please comment your code")
+            self.assertEqual(anotated_file.content_diff(), "\n".join(difflib.Differ().compare(solution_file.content().splitlines(), anotated_file.content.splitlines())))
+
+        def test_user_attestations(self):
+            scale = RatingScale.objects.create(name = "Scale")
+            self.attestation.final_grade = RatingScaleItem.objects.create(scale = scale, name = "2", position = 1)
+            self.attestation.published = True
+            self.attestation.save()
+            self.attestation.solution.final = True
+            self.attestation.solution.save()
+            tasks = Task.objects.all()
+            author = self.attestation.solution.author
+            rating_list = user_task_attestation_map(User.objects.all(), tasks)
+            (_, attestations, threshold, calculated_grade) = [row for row in rating_list if row[0] == author][0]
+            self.assertIn((self.attestation, self.attestation.solution), attestations)
+            self.assertEqual(user_attestations(author, tasks), (attestations, threshold, calculated_grade))
+
+        def test_gradebook(self):
+            scale = RatingScale.objects.create(name = "Scale")
+            self.attestation.solution.final = True
+            self.attestation.solution.save()
+            self.attestation.final_grade = RatingScaleItem.objects.create(scale = scale, name = "2", position = 1)
+            self.attestation.publish(RequestFactory().get('/'), self.attestation.author)
+            tasks = Task.objects.all()
+            users = User.objects.all()
+            self.assertEqual(gradebook(users, tasks), user_task_attestation_map(users, tasks))
+            self.assertIn((self.attestation, self.attestation.solution), [rating for row in gradebook(users, tasks) for rating in row[1]])
+            self.assertEqual(gradebook(users, tasks, False), user_task_attestation_map(users, tasks, False))
+
+            self.attestation.withdraw(RequestFactory().get('/'), self.attestation.author)
+            self.assertEqual(gradebook(users, tasks), user_task_attestation_map(users, tasks))
+
+            call_command('rebuild_gradebook', stdout=StringIO())
+            self.assertEqual(gradebook(users, tasks, False), user_task_attestation_map(users, tasks, False))
+
 class TestTrainerViews(TestCase):
         def setUp(self):
             self.client.login(username='trainer', password='demo')
@@ -60,6 +124,29 @@ class TestTrainerViews(TestCase):
         def tearDown(self):
             pass
 
+        def test_publish_all(self):
+            task = Task.objects.all()[0]
+            scale = RatingScale.objects.create(name = "Scale")
+            attestation = Attestation.objects.all()[0]
+            attestation.final = True
+            attestation.published = False
+            attestation.final_grade = RatingScaleItem.objects.create(scale = scale, name = "2", position = 1)
+            attestation.save()
+            attestation.solution.final = True
+            attestation.solution.save()
+            response = self.client.post(reverse('attestation_list', args=[task.id]), {'what': 'all'})
+            self.assertEqual(response.status_code, 302)
+            attestation.refresh_from_db()
+            self.assertTrue(attestation.published)
+            self.assertIsNotNone(attestation.published_on)
+            self.assertEqual(GradebookEntry.objects.get(task = task, user = attestation.solution.author).attestation, attestation)
+            # the mails are sent once the publication is committed
+            self.assertEqual(len(mail.outbox), 0)
+            self.run_commit_hooks()
+            self.assertEqual(len(mail.outbox), 1)
+            self.assertEqual(mail.outbox[0].to, [attestation.solution.author.email])
+            self.assertEqual(OutgoingMail.objects.get().status, OutgoingMail.SENT)
+
         def test_get_raiting_overview(self):
             response = self.client.get(reverse('rating_overview'))
             self.assertEqual(response.status_code, 200)
@@ -74,5 +161,58 @@ class TestTrainerViews(TestCase):
             self.assertEqual(response.status_code, 200)
 
         def test_rating_export(self):
+            task = Task.objects.all()[0]
+            task.submission_date = datetime.now() - timedelta(hours=1)
+            task.save()
+            user = User.objects.get(username='user')
+            user.mat_number = 12345
+            user.save()
             response = self.client.get(reverse('rating_export'))
             self.assertEqual(response.status_code, 200)
+            lines = b"".join(response.streaming_content).decode('utf-8').splitlines()
+            self.assertTrue(lines[0].startswith('"First Name","Last Name","Mat"'))
+            self.assertTrue(lines[0].endswith('"Threshold","%s","Warning?"' % task))
+            self.assertEqual(len(lines), 1 + User.objects.filter(groups__name='User', is_active=True).count())
+
+            response = self.client.get(reverse('rating_export'), {'format': 'tsv', 'columns': 'last_name,mat_number'})
+            lines = b"".join(response.streaming_content).decode('utf-8').splitlines()
+            self.assertEqual(lines[0], '"Last Name"\t"Mat"')
+            self.assertIn('"%s"\t"%s"' % (user.last_name, user.mat_number), lines)
+
+            response = self.client.get(reverse('rating_export'), {'format': 'jsonl', 'columns': 'mat_number,tasks'})
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+            rows = [json.loads(line) for line in b"".join(response.streaming_content).decode('utf-8').splitlines()]
+            self.assertIn({'mat_number': 12345, 'tasks': [{'id': task.id, 'title': str(task), 'rating': '-'}]}, rows)
+
+            self.assertEqual(self.client.get(reverse('rating_export'), {'format': 'xls'}).status_code, 400)
+            self.assertEqual(self.client.get(reverse('rating_export'), {'columns': 'password'}).status_code, 400)
+
+        def test_get_statistics(self):
+            from checker.checker.LineCounter import LineCounter
+            task = Task.objects.all()[0]
+            task.final_grade_rating_scale = RatingScale.objects.create(name = "Scale")
+            task.save()
+            LineCounter.objects.create(task = task, order = 0)
+            solution = Solution.objects.all()[0]
+            with mock.patch('attestation.statistics.invalidate') as invalidate:
+                solution.check_solution()
+            # once for the solution, not for each of its results
+            invalidate.assert_called_once_with(task.id)
+            solution.checkerresult_set.update(runtime = 10, user_time = 5, system_time = 1, max_rss = 2048)
+            response = self.client.get(reverse('statistics', args=[task.id]))
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get(reverse('statistics_json', args=[task.id]))
+            self.assertContains(response, 'runtime_chart')
+            self.assertContains(response, 'cpu_time_chart')
+            self.assertContains(response, 'memory_chart')
+            statistics = response.json()
+            self.assertEqual(statistics['solution_count'], 0)
+            self.assertEqual(sum(statistics['submissions']), 1)
+            self.assertEqual(sum(count for (weekday, hour, count) in statistics['activity']), 1)
+            self.assertEqual(statistics['resource_charts'][0]['series'][0]['percentiles']['50'], 10)
+
+            # a new solution drops the cached statistics
+            Solution.objects.create(task = task, author = solution.author, final = True)
+            statistics = self.client.get(reverse('statistics_json', args=[task.id])).json()
+            self.assertEqual(sum(statistics['submissions']), 1)
+            self.assertEqual(sum(statistics['submissions_final']), 1)
@@ -8,15 +8,19 @@ from django.db.models import Count
 from django.db import transaction
 from django.contrib.auth.models import Group
 from django.views.decorators.cache import cache_control
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse, JsonResponse
 from django.template import loader
 from django import forms
 import datetime
+import csv
+import json
+import itertools
 
 from tasks.models import Task, HtmlInjector
 from solutions.models import Solution
 from checker.basemodels import check_solution
-from attestation.models import Attestation, AnnotatedSolutionFile, RatingResult, RatingScale, RatingScaleItem
+from attestation.models import Attestation, AnnotatedSolutionFile, RatingResult, RatingScale, RatingScaleItem, GradebookEntry
+from attestation.statistics import task_statistics
 from attestation.forms import AnnotatedFileFormSet, RatingResultFormSet, AttestationForm, AttestationPreviewForm, PublishFinalGradeForm, GenerateRatingScaleForm, FinalGradeOptionForm
 from accounts.models import User, Tutorial
 from accounts.views import access_denied
@@ -30,129 +34,17 @@ def statistics(request, task_id):
     if not (request.user.is_trainer or request.user.is_tutor or request.user.is_superuser):
         return access_denied(request)
 
-    final_solutions = task.solution_set.filter(final=True)
-    unfinal_solutions = task.solution_set.filter(final=False)
-    user = Group.objects.get(name='User').user_set.filter(is_active=True)
-
-    tutorials = request.user.tutored_tutorials.all()
-    if request.user.is_tutor:
-        final_solutions = final_solutions.filter(author__tutorial__in = tutorials)
-        unfinal_solutions = unfinal_solutions.filter(author__tutorial__in = tutorials)
-        user = User.objects.filter(tutorial__in = tutorials)
-
-    final_solution_count = final_solutions.count()
-    user_count = user.count()
-
-    submissions = []
-    submissions_final = []
-    acc_submissions = [0]
-    creation_dates = [dict['creation_date'].date() for dict in unfinal_solutions.values('creation_date')]
-    creation_dates_final = [dict['creation_date'].date() for dict in final_solutions.values('creation_date')]
-    for date in daterange(task.publication_date.date(), min(task.submission_date.date(), datetime.date.today())):
-        submissions.append(creation_dates.count(date))
-        submissions_final.append(creation_dates_final.count(date))
-        acc_submissions.append(acc_submissions[-1]+submissions_final[-1])
-    acc_submissions.pop(0)
-    if (user_count > 0):
-        acc_submissions = [submissions/user_count for submissions in acc_submissions]
-    else:
-        acc_submissions = 0;
-
-    creation_times = [[(dict['creation_date'].time().hour*3600+dict['creation_date'].time().minute*60)*1000, dict['creation_date'].weekday()] for dict in unfinal_solutions.values('creation_date')]
-    creation_times_final = [[(dict['creation_date'].time().hour*3600+dict['creation_date'].time().minute*60)*1000, dict['creation_date'].weekday()] for dict in final_solutions.values('creation_date')]
-
-    if request.user.is_trainer:
-        attestations = Attestation.objects.filter(solution__task__id=task.id, final=True, published=False).aggregate(final=Count('id'))
-        attestations.update( Attestation.objects.filter(solution__task__id=task.id, final=True, published=True).aggregate(published=Count('id')) )
-    else: # Tutor
-        attestations = Attestation.objects.filter(solution__task__id=task.id, final=True, published=False, author__tutored_tutorials__in = tutorials).aggregate(final=Count('id'))
-        attestations.update( Attestation.objects.filter(solution__task__id=task.id, final=True, published=True, author__tutored_tutorials__in = tutorials).aggregate(published=Count('id')))
-
-    attestations['all'] = final_solution_count
+    return render(request, "attestation/statistics.html", {'task': task})
 
+@login_required
+def statistics_json(request, task_id):
+    """ The data of the charts of the statistics page. """
+    task = get_object_or_404(Task, pk=task_id)
 
-    all_items = task.final_grade_rating_scale.ratingscaleitem_set.values_list('name', 'position')
-    final_grade_rating_scale_items = "['" + "','".join([name.strip() for (name, position) in all_items]) + "']"
+    if not (request.user.is_trainer or request.user.is_tutor or request.user.is_superuser):
+        return access_denied(request)
 
-    all_ratings = []
-    if request.user.is_trainer:
-        # Each Tutorials ratings
-        for t in Tutorial.objects.all():
-            all_ratings.append({'title'   : "Final Grades for Students in Tutorial %s" % str(t),
-                                'desc'    : "This chart shows the distribution of final grades for students from Tutorial %s. Plagiarism is excluded." % str(t),
-                                'ratings' : RatingScaleItem.objects.filter(attestation__solution__task=task_id, attestation__solution__plagiarism=False, attestation__final=True, attestation__solution__author__tutorial = t)})
-        for t in User.objects.filter(groups__name='Tutor'):
-            all_ratings.append({'title'   : "Final Grades for Attestations created by %s" % str(t),
-                                'desc'    : "This chart shows the distribution of final grades for Attestations created by %s. Plagiarism is excluded." % str(t),
-                                'ratings' : RatingScaleItem.objects.filter(attestation__solution__task=task_id, attestation__solution__plagiarism=False, attestation__final=True, attestation__author__id = t.id)})
-    else:
-        # The Tutorials ratings
-        all_ratings.append(        {'title'   : "Final grades (My Tutorials)",
-                                    'desc'    : "This chart shows the distribution of final grades for students from any of your tutorials. Plagiarism is excluded.",
-                                    'ratings' : RatingScaleItem.objects.filter(attestation__solution__task=task_id, attestation__solution__plagiarism=False, attestation__final=True, attestation__solution__author__tutorial__in = tutorials)})
-        all_ratings.append(        {'title'   : "Final grades (My Attestations)",
-                                    'desc'    : "This chart shows the distribution of final grades for your attestations. Plagiarism is excluded.",
-                                    'ratings' : RatingScaleItem.objects.filter(attestation__solution__task=task_id, attestation__solution__plagiarism=False, attestation__final=True, attestation__author__id = request.user.id)})
-    # Overall ratings
-    all_ratings.append({'title'   : "Final grades (overall)",
-                        'desc'    : "This chart shows the distribution of final grades for all students. Plagiarism is excluded.",
-                        'ratings' : RatingScaleItem.objects.filter(attestation__solution__task=task_id, attestation__solution__plagiarism=False, attestation__final=True)})
-
-    for i, r in enumerate(all_ratings):
-        all_ratings[i]['ratings'] = [list(rating) for rating in r['ratings'].annotate(Count('id')).values_list('position', 'id__count')]
-
-    has_runtimes = False
-    runtimes = []
-    for i, checker in enumerate(task.get_checkers()):
-        checker_runtimes = []
-        for result in checker.results.order_by('creation_date').filter(runtime__gt = 0):
-            has_runtimes = True
-            checker_runtimes.append({ 'date': result.creation_date, 'value': result.runtime})
-
-        if checker_runtimes:
-            first = checker_runtimes[0]
-            last = checker_runtimes[-1]
-            n = 20 # number of buckets
-            buckets = [[] for x in range(n)]
-            span = last['date'] - first['date'] + datetime.timedelta(seconds=1)
-            for r in checker_runtimes:
-                i = timedelta_diff((r['date'] - first['date'])*n, span)
-                buckets[i].append(r['value'])
-            medians = []
-            for i in range(n):
-                date = first['date'] + ((span//2)*(2*i+1) // n);
-                if buckets[i]:
-                    buckets[i].sort()
-                    value = buckets[i][((len(buckets[i])+1)//2)-1]
-                else:
-                    value = None
-                medians.append({'date': date, 'value': value});
-
-            runtimes.append({
-                             'checker': "%d: %s" % (i, checker.title()),
-                             'runtimes': checker_runtimes,
-                             'medians': medians
-            })
-
-    return render(request, "attestation/statistics.html",
-            {'task':                           task,
-            'user_count':                      user_count,
-            'solution_count':                  final_solution_count,
-            'submissions':                     submissions,
-            'submissions_final':               submissions_final,
-            'creation_times':                  creation_times,
-            'creation_times_final':            creation_times_final,
-            'acc_submissions':                 acc_submissions,
-            'attestations':                    attestations,
-            'final_grade_rating_scale_items':  final_grade_rating_scale_items,
-            'all_ratings':                     all_ratings,
-            'runtimes':                        runtimes,
-            'has_runtime_chart':               has_runtimes,
-            })
-
-def daterange(start_date, end_date):
-    for n in range((end_date - start_date).days + 1):
-        yield start_date + datetime.timedelta(n)
+    return JsonResponse(task_statistics(task, request.user))
 
 
 def tutor_attestation_stats(task, tutor):
@@ -228,15 +120,13 @@ def attestation_list(request, task_id):
                 return access_denied(request)
             if task.only_trainers_publish:
                 return access_denied(request)
-            for attestation in publishable_tutorial:
-                attestation.publish(request, request.user)
+            Attestation.publish_all(publishable_tutorial, request, request.user)
             return HttpResponseRedirect(reverse('attestation_list', args=[task_id]))
 
         if request.POST['what'] == 'all':
             if not request.user.is_trainer:
                 return access_denied(request)
-            for attestation in publishable_all:
-                attestation.publish(request, request.user)
+            Attestation.publish_all(publishable_all, request, request.user)
             return HttpResponseRedirect(reverse('attestation_list', args=[task_id]))
 
     show_author = not get_settings().anonymous_attestation or request.user.is_tutor or request.user.is_trainer or published
@@ -416,10 +306,26 @@ def view_attestation(request, attestation_id):
         )
 
 def user_task_attestation_map(users,tasks,only_published=True):
+    """ Returns [(user, [(attestation, final solution) for every task], threshold, calculated grade) for every user].
+    Only the attestations and solutions of the given users and tasks are loaded. """
     if only_published:
         attestations = Attestation.objects.filter( published=True )
     else:
         attestations = Attestation.objects.all()
+    solutions = Solution.objects.filter( final=True )
+
+    # users and tasks are usually querysets, which become subqueries here
+    attestations = attestations.filter(solution__task__in=tasks)
+    solutions = solutions.filter(task__in=tasks)
+    if isinstance(users, User):
+        # Fast path for a single user, see user_attestations
+        attestations = attestations.filter(solution__author=users)
+        solutions = solutions.filter(author=users)
+        users = [users]
+    else:
+        attestations = attestations.filter(solution__author__in=users)
+        solutions = solutions.filter(author__in=users)
+    tasks = list(tasks)
 
     attestations = attestations.select_related("solution", "final_grade")
     attestations = attestations.prefetch_related("ratingresult_set")
@@ -427,14 +333,31 @@ def user_task_attestation_map(users,tasks,only_published=True):
     for attestation in attestations:
         attestation_dict[attestation.solution.task_id, attestation.solution.author_id] = attestation
 
-    solutions = Solution.objects.filter( final=True )
     final_solutions_dict = {}
     for solution in solutions:
         final_solutions_dict[solution.task_id, solution.author_id] = solution
 
+    return rating_rows(users, tasks, attestation_dict, final_solutions_dict)
+
+def gradebook(users, tasks, only_published=True):
+    """ The same as user_task_attestation_map, read from the GradebookEntry table. """
+    attestation_field = 'attestation' if only_published else 'latest_attestation'
+    entries = GradebookEntry.objects.filter(user__in=users, task__in=tasks)
+    entries = entries.select_related("solution", attestation_field + "__solution", attestation_field + "__final_grade")
+    entries = entries.prefetch_related(attestation_field + "__ratingresult_set")
+    attestation_dict = {}
+    final_solutions_dict = {}
+    for entry in entries:
+        attestation_dict[entry.task_id, entry.user_id] = getattr(entry, attestation_field)
+        final_solutions_dict[entry.task_id, entry.user_id] = entry.solution
+    return rating_rows(list(users), list(tasks), attestation_dict, final_solutions_dict)
+
+def rating_rows(users, tasks, attestation_dict, final_solutions_dict):
+    """ Computes the rows of user_task_attestation_map from the attestations and final solutions by (task id, user id). """
     settings = get_settings()
     arithmetic_option = settings.final_grades_arithmetic_option
     plagiarism_option = settings.final_grades_plagiarism_option
+    expired = dict((task.id, task.expired()) for task in tasks)
 
     rating_list = []
     for user in users:
@@ -445,15 +368,12 @@ def user_task_attestation_map(users,tasks,only_published=True):
         for task in tasks:
             solution = final_solutions_dict.get((task.id, user.id), None)
 
-            try:
-                rating = attestation_dict[task.id, user.id]
-                if rating.final_grade is None:
-                    # rating has no grade, so it is shown as if there was no rating
-                    # should only be relevant for unfinished attestations
-                    rating = None
-            except KeyError:
+            rating = attestation_dict.get((task.id, user.id), None)
+            if rating is not None and rating.final_grade is None:
+                # rating has no grade, so it is shown as if there was no rating
+                # should only be relevant for unfinished attestations
                 rating = None
-            if rating or (task.expired() and not solution):
+            if rating or (expired[task.id] and not solution):
                 threshold += task.warning_threshold
 
             if rating is not None:
@@ -478,6 +398,12 @@ def user_task_attestation_map(users,tasks,only_published=True):
 
     return rating_list
 
+def user_attestations(user, tasks, only_published=True):
+    """ The row of user_task_attestation_map for a single user: ([(attestation, final solution) for every task], threshold, calculated grade).
+    Only the attestations and solutions of this user are loaded. """
+    (_, rating_for_user_list, threshold, calculated_grade) = user_task_attestation_map(user, tasks, only_published)[0]
+    return (rating_for_user_list, threshold, calculated_grade)
+
 @login_required
 def rating_overview(request):
     full_form = request.user.is_trainer or request.user.is_superuser
@@ -515,7 +441,7 @@ def rating_overview(request):
         final_grade_formset = FinalGradeFormSet(queryset=rev_users)
         publish_final_grade_form = PublishFinalGradeForm(instance=get_settings())
 
-    rating_list = user_task_attestation_map(users, tasks)
+    rating_list = gradebook(users, tasks)
 
     return render(request, "attestation/rating_overview.html", {'rating_list': rating_list, 'tasks': tasks, 'final_grade_formset': final_grade_formset, 'final_grade_option_form': final_grade_option_form, 'publish_final_grade_form': publish_final_grade_form, 'full_form': full_form})
 
@@ -544,7 +470,7 @@ def tutorial_overview(request, tutorial_id=None):
 
     tasks = Task.objects.filter(submission_date__lt = datetime.datetime.now()).order_by('publication_date', 'submission_date')
     users = User.objects.filter(groups__name='User').filter(is_active=True, tutorial=tutorial).order_by('last_name', 'first_name')
-    rating_list = user_task_attestation_map(users, tasks, False)
+    rating_list = gradebook(users, tasks, False)
 
     def to_float(a, default, const):
         try:
@@ -571,18 +497,123 @@ def rating_export(request):
     if not (request.user.is_trainer or request.user.is_coordinator or request.user.is_superuser):
         return access_denied(request)
 
-    tasks = Task.objects.filter(submission_date__lt = datetime.datetime.now()).order_by('publication_date', 'submission_date')
-    users = User.objects.filter(groups__name='User').filter(is_active=True).order_by('last_name', 'first_name')
-    rating_list = user_task_attestation_map(users, tasks)
-
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename=rating_export.csv'
-    t = loader.get_template('attestation/rating_export.csv')
-    c = {'rating_list': rating_list, 'tasks': tasks}
-    #response.write(u'\ufeff') setting utf-8 BOM for Excel doesn't work
-    response.write(t.render(c))
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in RATING_EXPORT_FORMATS:
+        return HttpResponseBadRequest("Unknown format %s" % export_format)
+    columns = request.GET.get('columns', None)
+    columns = columns.split(',') if columns else [column for (column, _) in RATING_EXPORT_COLUMNS]
+    unknown_columns = set(columns) - set(column for (column, _) in RATING_EXPORT_COLUMNS)
+    if unknown_columns:
+        return HttpResponseBadRequest("Unknown columns %s" % ", ".join(sorted(unknown_columns)))
+
+    tasks = list(Task.objects.filter(submission_date__lt = datetime.datetime.now()).order_by('publication_date', 'submission_date'))
+    users = User.objects.filter(groups__name='User').filter(is_active=True).order_by('last_name', 'first_name', 'id')
+
+    (content_type, extension, delimiter) = RATING_EXPORT_FORMATS[export_format]
+    rows = rating_export_rows(users, tasks, columns)
+    if delimiter is None:
+        lines = (json.dumps(json_object(row)) + "\n" for row in rows)
+    else:
+        writer = csv.writer(Echo(), delimiter=delimiter, quoting=csv.QUOTE_ALL, lineterminator="\n")
+        header = [title for (column, title) in RATING_EXPORT_COLUMNS if column in columns and column != 'tasks']
+        if 'tasks' in columns:
+            header[columns_before_tasks(columns):columns_before_tasks(columns)] = [str(task) for task in tasks]
+        lines = itertools.chain([writer.writerow(header)], (writer.writerow(csv_values(row)) for row in rows))
+
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename=rating_export.%s' % extension
     return response
 
+# Columns of the rating export: (name of the column in the request, its title)
+RATING_EXPORT_COLUMNS = [
+    ('first_name', "First Name"),
+    ('last_name', "Last Name"),
+    ('mat_number', "Mat"),
+    ('programme', "Programme"),
+    ('email', "eMail"),
+    ('final_grade', "Final grade"),
+    ('calculated_grade', "Calculated grade"),
+    ('threshold', "Threshold"),
+    ('tasks', None),            # a column for every task
+    ('warning', "Warning?"),
+]
+
+# Formats of the rating export: (content type, file extension, delimiter or None for JSON lines)
+RATING_EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv', ','),
+    'tsv': ('text/tab-separated-values', 'tsv', '\t'),
+    'jsonl': ('application/x-ndjson', 'jsonl', None),
+}
+
+class Echo:
+    """ A file for csv.writer, which hands the lines on instead of storing them. """
+    def write(self, value):
+        return value
+
+def columns_before_tasks(columns):
+    return len([column for (column, _) in RATING_EXPORT_COLUMNS[:RATING_EXPORT_COLUMNS.index(('tasks', None))] if column in columns])
+
+def csv_values(row):
+    """ The values of a row of rating_export_rows, with a value for every task in place of the tasks column. """
+    values = []
+    for (column, value) in row:
+        if column == 'tasks':
+            values += [rating for (_, rating) in value]
+        else:
+            values.append(value)
+    return values
+
+def json_object(row):
+    """ A row of rating_export_rows as object. The tasks are a list of their own, as their titles need not be unique. """
+    result = {}
+    for (column, value) in row:
+        if column == 'tasks':
+            value = [{'id': task.id, 'title': str(task), 'rating': rating} for (task, rating) in value]
+        result[column] = value
+    return result
+
+def rating_export_rows(users, tasks, columns, chunk_size=500):
+    """ Yields a row [(column, value)...] for every user. The value of the tasks column is [(task, rating)...]. The users are read chunk by chunk, so the memory needed does not grow with their number. """
+    offset = 0
+    while True:
+        chunk = list(users[offset:offset + chunk_size])
+        if not chunk:
+            break
+        for (user, attestations, threshold, calculated_grade) in gradebook(chunk, tasks):
+            values = {
+                'first_name': user.first_name,
+                'last_name': user.last_name,
+                'mat_number': user.mat_number,
+                'programme': user.programme,
+                'email': user.email,
+                'final_grade': str(user.final_grade) if user.final_grade is not None else "",
+                'calculated_grade': calculated_grade,
+                'threshold': str(threshold),
+                'warning': "warning" if calculated_grade < threshold else "",
+            }
+            row = []
+            for (column, _) in RATING_EXPORT_COLUMNS:
+                if column not in columns:
+                    continue
+                if column == 'tasks':
+                    row.append((column, [(task, task_rating(attestation, solution)) for (task, (attestation, solution)) in zip(tasks, attestations)]))
+                else:
+                    row.append((column, values[column]))
+            yield row
+        offset += chunk_size
+
+def task_rating(attestation, solution):
+    """ The final grade (? if the solution is not graded yet, - if there is none), as shown in the rating export. """
+    if attestation:
+        rating = str(attestation.final_grade)
+    elif solution:
+        rating = "?"
+    else:
+        rating = "-"
+    if solution and solution.plagiarism:
+        rating += " (plagiarism)"
+    return rating
+
 def frange(start, end, inc):
     "A range function, that does accept float increments..."
     L = []
@@ -657,8 +688,3 @@ def update_attestations(request):
     else:
         form = ImportForm()
     return render(request, 'admin/attestation/update.html', {'form': form, 'title':"Update Attestations"  })
-
-def timedelta_diff(td1, td2):
-    # The result of "//" is a whole number, but with type float.
-    # Since you cannot use that to index a list, we explicitly convert it to int
-    return int(td1.total_seconds() // td2.total_seconds())
@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.forms.models import BaseInlineFormSet, ModelForm
 from django.urls import reverse
 from django.utils.html import format_html
-from .basemodels import CheckerResult
+from .basemodels import CheckerResult, CheckerJob
 
 class AlwaysChangedModelForm(ModelForm):
     """ This fixes the creation of inlines without modifying any of it's values. The standart ModelForm would just ignore these inlines. """
@@ -10,10 +10,22 @@ class AlwaysChangedModelForm(ModelForm):
         """ Should return True if data differs from initial. By always returning true even unchanged inlines will get validated and saved."""
         return True
 
+class CheckerFormSet(BaseInlineFormSet):
+    """ Increments the version of checkers which are edited and stops reusing their results. """
+    def save_existing(self, form, instance, commit=True):
+        changed = bool(form.changed_data)
+        if changed:
+            instance.increment_version()
+        instance = super(CheckerFormSet, self).save_existing(form, instance, commit)
+        if changed:
+            instance.invalidate_cached_results()
+        return instance
+
 class CheckerInline(admin.StackedInline):
     """ Base class for checker inlines """
     extra = 0
     form = AlwaysChangedModelForm
+    formset = CheckerFormSet
     # added checker class to inlinegroup and inlinerelated for js ordering in admin
     # this is a copy of the django template with only minor changes - keep in sync with new django versions
     template = "admin/tasks/stacked.html"
@@ -33,7 +45,7 @@ class CheckerInline(admin.StackedInline):
 class CheckerResultAdmin(admin.ModelAdmin):
     model = CheckerResult
     list_display = ["edit", "view_solution", "solution_final", "checker", "passed", "creation_date", "runtime"]
-    readonly_fields = ["solution", "checker", "passed", "creation_date", "runtime"]
+    readonly_fields = ["solution", "checker", "passed", "creation_date", "runtime", "user_time", "system_time", "max_rss", "page_faults", "output_size"]
     list_filter = ["solution__final", "passed", "solution__task", "creation_date"]
 
     def get_queryset(self, request):
@@ -58,3 +70,24 @@ class CheckerResultAdmin(admin.ModelAdmin):
         return False
 
 admin.site.register(CheckerResult, CheckerResultAdmin)
+
+class CheckerJobAdmin(admin.ModelAdmin):
+    model = CheckerJob
+    list_display = ["solution", "status", "priority", "run_all", "submission", "attempts", "created", "started", "finished"]
+    readonly_fields = ["solution", "run_all", "submission", "uploader", "attempts", "error", "created", "started", "finished"]
+    list_filter = ["status", "submission", "solution__task", "created"]
+    actions = ['requeue']
+
+    def get_queryset(self, request):
+        qs = super(CheckerJobAdmin, self).get_queryset(request)
+        return qs.select_related("solution", "solution__task", "solution__author")
+
+    def requeue(self, request, queryset):
+        """ Queue the selected jobs again """
+        count = queryset.exclude(status=CheckerJob.RUNNING).update(status=CheckerJob.PENDING, attempts=0)
+        self.message_user(request, "%d jobs were queued again." % count)
+
+    def has_add_permission(self, request):
+        return False
+
+admin.site.register(CheckerJob, CheckerJobAdmin)
@@ -1,13 +1,17 @@
 # -*- coding: utf-8 -*-
+import copy
 import os.path
 import shutil
 import sys
 import time
+import traceback
+from datetime import datetime, timedelta
+from hashlib import sha256
 
 from django.conf import settings
 from django.db import models
 from tasks.models import Task
-from solutions.models import Solution
+from solutions.models import Solution, SolutionFile
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.utils.translation import ugettext_lazy as _
@@ -16,15 +20,19 @@ from django.core.exceptions import ValidationError
 from django.core.files import File
 from django.db.models.signals import post_delete
 from django.dispatch.dispatcher import receiver
-from utilities import encoding, file_operations
+from utilities import encoding, file_operations, classfile
+from checker import sandbox, pool as checker_pool
 from utilities.deleting_file_field import DeletingFileField
+from utilities.lru import LRUCache
 
-from functools import partial
-from multiprocessing import Pool
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 from django.db import transaction
 from django import db
 from django.db import connection
+from django.db.models import Q
+from accounts.models import User
 
 def get_checkerfile_storage_path(instance, filename):
     """ Use this function as upload_to parameter for filefields. """
@@ -39,6 +47,20 @@ class CheckerFileField(DeletingFileField):
         kwargs['max_length'] = kwargs.get('max_length', 500)
         super(CheckerFileField, self).__init__(verbose_name, name, upload_to, storage, **kwargs)
 
+# The hashes of checker files by (path, modification time, size), see file_digest()
+_file_digests = LRUCache(10000, sizeof=lambda digest: 1)
+
+def file_digest(path):
+    """ Returns the SHA-256 hash of the file at path. It is only computed again once the file changes. """
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    digest = _file_digests.get(key)
+    if digest is None:
+        with open(path, 'rb') as fd:
+            digest = sha256(fd.read()).hexdigest()
+        _file_digests.put(key, digest)
+    return digest
+
 class Checker(models.Model):
     """ A Checker implements some quality assurance.
 
@@ -60,9 +82,15 @@ class Checker(models.Model):
     required = models.BooleanField(default=False, help_text = _('The test must be passed to submit the solution.'))
     always = models.BooleanField(default=True, help_text = _('The test will run on submission time.'))
     critical = models.BooleanField(default=False, help_text = _('If this test fails, do not display further test results.'))
+    version = models.PositiveIntegerField(default=1, editable=False, help_text = _('Incremented whenever the configuration of the checker is changed.'))
 
     results = GenericRelation("CheckerResult") # enables cascade on delete.
 
+    # How a checker uses the sandbox, see sandbox_access()
+    SANDBOX_WRITE = 'write'        # changes the sandbox or the environment for later checkers
+    SANDBOX_PRIVATE = 'private'    # writes files which no other checker needs
+    SANDBOX_READ = 'read'          # only reads the sources or files in the sandbox
+
     class Meta:
         abstract = True
         app_label = 'checker'
@@ -107,6 +135,40 @@ class Checker(models.Model):
         Overloaded by subclasses. """
         return []
 
+    def sandbox_access(self):
+        """ Returns how this checker uses the sandbox. If checkers are run in parallel,
+        SANDBOX_WRITE checkers run on their own, SANDBOX_PRIVATE checkers run concurrently in a copy of the sandbox
+        and SANDBOX_READ checkers run concurrently in the sandbox itself.
+        Overloaded by subclasses. """
+        return self.SANDBOX_WRITE
+
+    def fingerprint(self):
+        """ Returns a hash of the configuration of this checker, including the contents of its files.
+        Results of checkers with the same fingerprint may be reused for identical solutions. """
+        s = sha256()
+        s.update(self.__class__.__name__.encode('utf-8'))
+        for field in self._meta.concrete_fields:
+            if field.name in ('id', 'created', 'public', 'required', 'critical'):
+                continue
+            value = getattr(self, field.attname)
+            s.update(field.name.encode('utf-8'))
+            if isinstance(field, models.FileField) and value:
+                try:
+                    s.update(file_digest(value.path).encode('ascii'))
+                except IOError:
+                    s.update(repr(value.name).encode('utf-8'))
+            else:
+                s.update(repr(value).encode('utf-8'))
+        return s.hexdigest()
+
+    def increment_version(self):
+        """ To be called when the configuration of this checker was changed. """
+        self.version += 1
+
+    def invalidate_cached_results(self):
+        """ Prevents the results of this checker from being reused. """
+        CheckerResult.objects.filter(content_type=ContentType.objects.get_for_model(self), object_id=self.id).update(cache_key='')
+
     def clean(self):
         if self.required and (not self.show_publicly(False)): raise ValidationError("Checker is required, but failure isn't publicly reported to student during submission")
 
@@ -117,16 +179,17 @@ class CheckerEnvironment:
     def __init__(self, solution):
         """ Constructor: Creates a standard environment. """
         # Temporary build directory
-        sandbox = settings.SANDBOX_DIR
-        self._tmpdir = file_operations.create_tempfolder(sandbox)
-        # Sources as [(name, content)...]
-        self._sources = []
-        for file in solution.solutionfile_set.all().order_by('file'):
-            self._sources.append((file.path(), file.content()))
+        self._tmpdir = sandbox.allocate_sandbox()
+        # Sources as [(name, content)...], the content of solution files is read on first use (see sources())
+        self._sources = [(file.path(), file) for file in solution.solutionfile_set.all().order_by('file')]
         # Submitter of this program
         self._user = solution.author
         # Executable program
         self._program = None
+        # Parsed class files in the build directory, see class_file()
+        self._class_files = {}
+        # The template with the files of the CreateFileCheckers, see sandbox_template()
+        self._sandbox_template = None
 
         # The solution
         self._solution = solution
@@ -141,12 +204,53 @@ class CheckerEnvironment:
 
     def sources(self):
         """ Returns the list of source files. [(name, content)...] """
+        if any(isinstance(content, SolutionFile) for (name, content) in self._sources):
+            self._sources = [(name, content.content() if isinstance(content, SolutionFile) else content) for (name, content) in self._sources]
         return self._sources
 
+    def source_names(self):
+        """ Returns the names of the source files, without reading them. """
+        return [name for (name, content) in self._sources]
+
     def add_source(self, path, content):
         """ Add source to the list of source files. [(name, content)...] """
         self._sources.append((path, content))
 
+    def private_copy(self):
+        """ Returns a copy of this environment with its own copy of the temporary build directory. """
+        env = copy.copy(self)
+        env._tmpdir = sandbox.allocate_sandbox()
+        for name in os.listdir(self._tmpdir):
+            source = os.path.join(self._tmpdir, name)
+            if os.path.isdir(source) and not os.path.islink(source):
+                shutil.copytree(source, os.path.join(env._tmpdir, name), symlinks=True)
+            else:
+                shutil.copy2(source, env._tmpdir, follow_symlinks=False)
+        env._sources = list(self._sources)
+        env._class_files = {}
+        return env
+
+
+    def sandbox_template(self):
+        """ Returns the sandbox template with the files of the CreateFileCheckers of the task (see checker.sandbox), or None. """
+        if self._sandbox_template is None:
+            self._sandbox_template = sandbox.sandbox_template(self._solution.task) or False
+        return self._sandbox_template or None
+
+    def class_file(self, path):
+        """ Returns the parsed class file at path (see utilities.classfile), or None if it is no valid class file.
+        The result is cached as long as the file does not change, so all builders running in this environment share it. """
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        cached = self._class_files.get(path)
+        if cached is None or cached[0] != version:
+            try:
+                parsed = classfile.parse_file(path)
+            except classfile.ClassFormatError:
+                parsed = None
+            cached = (version, parsed)
+            self._class_files[path] = cached
+        return cached[1]
 
     def user(self):
         """ Returns the submitter of this program (class User). """
@@ -174,7 +278,7 @@ def truncated_log(log):
     log_length = len(log)
     if log_length > settings.TEST_MAXLOGSIZE*1024:
         # since we might be truncating utf8 encoded strings here, result may be erroneous, so we explicitly replace faulty byte tokens
-        return (force_text('======= Warning: Output too long, hence truncated ======\n' + log[0:(settings.TEST_MAXLOGSIZE*1024)/2] + "\n...\n...\n...\n...\n" + log[log_length-((settings.TEST_MAXLOGSIZE*1024)/2):], errors='replace'), True)
+        return (force_text('======= Warning: Output too long, hence truncated ======\n' + log[0:(settings.TEST_MAXLOGSIZE*1024)//2] + "\n...\n...\n...\n...\n" + log[log_length-((settings.TEST_MAXLOGSIZE*1024)//2):], errors='replace'), True)
     return (log, False)
 
 
@@ -196,6 +300,19 @@ class CheckerResult(models.Model):
     log = models.TextField(help_text=_('Text result of the checker'))
     creation_date = models.DateTimeField(auto_now_add=True)
     runtime = models.IntegerField(default=0, help_text=_('Runtime in milliseconds'))
+    user_time = models.IntegerField(null=True, blank=True, help_text=_('CPU time in user mode of the executed programs in milliseconds'))
+    system_time = models.IntegerField(null=True, blank=True, help_text=_('CPU time in kernel mode of the executed programs in milliseconds'))
+    max_rss = models.IntegerField(null=True, blank=True, help_text=_('Peak memory usage (resident set size) of the executed programs in kbytes'))
+    page_faults = models.IntegerField(null=True, blank=True, help_text=_('Page faults of the executed programs'))
+    output_size = models.BigIntegerField(null=True, blank=True, help_text=_('Size of the output of the executed programs in bytes'))
+    checker_version = models.PositiveIntegerField(default=1, help_text=_('Version of the checker which computed this result'))
+    cache_key = models.CharField(max_length=64, blank=True, db_index=True, help_text=_('Identifies the solution files and checker configuration this result was computed for'))
+
+    # Whether an executed program timed out, ran out of memory or had its output truncated.
+    # Set by set_log and add_usage, not stored: such results are not reused (see run_checker).
+    timed_out = False
+    oom_ed = False
+    truncated = False
 
     def title(self):
         """ Returns the title of the Checker that did run. """
@@ -227,18 +344,48 @@ class CheckerResult(models.Model):
             log = '<div class="error">Memory limit exceeded, execution cancelled.</div>' + log
 
         self.log = log
+        self.timed_out = self.timed_out or timed_out
+        self.truncated = self.truncated or truncated
+        self.oom_ed = self.oom_ed or oom_ed
 
     def set_passed(self, passed):
         """ Sets the passing state of the Checker. """
         assert isinstance(passed, int)
         self.passed = passed
 
+    def add_usage(self, usage):
+        """ Adds the resources used by a program executed by the Checker (as returned by execute_arglist). """
+        self.user_time = (self.user_time or 0) + usage['user_time']
+        self.system_time = (self.system_time or 0) + usage['system_time']
+        self.max_rss = max(self.max_rss or 0, usage['max_rss'])
+        self.page_faults = (self.page_faults or 0) + usage['page_faults']
+        self.output_size = (self.output_size or 0) + usage['output_size']
+        self.timed_out = self.timed_out or usage.get('timed_out', False)
+        self.oom_ed = self.oom_ed or usage.get('oom_ed', False)
+        self.truncated = self.truncated or usage.get('truncated', False)
+
+    def cpu_time(self):
+        """ CPU time of the executed programs in milliseconds, if measured """
+        if self.user_time is None:
+            return None
+        return self.user_time + (self.system_time or 0)
+
     def add_artefact(self, filename, path):
         assert os.path.isfile(path)
         artefact = CheckerResultArtefact(result = self, filename=filename)
         with open(path, 'rb') as fd:
             artefact.file.save(filename, File(fd))
 
+    def clone(self, solution):
+        """ Returns a copy of this result (including its artefacts) for another solution. """
+        result = CheckerResult(solution=solution, checker=self.checker, passed=self.passed, log=self.log, runtime=self.runtime,
+                               user_time=self.user_time, system_time=self.system_time, max_rss=self.max_rss, page_faults=self.page_faults, output_size=self.output_size,
+                               checker_version=self.checker_version, cache_key=self.cache_key)
+        result.save()
+        for artefact in self.artefacts.all():
+            result.add_artefact(artefact.filename, artefact.file.path)
+        return result
+
 def get_checkerresultartefact_upload_path(instance, filename):
     result = instance.result
     solution = result.solution
@@ -281,104 +428,407 @@ def solution_file_delete(sender, instance, **kwargs):
     except OSError:
         pass
 
-def check_solution(solution, run_all = 0, debug_keep_tmp = True):
-    """Builds and tests this solution."""
+@receiver(post_delete, sender=Task)
+def task_delete(sender, instance, **kwargs):
+    # The sandbox templates are not needed any more
+    sandbox.remove_templates(instance.id)
+
+class CheckerJob(models.Model):
+    """ A request to run the checkers of a solution, waiting in the checker queue.
+
+    Jobs are processed by the checker_worker management command, or right away
+    in the request if settings.USE_CHECKER_WORKER is disabled. Pending jobs with
+    a higher priority are processed first, otherwise jobs are processed in the
+    order they were queued. """
+
+    PENDING = 'P'
+    RUNNING = 'R'
+    DONE = 'D'
+    FAILED = 'F'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    # superseded submissions and bulk re-checks
+    PRIORITY_LOW = 0
+    PRIORITY_NORMAL = 10
+    # the latest submission of a user
+    PRIORITY_HIGH = 20
+
+    solution = models.ForeignKey(Solution, on_delete=models.CASCADE)
+    run_all = models.BooleanField(default=False, help_text=_('Also run the checkers which are not always run on submission.'))
+    submission = models.BooleanField(default=False, help_text=_('Indicates whether the solution is a regular submission, which becomes the final solution and is confirmed by email once it is accepted.'))
+    uploader = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, help_text=_('The trainer who uploaded the solution in the name of its author, if any.'))
+    priority = models.IntegerField(default=PRIORITY_NORMAL, help_text=_('Pending jobs with higher priority are checked first.'))
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0, help_text=_('Number of times a worker started this job.'))
+    error = models.TextField(blank=True, help_text=_('Traceback of the last failed attempt.'))
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        app_label = 'checker'
+        ordering = ['-priority', 'created', 'id']
+
+    def __str__(self):
+        return "%s (%s)" % (self.solution, self.get_status_display())
+
+    @classmethod
+    def enqueue(cls, solution, run_all = False, submission = False, uploader = None):
+        """ Queues a check of the solution and returns the new job.
+        A new submission takes precedence over the pending submissions of the same author. """
+        priority = cls.PRIORITY_NORMAL
+        if submission:
+            priority = cls.PRIORITY_HIGH
+            cls.objects.filter(status=cls.PENDING, submission=True, solution__task=solution.task, solution__author=solution.author) \
+                       .update(priority=cls.PRIORITY_LOW)
+        return cls.objects.create(solution=solution, run_all=run_all, submission=submission, uploader=uploader, priority=priority)
+
+    @classmethod
+    def claim_next(cls):
+        """ Claims and returns the next pending job, or None if the queue is empty.
+        Safe to be called by several workers at once. """
+        while True:
+            candidates = list(cls.objects.filter(status=cls.PENDING)[:10])
+            if not candidates:
+                return None
+            for job in candidates:
+                if job.claim():
+                    return job
+
+    @classmethod
+    def requeue_stale(cls, max_age):
+        """ Returns jobs to the queue whose worker did not finish them within max_age (a timedelta), e.g. because it was killed.
+        Jobs which have already been tried settings.CHECKER_JOB_MAX_ATTEMPTS times fail instead. """
+        now = datetime.now()
+        stale = cls.objects.filter(status=cls.RUNNING, started__lt=now - max_age)
+        failed = stale.filter(attempts__gte=settings.CHECKER_JOB_MAX_ATTEMPTS) \
+                      .update(status=cls.FAILED, error="The worker did not finish checking the solution.", finished=now)
+        return failed + stale.update(status=cls.PENDING)
+
+    def claim(self):
+        """ Marks this job as running. Returns False if another worker was faster. """
+        now = datetime.now()
+        claimed = CheckerJob.objects.filter(pk=self.pk, status=self.PENDING) \
+                                    .update(status=self.RUNNING, started=now, attempts=models.F('attempts') + 1)
+        if claimed:
+            self.status = self.RUNNING
+            self.started = now
+            self.attempts += 1
+        return bool(claimed)
+
+    def run(self):
+        """ Runs the checkers of a claimed job. Failed attempts are retried up to settings.CHECKER_JOB_MAX_ATTEMPTS times. """
+        assert self.status == self.RUNNING
+        try:
+            check_solution(self.solution, self.run_all)
+            if self.submission:
+                self.solution.finish_submission(self.uploader)
+        except Exception:
+            self.error = traceback.format_exc()
+            self.status = self.PENDING if self.attempts < settings.CHECKER_JOB_MAX_ATTEMPTS else self.FAILED
+        else:
+            self.error = ''
+            self.status = self.DONE
+        self.finished = datetime.now()
+        self.save()
+
+    def process(self):
+        """ Claims and runs this job in the current process. Returns False if another process claimed it first. """
+        if not self.claim():
+            return False
+        self.run()
+        return True
+
+    def is_finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+    def queue_position(self):
+        """ Number of pending jobs which will be processed before this one. """
+        return CheckerJob.objects.filter(status=self.PENDING) \
+            .filter(Q(priority__gt=self.priority) | Q(priority=self.priority, created__lt=self.created) | Q(priority=self.priority, created=self.created, id__lt=self.id)) \
+            .count()
+
+def queue_check(solution, run_all = False, submission = False, uploader = None):
+    """ Queues the solution for checking and returns the job.
+    Without a checker worker, the job is processed right away, and failed attempts are retried right away. """
+    job = CheckerJob.enqueue(solution, run_all, submission, uploader)
+    if not settings.USE_CHECKER_WORKER:
+        while job.status == CheckerJob.PENDING:
+            if not job.process():
+                # a checker worker got it first, e.g. one still running after USE_CHECKER_WORKER was disabled
+                job.refresh_from_db()
+                break
+    return job
+
+def check_solution(solution, run_all = 0, debug_keep_tmp = True, incremental = False):
+    """Builds and tests this solution. If incremental, only changed checkers are run again, see run_checks."""
 
-    # Delete previous results if the checkers have already been run
-    solution.checkerresult_set.all().delete()
     # set up environment
     env = CheckerEnvironment(solution)
 
     solution.copySolutionFiles(env.tmpdir())
-    run_checks(solution, env, run_all)
+    run_checks(solution, env, run_all, incremental)
 
     # Delete temporary directory
     if not(debug_keep_tmp and settings.DEBUG):
-        try:
-            shutil.rmtree(env.tmpdir())
-        except:
-            pass
+        sandbox.release_sandbox(env.tmpdir())
 
-# Assumes to be called from within a @transaction.autocommit Context!!!!
-def check_with_own_connection(solution,run_all = True, debug_keep_tmp = True):
-    # Close the current db connection - will cause Django to create a new connection (not shared with other processes)
-    # when one is needed, see https://groups.google.com/forum/#!msg/django-users/eCAIY9DAfG0/6DMyz3YuQDgJ
-    connection.close()
-    check_solution(solution, run_all, debug_keep_tmp)
-
-    # Don't leave idle connections behind
-    connection.close()
-
-def check_with_own_connection_rev(run_all, debug_keep_tmp, solution):
-    return check_with_own_connection(solution, run_all, debug_keep_tmp)
-
-
-def check_multiple(solutions, run_secret = False, debug_keep_tmp = False):
-    if settings.NUMBER_OF_TASKS_TO_BE_CHECKED_IN_PARALLEL <= 1:
-        for solution in solutions:
-            solution.check_solution(run_secret, debug_keep_tmp)
+def check_in_worker(solution_id, run_all, debug_keep_tmp, incremental):
+    """ Checks a single solution in a process of the checker pool. Returns the id of the solution and
+    the traceback of the error which occurred while checking it, if any. The connection of the process is kept open
+    for the next solution. """
+    db.close_old_connections()
+    try:
+        solution = Solution.objects.get(pk = solution_id)
+        check_solution(solution, run_all, debug_keep_tmp, incremental)
+        return (solution_id, None)
+    except:
+        return (solution_id, traceback.format_exc())
+    finally:
+        db.close_old_connections()
+
+# The settings which may have been changed after they were loaded, e.g. by the test runner, for the checker pool
+CHECKER_POOL_SETTINGS = ['DATABASES', 'UPLOAD_ROOT', 'SANDBOX_DIR', 'CACHES']
+
+def check_multiple(solutions, run_secret = False, debug_keep_tmp = False, progress = None, incremental = False):
+    """ Checks the solutions, in parallel if settings.NUMBER_OF_TASKS_TO_BE_CHECKED_IN_PARALLEL > 1.
+    If incremental, only the checkers which changed since the last check are run again.
+    If given, progress(solution_id, done, total, error) is called as soon as a solution has been checked.
+    Returns the number of solutions which could be checked without errors. """
+    solution_ids = [solution.id for solution in solutions]
+    total = len(solution_ids)
+    succeeded = 0
+    # Like the checker threads of run_checks, the processes of the pool cannot see the changes of an open transaction
+    if settings.NUMBER_OF_TASKS_TO_BE_CHECKED_IN_PARALLEL <= 1 or connection.in_atomic_block:
+        for done, solution in enumerate(solutions, 1):
+            # like check_in_worker, an error only fails this solution
+            try:
+                solution.check_solution(run_secret, debug_keep_tmp, incremental)
+            except Exception:
+                error = traceback.format_exc()
+            else:
+                error = None
+                succeeded += 1
+            if progress:
+                progress(solution.id, done, total, error)
     else:
-        check_it = partial(check_with_own_connection_rev, run_secret, debug_keep_tmp)
-
-        pool = Pool(processes=settings.NUMBER_OF_TASKS_TO_BE_CHECKED_IN_PARALLEL)  # Check n solutions at once
-        pool.map(check_it, solutions, 1)
+        # The pool only lives as long as this call, so no worker keeps stale state (e.g. the sandbox templates)
+        from django.core.files.storage import default_storage
+        runtime_settings = dict((name, getattr(settings, name)) for name in CHECKER_POOL_SETTINGS)
+        pool = multiprocessing.get_context('forkserver').Pool(processes = settings.NUMBER_OF_TASKS_TO_BE_CHECKED_IN_PARALLEL,
+                initializer = checker_pool.init_worker, initargs = (runtime_settings, default_storage.location))
+        jobs = [(solution_id, run_secret, debug_keep_tmp, incremental) for solution_id in solution_ids]
+        try:
+            for done, (solution_id, error) in enumerate(pool.imap_unordered(checker_pool.check, jobs), 1):
+                if error is None:
+                    succeeded += 1
+                if progress:
+                    progress(solution_id, done, total, error)
+        except BaseException:
+            pool.terminate()
+            raise
+        # let the workers delete their sandboxes
+        pool.close()
+        pool.join()
+    return succeeded
+
+
+def checker_predecessors(checkers, readers):
+    """ Returns for each of the checkers (in order) the set of indices of the checkers it requires() and of the last earlier checker
+    which writes to the sandbox. If readers, a checker which writes to the sandbox also gets all checkers since the last earlier one. """
+    predecessors = []
+    last_writer = None
+    since_last_writer = []
+    for i, checker in enumerate(checkers):
+        requirements = checker.requires()
+        deps = set(j for j in range(i) if any(issubclass(checkers[j].__class__, requirement) for requirement in requirements))
+        if last_writer is not None:
+            deps.add(last_writer)
+        if checker.sandbox_access() == Checker.SANDBOX_WRITE:
+            if readers:
+                deps.update(since_last_writer)
+            last_writer = i
+            since_last_writer = []
+        else:
+            since_last_writer.append(i)
+        predecessors.append(deps)
+    return predecessors
+
+def checker_dependencies(checkers):
+    """ Returns for each of the checkers (in order) the set of indices of the earlier checkers which have to be finished before it may start:
+    the checkers it requires(), and, depending on sandbox_access(), all earlier resp. the last earlier checker which writes to the sandbox. """
+    return checker_predecessors(checkers, readers=True)
+
+def checker_inputs(checkers):
+    """ Returns for each of the checkers (in order) the set of indices of the earlier checkers whose outcome it may depend on:
+    the checkers it requires() and the last earlier checker which writes to the sandbox. """
+    return checker_predecessors(checkers, readers=False)
+
+def checker_cache_keys(solution, checkers, inputs):
+    """ Returns for each of the checkers the key under which its result for the solution may be reused:
+    a hash of the solution files, the author, the fingerprint of the checker and the keys of its inputs. """
+    solution_hash = solution.get_hash()
+    keys = []
+    for checker, deps in zip(checkers, inputs):
+        s = sha256()
+        s.update(solution_hash.encode('ascii'))
+        s.update(str(solution.author_id).encode('ascii'))
+        s.update(checker.fingerprint().encode('ascii'))
+        for j in sorted(deps):
+            s.update(keys[j].encode('ascii'))
+        keys.append(s.hexdigest())
+    return keys
+
+def cached_result(solution, checker, key):
+    """ Returns a result of the checker stored under the key, preferring a result of the solution itself. """
+    candidates = CheckerResult.objects.filter(content_type=ContentType.objects.get_for_model(checker), object_id=checker.id, cache_key=key)
+    return candidates.filter(solution=solution).first() or candidates.first()
+
+def unchanged_results(solution, checkers, inputs):
+    """ Returns the results of the solution by the index of their checker, which are still valid:
+    neither the checker nor (transitively) one of its inputs has a new version since the result was computed. """
+    existing = {}
+    for result in solution.checkerresult_set.all():
+        existing[(result.content_type_id, result.object_id)] = result
+    changed = set()
+    unchanged = {}
+    for i, checker in enumerate(checkers):
+        result = existing.get((ContentType.objects.get_for_model(checker).id, checker.id))
+        if result is None or result.checker_version != checker.version or inputs[i] & changed:
+            changed.add(i)
+        else:
+            unchanged[i] = result
+    return unchanged
+
+def reusable_results(checkers, candidates):
+    """ Returns those of the candidate results (by index of their checker) which may be reused.
+    A result of a checker which changes the sandbox is only reused if no later checker has to be run. """
+    reused = {}
+    later_checker_runs = False
+    for i in reversed(range(len(checkers))):
+        if i in candidates and not (later_checker_runs and checkers[i].sandbox_access() == Checker.SANDBOX_WRITE):
+            reused[i] = candidates[i]
+        else:
+            later_checker_runs = True
+    return reused
+
+def run_checker(checker, env, passed_checkers, cache_key = ''):
+    """ Runs a single checker and saves its result. passed_checkers are the classes of the earlier checkers which passed.
+    The result may later be reused under cache_key. """
+    # Check dependencies -> This requires the right order of the checkers
+    can_run_checker = True
+    for requirement in checker.requires():
+        passed_requirement = False
+        for passed_checker in passed_checkers:
+            passed_requirement = passed_requirement or issubclass(passed_checker, requirement)
+        can_run_checker = can_run_checker and passed_requirement
+
+    start_time = time.time()
+
+    if can_run_checker:
+        # Invoke Checker
+        if settings.DEBUG or 'test' in sys.argv:
+            result = checker.run(env)
+        else:
+            try:
+                result = checker.run(env)
+            except:
+                result = checker.create_result(env)
+                result.set_log("The Checker caused an unexpected internal error.")
+                result.set_passed(False)
+                cache_key = ''
+                #TODO: Email Admins
+    else:
+        # make non passed result
+        # this as well as the dependency check should propably go into checker class
+        result = checker.create_result(env)
+        result.set_log("Checker konnte nicht ausgeführt werden, da benötigte Checker nicht bestanden wurden.")
+        result.set_passed(False)
+
+    elapsed_time = time.time() - start_time
+    result.runtime = int(elapsed_time*1000)
+    result.log = result.log.replace("\x00", "")
+    if result.timed_out or result.oom_ed or result.truncated:
+        # may depend on the load of the machine, or on output which was thrown away
+        cache_key = ''
+    result.cache_key = cache_key
+    result.checker_version = checker.version
+    result.save()
+    return result
+
+def run_checker_concurrently(checker, env, passed_checkers, cache_key):
+    """ Runs a checker in a thread of the pool in run_checks. """
+    private_env = None
+    try:
+        if checker.sandbox_access() == Checker.SANDBOX_PRIVATE:
+            private_env = env.private_copy()
+        return run_checker(checker, private_env or env, passed_checkers, cache_key)
+    finally:
+        if private_env is not None:
+            sandbox.release_sandbox(private_env.tmpdir())
+        # Don't leave idle connections of this thread behind
         connection.close()
 
-
-
-
-
-def run_checks(solution, env, run_all):
-    """  """
-
-    passed_checkers = set()
-    checkers = solution.task.get_checkers()
+def run_checks(solution, env, run_all, incremental = False):
+    """ Runs all checkers of the task of the solution (only those always run on submission unless run_all)
+    and computes whether the solution was accepted. If settings.NUMBER_OF_CHECKERS_RUN_IN_PARALLEL > 1 and no transaction is open,
+    checkers which do not depend on each other (see checker_dependencies) run concurrently.
+    If incremental, previous results of the solution are kept unless their checker changed (see unchanged_results). """
+
+    checkers = [checker for checker in solution.task.get_checkers() if checker.always or run_all]
+    dependencies = checker_dependencies(checkers)
+    results = [None] * len(checkers)
+
+    # Reuse the results of unchanged checkers and of identical solutions
+    inputs = checker_inputs(checkers)
+    keys = checker_cache_keys(solution, checkers, inputs)
+    candidates = unchanged_results(solution, checkers, inputs) if incremental else {}
+    if settings.CACHE_CHECKER_RESULTS:
+        for i, checker in enumerate(checkers):
+            if i not in candidates:
+                result = cached_result(solution, checker, keys[i])
+                if result is not None:
+                    candidates[i] = result
+    reused = reusable_results(checkers, candidates)
+    # Delete previous results if the checkers have already been run
+    solution.checkerresult_set.exclude(id__in=[result.id for result in reused.values()]).delete()
+    for i, result in reused.items():
+        results[i] = result if result.solution_id == solution.id else result.clone(solution)
+
+    def passed_before(deps):
+        return set(checkers[j].__class__ for j in deps if results[j].passed)
+
+    # The threads use connections of their own, which cannot see the changes of an open transaction
+    # (e.g. of Task.import_Tasks), so they are only used outside of transactions.
+    if settings.NUMBER_OF_CHECKERS_RUN_IN_PARALLEL <= 1 or connection.in_atomic_block:
+        for i, checker in enumerate(checkers):
+            if results[i] is None:
+                results[i] = run_checker(checker, env, passed_before(range(i)), keys[i])
+    else:
+        waiting = set(i for i in range(len(checkers)) if results[i] is None)
+        running = {}
+        with ThreadPoolExecutor(max_workers=settings.NUMBER_OF_CHECKERS_RUN_IN_PARALLEL) as executor:
+            while waiting or running:
+                for i in sorted(waiting):
+                    if all(results[j] is not None for j in dependencies[i]):
+                        waiting.remove(i)
+                        running[executor.submit(run_checker_concurrently, checkers[i], env, passed_before(dependencies[i]), keys[i])] = i
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
 
     solution_accepted = True
     solution.warnings = False
-    for checker in checkers:
-        if (checker.always or run_all):
-            # Check dependencies -> This requires the right order of the checkers
-            can_run_checker = True
-            for requirement in checker.requires():
-                passed_requirement = False
-                for passed_checker in passed_checkers:
-                    passed_requirement = passed_requirement or issubclass(passed_checker, requirement)
-                can_run_checker = can_run_checker and passed_requirement
-
-            start_time = time.time()
-
-            if can_run_checker:
-                # Invoke Checker
-                if settings.DEBUG or 'test' in sys.argv:
-                    result = checker.run(env)
-                else:
-                    try:
-                        result = checker.run(env)
-                    except:
-                        result = checker.create_result(env)
-                        result.set_log("The Checker caused an unexpected internal error.")
-                        result.set_passed(False)
-                        #TODO: Email Admins
+    for checker, result in zip(checkers, results):
+        if not result.passed and checker.show_publicly(result.passed):
+            if checker.required:
+                solution_accepted = False
             else:
-                # make non passed result
-                # this as well as the dependency check should propably go into checker class
-                result = checker.create_result(env)
-                result.set_log("Checker konnte nicht ausgeführt werden, da benötigte Checker nicht bestanden wurden.")
-                result.set_passed(False)
-
-            elapsed_time = time.time() - start_time
-            result.runtime = int(elapsed_time*1000)
-            result.log = result.log.replace("\x00", "")
-            result.save()
-
-            if not result.passed and checker.show_publicly(result.passed):
-                if checker.required:
-                    solution_accepted = False
-                else:
-                    solution.warnings= True
-
-            if result.passed:
-                passed_checkers.add(checker.__class__)
+                solution.warnings= True
     solution.accepted = solution_accepted
     solution.save()
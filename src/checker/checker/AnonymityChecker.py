@@ -72,6 +72,10 @@ class AnonymityChecker(Checker):
         #_de(u"Diese Prüfung ist bestanden, wenn alle eingereichten Dateien weder Ihren Vor- noch Ihre Nachnamen enthalten.")
         return _("This check fails if a submitted file contains your first or last name.")
 
+    def sandbox_access(self):
+        """ Only reads the files in the sandbox. """
+        return self.SANDBOX_READ
+
     def run(self, env):
         result = self.create_result(env)
         log = ""
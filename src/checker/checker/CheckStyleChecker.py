@@ -25,6 +25,10 @@ class CheckStyleChecker(Checker):
         return "Runs checkstyle (http://checkstyle.sourceforge.net/)."
 
 
+    def sandbox_access(self):
+        """ Writes files to the sandbox which no other checker needs. """
+        return self.SANDBOX_PRIVATE
+
     def run(self, env):
 
         # Save save check configuration
@@ -32,19 +36,22 @@ class CheckStyleChecker(Checker):
         copy_file(self.configuration.path, config_path)
 
         # Run the tests
-        args = [settings.JVM, "-cp", settings.CHECKSTYLEALLJAR, "-Dbasedir=.", "com.puppycrawl.tools.checkstyle.Main", "-c", "checks.xml"] + [name for (name, content) in env.sources()]
-        [output, error, exitcode, timed_out, oom_ed] = execute_arglist(args, env.tmpdir())
+        args = [settings.JVM, "-cp", settings.CHECKSTYLEALLJAR, "-Dbasedir=.", "com.puppycrawl.tools.checkstyle.Main", "-c", "checks.xml"] + env.source_names()
+        [output, error, exitcode, timed_out, oom_ed, truncated, usage] = execute_arglist(args, env.tmpdir())
 
         # Remove Praktomat-Path-Prefixes from result:
         output = re.sub(r"^"+re.escape(env.tmpdir())+"/+", "", output, flags=re.MULTILINE)
 
         result = self.create_result(env)
+        result.add_usage(usage)
 
         log = '<pre>' + escape(output) + '</pre>'
         if timed_out:
             log = log + '<div class="error">Timeout occured!</div>'
         if oom_ed:
             log = log + '<div class="error">Out of memory!</div>'
+        if truncated:
+            log = log + '<div class="error">Output too long, truncated</div>'
         result.set_log(log)
 
 
@@ -44,7 +44,10 @@ class CheckerWithFile(Checker):
         """
         clashes = []
         cleanpath = self.path.lstrip("/ ")
-        if (self.unpack_zipfile):
+        template = env.sandbox_template()
+        if template is not None and template.provides(self):
+            clashes = template.materialise(self, env.tmpdir(), lambda f: self.add_to_environment(env, f))
+        elif (self.unpack_zipfile):
             path = os.path.join(env.tmpdir(), cleanpath)
             unpack_zipfile_to(self.file.path, path,
                 lambda n: clashes.append(os.path.join(cleanpath, n)),
@@ -27,7 +27,7 @@ class IgnoringHaskellBuilder(HaskellBuilder):
 
     def get_file_names(self, env):
         rxarg = re.compile(self.rxarg())
-        return [name for (name, content) in env.sources() if rxarg.match(name) and (not name in self._ignore)]
+        return [name for name in env.source_names() if rxarg.match(name) and (not name in self._ignore)]
 
     def create_result(self, env):
         assert isinstance(env.solution(), Solution)
@@ -110,11 +110,13 @@ class HaskellTestFrameWorkChecker(CheckerWithFile):
         environ['UPLOAD_ROOT'] = settings.UPLOAD_ROOT
 
         cmd = ["./"+self.module_binary_name(), "--maximum-generated-tests=1000"]
-        [output, error, exitcode, timed_out, oom_ed] = execute_arglist(cmd, env.tmpdir(), environment_variables=environ, timeout=settings.TEST_TIMEOUT, fileseeklimit=settings.TEST_MAXFILESIZE)
+        [output, error, exitcode, timed_out, oom_ed, truncated, usage] = execute_arglist(cmd, env.tmpdir(), environment_variables=environ, timeout=settings.TEST_TIMEOUT, fileseeklimit=settings.TEST_MAXFILESIZE)
 
         result = self.create_result(env)
+        result.add_usage(usage)
 
-        (output, truncated) = truncated_log(output)
+        (output, log_truncated) = truncated_log(output)
+        truncated = truncated or log_truncated
         output = '<pre>' + escape(self.test_description) + '\n\n======== Test Results ======\n\n</pre><br/><pre>' + escape(output) + '</pre>'
 
         if self.include_testcase_in_report in ["FULL", "DL"]:
@@ -32,6 +32,10 @@ class InterfaceChecker(Checker):
         s = "Diese Prüfung ist bestanden, wenn alle vorgegebenen Interfaces implementiert wurden."
         return s
 
+    def sandbox_access(self):
+        """ Only reads the files in the sandbox. """
+        return self.SANDBOX_READ
+
     def run(self, env):
         """  Test if all interfaces were implemented correctly
         If so, the interfaces are added to make it possible to compile them  """
@@ -35,7 +35,7 @@ class IsabelleChecker(Checker):
 
     def run(self, env):
 
-        thys = [('%s' % os.path.splitext(name__[0])[0]) for name__ in env.sources()]
+        thys = [('%s' % os.path.splitext(name)[0]) for name in env.source_names()]
         additional_thys = ['%s' % name for name in re.split(" |,", self.additional_theories) if name]
         user_thys = [name for name in thys if name not in additional_thys]
 
@@ -53,7 +53,7 @@ class IsabelleChecker(Checker):
             args += ["-T", t]
         args += ["-l", self.logic]
 
-        (output, error, exitcode, timed_out, oom_ed) = execute_arglist(args, env.tmpdir(), timeout=settings.TEST_TIMEOUT, error_to_output=False)
+        (output, error, exitcode, timed_out, oom_ed, truncated, usage) = execute_arglist(args, env.tmpdir(), timeout=settings.TEST_TIMEOUT, error_to_output=False)
 
         if timed_out:
             output += "\n\n---- check aborted after %d seconds ----\n" % settings.TEST_TIMEOUT
@@ -61,7 +61,11 @@ class IsabelleChecker(Checker):
         if oom_ed:
             output += "\n\n---- check aborted, out of memory ----\n"
 
+        if truncated:
+            output += "\n\n---- output too long, truncated ----\n"
+
         result = self.create_result(env)
+        result.add_usage(usage)
         result.set_log('<pre>' + escape(output) + '</pre>')
         result.set_passed(not timed_out and not oom_ed and self.output_ok(output))
 
@@ -8,6 +8,7 @@ from django.utils.html import escape
 from checker.basemodels import Checker, CheckerResult, CheckerFileField, truncated_log
 from checker.admin import    CheckerInline, AlwaysChangedModelForm
 from utilities.safeexec import execute_arglist
+from utilities import javaserver
 from utilities.file_operations import *
 from solutions.models import Solution
 
@@ -20,7 +21,7 @@ class IgnoringJavaBuilder(JavaBuilder):
 
     def get_file_names(self, env):
         rxarg = re.compile(self.rxarg())
-        return [name for (name, content) in env.sources() if rxarg.match(name) and (not name in self._ignore)]
+        return [name for name in env.source_names() if rxarg.match(name) and (not name in self._ignore)]
 
     # Since this checkers instances  will not be saved(), we don't save their results, either
     def create_result(self, env):
@@ -46,8 +47,16 @@ class JUnitChecker(Checker):
     )
     junit_version = models.CharField(max_length=16, choices=JUNIT_CHOICES, default="junit3")
 
+    RUNNERS = {'junit4' : 'org.junit.runner.JUnitCore', 'junit3' : 'junit.textui.TestRunner' }
+
     def runner(self):
-        return {'junit4' : 'org.junit.runner.JUnitCore', 'junit3' : 'junit.textui.TestRunner' }[self.junit_version]
+        return self.RUNNERS[self.junit_version]
+
+    def use_java_server(self, env):
+        """ The java server only runs the standard runners, and its working directory is not the sandbox,
+        so tests which read files from the data/ subdirectory run in a JVM of their own. """
+        return (javaserver.available() and self.runner() == self.RUNNERS[self.junit_version]
+                and not os.path.exists(os.path.join(env.tmpdir(), "data")))
 
     def title(self):
         return "JUnit Test: " + self.name
@@ -59,6 +68,10 @@ class JUnitChecker(Checker):
     def output_ok(self, output):
         return (RXFAIL.search(output) == None)
 
+    def sandbox_access(self):
+        """ Writes files to the sandbox which no other checker needs. """
+        return self.SANDBOX_PRIVATE
+
     def run(self, env):
         java_builder = IgnoringJavaBuilder(_flags="", _libs=self.junit_version, _file_pattern=r"^.*\.[jJ][aA][vV][aA]$", _output_flags="", _main_required=False)
         java_builder._ignore = self.ignore.split(" ")
@@ -79,12 +92,22 @@ class JUnitChecker(Checker):
         script_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scripts')
         environ['POLICY'] = os.path.join(script_dir, "junit.policy")
 
-        cmd = [settings.JVM_SECURE, "-cp", settings.JAVA_LIBS[self.junit_version]+":.", self.runner(), self.class_name]
-        [output, error, exitcode, timed_out, oom_ed] = execute_arglist(cmd, env.tmpdir(), environment_variables=environ, timeout=settings.TEST_TIMEOUT, fileseeklimit=settings.TEST_MAXFILESIZE, extradirs=[script_dir])
+        response = None
+        if self.use_java_server(env):
+            response = javaserver.run_junit(env.tmpdir(), [settings.JAVA_LIBS[self.junit_version], "."], self.junit_version, self.class_name, settings.TEST_TIMEOUT)
+        if response is not None:
+            [output, exitcode, timed_out, oom_ed, truncated] = response
+            usage = None
+        else:
+            cmd = [settings.JVM_SECURE, "-cp", settings.JAVA_LIBS[self.junit_version]+":.", self.runner(), self.class_name]
+            [output, error, exitcode, timed_out, oom_ed, truncated, usage] = execute_arglist(cmd, env.tmpdir(), environment_variables=environ, timeout=settings.TEST_TIMEOUT, fileseeklimit=settings.TEST_MAXFILESIZE, extradirs=[script_dir])
 
         result = self.create_result(env)
+        if usage is not None:
+            result.add_usage(usage)
 
-        (output, truncated) = truncated_log(output)
+        (output, log_truncated) = truncated_log(output)
+        truncated = truncated or log_truncated
         output = '<pre>' + escape(self.test_description) + '\n\n======== Test Results ======\n\n</pre><br/><pre>' + escape(output) + '</pre>'
 
 
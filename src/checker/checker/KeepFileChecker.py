@@ -19,6 +19,10 @@ class KeepFileChecker(Checker):
     def title(self):
         return "Keep file %s" % self.filename
 
+    def sandbox_access(self):
+        """ Only reads the files in the sandbox. """
+        return self.SANDBOX_READ
+
     def run(self, env):
         path = os.path.join(env.tmpdir(), self.filename)
 
@@ -30,6 +30,10 @@ class LineCounter(Checker):
         # _de(u"Diese Prüfung wird immer bestanden.")
         return ugettext("This check is always passed.")
 
+    def sandbox_access(self):
+        """ Only reads the files in the sandbox. """
+        return self.SANDBOX_READ
+
     def run(self, env):
         """ Here's the actual work.     This runs the check in the environment ENV,
         returning a CheckerResult. """
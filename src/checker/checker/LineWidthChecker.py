@@ -34,6 +34,10 @@ class LineWidthChecker(Checker):
         line = line.expandtabs(self.tab_width)
         return line
 
+    def sandbox_access(self):
+        """ Only reads the files in the sandbox. """
+        return self.SANDBOX_READ
+
     def run(self, env):
         """ Here's the actual work.     This runs the check in the environment ENV,
         returning a CheckerResult. """
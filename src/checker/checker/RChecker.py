@@ -37,11 +37,11 @@ class RChecker(Checker):
 
 
     def run(self, env):
-        thys = [('"%s"' % os.path.splitext(name__[0])[0]) for name__ in env.sources()]
+        thys = [('"%s"' % os.path.splitext(name)[0]) for name in env.source_names()]
 
         R_files = [
             name
-            for (name, content) in env.sources()
+            for name in env.source_names()
             if os.path.splitext(name)[1] == '.R'
             ]
 
@@ -76,7 +76,7 @@ class RChecker(Checker):
                 scriptname = R_files[0]
 
         args = ["Rscript", scriptname]
-        (output, error, exitcode, timed_out, oom_ed) = execute_arglist(
+        (output, error, exitcode, timed_out, oom_ed, truncated, usage) = execute_arglist(
             args,
             env.tmpdir(),
             timeout=settings.TEST_TIMEOUT,
@@ -94,6 +94,9 @@ class RChecker(Checker):
         if oom_ed:
             output += "\n\n---- script execution aborted, out of memory ----\n"
 
+        if truncated:
+            output += "\n\n---- output too long, truncated ----\n"
+
         if exitcode != 0:
             output += "\n\n---- Rscript finished with exitcode %d ----\n" % exitcode
 
@@ -101,6 +104,7 @@ class RChecker(Checker):
         rplots_exists = os.path.isfile(rplots_path)
 
         result = self.create_result(env)
+        result.add_usage(usage)
 
         if rplots_exists:
             if self.keep_plots:
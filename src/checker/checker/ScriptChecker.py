@@ -46,7 +46,7 @@ class ScriptChecker(Checker):
 
         # Run the tests -- execute dumped shell script 'script.sh'
 
-        filenames = [name for (name, content) in env.sources()]
+        filenames = env.source_names()
         args = [path] + filenames
 
         environ = {}
@@ -62,7 +62,7 @@ class ScriptChecker(Checker):
 
         script_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scripts')
 
-        [output, error, exitcode, timed_out, oom_ed] = execute_arglist(
+        [output, error, exitcode, timed_out, oom_ed, truncated, usage] = execute_arglist(
                             args,
                             working_directory=env.tmpdir(),
                             environment_variables=environ,
@@ -74,7 +74,9 @@ class ScriptChecker(Checker):
         output = force_text(output, errors='replace')
 
         result = self.create_result(env)
-        (output, truncated) = truncated_log(output)
+        result.add_usage(usage)
+        (output, log_truncated) = truncated_log(output)
+        truncated = truncated or log_truncated
 
         if self.remove:
             output = re.sub(self.remove, "", output)
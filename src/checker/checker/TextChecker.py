@@ -31,6 +31,10 @@ class TextChecker(Checker):
         return "Diese Prüfung ist bestanden, wenn der eingegebene Text in einer Lösung gefunden wird."
 
 
+    def sandbox_access(self):
+        """ Only reads the files in the sandbox. """
+        return self.SANDBOX_READ
+
     def run(self, env):
         """ Checks if the specified text is included in a submitted file """
         result = self.create_result(env)
@@ -75,7 +75,7 @@ class Builder(Checker):
 
     def get_file_names(self, env):
         rxarg = re.compile(self.rxarg())
-        return [name for (name, content) in env.sources() if rxarg.match(name)]
+        return [name for name in env.source_names() if rxarg.match(name)]
 
     def exec_file(self, tmpdir, program_name):
         """ File of the generated executable.  To be overloaded in subclasses. """
@@ -119,8 +119,9 @@ class Builder(Checker):
 
         filenames = [name for name in self.get_file_names(env)]
         args = [self.compiler()] + self.output_flags(env) + self.flags(env) + filenames + self.libs()
-        script_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scripts')
-        [output, _, _, _, _]  = execute_arglist(args, env.tmpdir(), self.environment(), extradirs=[script_dir])
+        (output, usage) = self.compile(env, args, filenames)
+        if usage is not None:
+            result.add_usage(usage)
 
         output = escape(output)
         output = self.enhance_output(env, output)
@@ -141,6 +142,13 @@ class Builder(Checker):
         result.set_log(log)
         return result
 
+    def compile(self, env, args, filenames):
+        """ Runs the compiler command line args. Returns its output and resource usage (None if unknown).
+        May be overloaded by subclasses. """
+        script_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scripts')
+        [output, _, _, _, _, _, usage]  = execute_arglist(args, env.tmpdir(), self.environment(), extradirs=[script_dir])
+        return (output, usage)
+
     def build_log(self, output, args, filenames):
         t = get_template('checker/compiler/builder_report.html')
         return t.render({
@@ -47,7 +47,8 @@ class HaskellBuilder(Builder):
 
         filenames = [name for name in self.get_file_names(env)]
         args = [self.compiler()] + self.flags(env) + filenames + self.libs()
-        [output, _, _, _, _]  = execute_arglist(args, env.tmpdir(), self.environment())
+        [output, _, _, _, _, _, usage]  = execute_arglist(args, env.tmpdir(), self.environment())
+        result.add_usage(usage)
 
         has_main = re.search(r"^Linking ([^ ]*) ...$", output, re.MULTILINE)
         if has_main: self._detected_main = has_main.group(1)
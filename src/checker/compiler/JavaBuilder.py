@@ -11,7 +11,7 @@ from django.conf import settings
 from django.template.loader import get_template
 from checker.basemodels import Checker
 
-from utilities.safeexec import execute_arglist
+from utilities import javaserver
 from functools import reduce
 
 
@@ -23,18 +23,14 @@ class ClassFileGeneratingBuilder(Builder):
 
     def main_module(self, env):
         """ find the first class file containing a main method """
-        main_method = "public static void main(java.lang.String[])"
-        main_method_varargs = "public static void main(java.lang.String...)"
-        class_name  = re.compile(r"^(public )?(abstract )?(final )?(class|interface) ([^ ]*)( extends .*)?( implements .*)? \{$", re.MULTILINE)
         class_files = []
         for dirpath, dirs, files in os.walk(env.tmpdir()):
             for filename in files:
                 if filename.endswith(".class"):
                     class_files.append(filename)
-                    [classinfo, _, _, _, _]  = execute_arglist([settings.JAVAP, os.path.join(dirpath, filename)], env.tmpdir(), self.environment(), unsafe=True)
-                    if classinfo.find(main_method) >= 0 or classinfo.find(main_method_varargs) >= 0:
-                        main_class_name = class_name.search(classinfo, re.MULTILINE).group(5)
-                        return main_class_name
+                    classinfo = env.class_file(os.path.join(dirpath, filename))
+                    if classinfo is not None and classinfo.has_main_method():
+                        return classinfo.name
 
         raise self.NotFoundError("A class containing the main method ('public static void main(String[] args)') could not be found in the files %s" % ", ".join(class_files))
 
@@ -48,15 +44,25 @@ class JavaBuilder(ClassFileGeneratingBuilder):
     _env['JAVAC'] = settings.JAVA_BINARY
     _env['JAVAP'] = settings.JAVAP
 
+    def classpath(self):
+        required_libs = super(JavaBuilder, self).libs()
+        return ["."] + [ settings.JAVA_LIBS[lib] for lib in required_libs if lib in settings.JAVA_LIBS ]
+
     def libs(self):
         def toPath(lib):
             if lib=="junit3":
                  return settings.JUNIT38_JAR
             return lib
 
-        required_libs = super(JavaBuilder, self).libs()
+        classpath = self.classpath()
+        return ["-cp", ".:"+(":".join(classpath[1:]))]
 
-        return ["-cp", ".:"+(":".join([ settings.JAVA_LIBS[lib] for lib in required_libs if lib in settings.JAVA_LIBS ]))]
+    def compile(self, env, args, filenames):
+        """ Compiles in the java server, if one is running. """
+        response = javaserver.compile_java(env.tmpdir(), self.classpath(), self.flags(env) + self.output_flags(env), filenames, settings.TEST_TIMEOUT)
+        if response is None:
+            return super(JavaBuilder, self).compile(env, args, filenames)
+        return (response[0], None)
 
     def flags(self, env):
         """ Accept unicode characters. """
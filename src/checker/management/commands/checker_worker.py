@@ -0,0 +1,61 @@
+"""
+Management utility to run the checkers of queued solutions.
+"""
+
+import signal
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.urls import set_script_prefix
+
+from checker.basemodels import CheckerJob
+
+class Command(BaseCommand):
+    help = 'Check queued solutions. Several workers may run at once.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', dest='once', default=False,
+                            help='Exit as soon as the queue is empty.')
+        parser.add_argument('--sleep', type=float, dest='sleep', default=2,
+                            help='Seconds to wait before polling an empty queue again.')
+        parser.add_argument('--stale-after', type=int, dest='stale_after', default=3600,
+                            help='Seconds after which a running job is assumed to belong to a dead worker and is queued again.')
+
+    def handle(self, *args, **options):
+        verbosity = int(options.get('verbosity', 1))
+        stale_after = timedelta(seconds=options['stale_after'])
+        self.stopping = False
+
+        def stop(signum, frame):
+            # finish the current job, then exit
+            self.stopping = True
+        previous_handlers = [(signum, signal.signal(signum, stop)) for signum in (signal.SIGTERM, signal.SIGINT)]
+
+        # links in confirmation emails are generated outside of a request
+        set_script_prefix(settings.BASE_PATH)
+
+        try:
+            self.work(options, stale_after, verbosity)
+        finally:
+            for signum, handler in previous_handlers:
+                signal.signal(signum, handler)
+
+    def work(self, options, stale_after, verbosity):
+        while not self.stopping:
+            close_old_connections()
+            CheckerJob.requeue_stale(stale_after)
+            job = CheckerJob.claim_next()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            if verbosity >= 1:
+                self.stdout.write("Checking %s (attempt %d)\n" % (job.solution, job.attempts))
+            job.run()
+            if verbosity >= 1 and job.status != CheckerJob.DONE:
+                self.stderr.write("Checking %s failed:\n%s\n" % (job.solution, job.error))
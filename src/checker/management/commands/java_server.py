@@ -0,0 +1,71 @@
+"""
+Management utility to run the long-lived compile and test server for Java.
+"""
+
+import os
+import resource
+import signal
+import subprocess
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+def limit_file_size():
+    """ Limits the size of the files written by the server, like execute_arglist does for the tests. """
+    limit = settings.TEST_MAXFILESIZE * 1024
+    resource.setrlimit(resource.RLIMIT_FSIZE, (limit, limit))
+
+class Command(BaseCommand):
+    help = 'Run the Java compile and test server used by JavaBuilder and JUnitChecker, restarting it whenever it exits.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, dest='port', default=None,
+                            help='Port to listen on (default: settings.JAVA_SERVER_PORT).')
+        parser.add_argument('--threads', type=int, dest='threads', default=None,
+                            help='Number of requests handled at once (default: settings.JAVA_SERVER_THREADS).')
+        parser.add_argument('--user', dest='user', default=None,
+                            help='Run the server as this user (with sudo), e.g. the user the tests would run as. The sandboxes must be writable for it.')
+
+    def handle(self, *args, **options):
+        port = options['port'] or settings.JAVA_SERVER_PORT
+        if not port:
+            raise CommandError("No port given and settings.JAVA_SERVER_PORT is not set.")
+
+        script_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'scripts')
+        class_dir = tempfile.mkdtemp(prefix='praktomat-javaserver-')
+        compilation = subprocess.run([settings.JAVA_BINARY, '-d', class_dir, os.path.join(script_dir, 'JavaServer.java')])
+        if compilation.returncode != 0:
+            raise CommandError("Could not compile JavaServer.java")
+        os.chmod(class_dir, 0o755)
+
+        args = ["sudo", "-E", "-u", options['user']] if options['user'] else []
+        args += [settings.JVM,
+                '-Xmx%dm' % settings.TEST_MAXMEM,
+                '-Djava.security.manager',
+                '-Djava.security.policy=' + os.path.join(script_dir, 'java-server.policy'),
+                '-Dpraktomat.javaserver=' + class_dir + os.sep,
+                '-cp', class_dir, 'JavaServer', str(port), str(options['threads'] or settings.JAVA_SERVER_THREADS)]
+
+        self.stopping = False
+        self.process = None
+
+        def stop(signum, frame):
+            self.stopping = True
+            if self.process is not None:
+                self.process.terminate()
+        previous_handlers = [(signum, signal.signal(signum, stop)) for signum in (signal.SIGTERM, signal.SIGINT)]
+
+        try:
+            while not self.stopping:
+                self.process = subprocess.Popen(args, preexec_fn=limit_file_size)
+                self.stdout.write("Java server listening on port %d (pid %d)\n" % (port, self.process.pid))
+                self.process.wait()
+                if not self.stopping:
+                    # after a timed out test the server exits and is started again
+                    self.stderr.write("Java server exited with %d, restarting\n" % self.process.returncode)
+                    time.sleep(1)
+        finally:
+            for signum, handler in previous_handlers:
+                signal.signal(signum, handler)
@@ -0,0 +1,36 @@
+# Generated by Django 2.2.28 on 2026-10-18 12:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_custom_user_text'),
+        ('solutions', '0006_remove_tar_support'),
+        ('checker', '0012_auto_20190408_1427'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckerJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_all', models.BooleanField(default=False, help_text='Also run the checkers which are not always run on submission.')),
+                ('submission', models.BooleanField(default=False, help_text='Indicates whether the solution is a regular submission, which becomes the final solution and is confirmed by email once it is accepted.')),
+                ('priority', models.IntegerField(default=10, help_text='Pending jobs with higher priority are checked first.')),
+                ('status', models.CharField(choices=[('P', 'Pending'), ('R', 'Running'), ('D', 'Done'), ('F', 'Failed')], default='P', max_length=1)),
+                ('attempts', models.IntegerField(default=0, help_text='Number of times a worker started this job.')),
+                ('error', models.TextField(blank=True, help_text='Traceback of the last failed attempt.')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('started', models.DateTimeField(blank=True, null=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('solution', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='solutions.Solution')),
+                ('uploader', models.ForeignKey(blank=True, help_text='The trainer who uploaded the solution in the name of its author, if any.', null=True, on_delete=django.db.models.deletion.SET_NULL, to='accounts.User')),
+            ],
+            options={
+                'ordering': ['-priority', 'created', 'id'],
+            },
+        ),
+    ]
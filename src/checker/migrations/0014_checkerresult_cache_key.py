@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checker', '0013_checkerjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='checkerresult',
+            name='cache_key',
+            field=models.CharField(blank=True, db_index=True, help_text='Identifies the solution files and checker configuration this result was computed for', max_length=64),
+        ),
+    ]
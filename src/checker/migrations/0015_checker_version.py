@@ -0,0 +1,128 @@
+# Generated by Django 2.2.28 on 2026-10-18 12:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checker', '0014_checkerresult_cache_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anonymitychecker',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the configuration of the checker is changed.'),
+        ),
+        migrations.AddField(
+            model_name='cbuilder',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the configuration of the checker is changed.'),
+        ),
+        migrations.AddField(
+            model_name='checkerresult',
+            name='checker_version',
+            field=models.PositiveIntegerField(default=1, help_text='Version of the checker which computed this result'),
+        ),
+        migrations.AddField(
+            model_name='checkstylechecker',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the configuration of the checker is changed.'),
+        ),
+        migrations.AddField(
+            model_name='createfilechecker',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the configuration of the checker is changed.'),
+        ),
+        migrations.AddField(
+            model_name='cxxbuilder',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the configuration of the checker is changed.'),
+        ),
+        migrations.AddField(
+            model_name='dejagnusetup',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the configuration of the checker is changed.'),
+        ),
+        migrations.AddField(
+            model_name='dejagnutester',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the configuration of the checker is changed.'),
+        ),
+        migrations.AddField(
+            model_name='fortranbuilder',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the configuration of the checker is changed.'),
+        ),
+        migrations.AddField(
+            model_name='haskellbuilder',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the configuration of the checker is changed.'),
+        ),
+        migrations.AddField(
+            model_name='haskelltestframeworkchecker',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the configuration of the checker is changed.'),
+        ),
+        migrations.AddField(
+            model_name='interfacechecker',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the configuration of the checker is changed.'),
+        ),
+        migrations.AddField(
+            model_name='isabellechecker',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the configuration of the checker is changed.'),
+        ),
+        migrations.AddField(
+            model_name='javabuilder',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the configuration of the checker is changed.'),
+        ),
+        migrations.AddField(
+            model_name='javagccbuilder',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the configuration of the checker is changed.'),
+        ),
+        migrations.AddField(
+            model_name='junitchecker',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the configuration of the checker is changed.'),
+        ),
+        migrations.AddField(
+            model_name='keepfilechecker',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the configuration of the checker is changed.'),
+        ),
+        migrations.AddField(
+            model_name='linecounter',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the configuration of the checker is changed.'),
+        ),
+        migrations.AddField(
+            model_name='linewidthchecker',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the configuration of the checker is changed.'),
+        ),
+        migrations.AddField(
+            model_name='rchecker',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the configuration of the checker is changed.'),
+        ),
+        migrations.AddField(
+            model_name='scalabuilder',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the configuration of the checker is changed.'),
+        ),
+        migrations.AddField(
+            model_name='scriptchecker',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the configuration of the checker is changed.'),
+        ),
+        migrations.AddField(
+            model_name='textchecker',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the configuration of the checker is changed.'),
+        ),
+    ]
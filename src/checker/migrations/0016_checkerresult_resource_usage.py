@@ -0,0 +1,38 @@
+# Generated by Django 2.2.28 on 2026-10-18 12:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checker', '0015_checker_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='checkerresult',
+            name='max_rss',
+            field=models.IntegerField(blank=True, help_text='Peak memory usage (resident set size) of the executed programs in kbytes', null=True),
+        ),
+        migrations.AddField(
+            model_name='checkerresult',
+            name='output_size',
+            field=models.BigIntegerField(blank=True, help_text='Size of the output of the executed programs in bytes', null=True),
+        ),
+        migrations.AddField(
+            model_name='checkerresult',
+            name='page_faults',
+            field=models.IntegerField(blank=True, help_text='Page faults of the executed programs', null=True),
+        ),
+        migrations.AddField(
+            model_name='checkerresult',
+            name='system_time',
+            field=models.IntegerField(blank=True, help_text='CPU time in kernel mode of the executed programs in milliseconds', null=True),
+        ),
+        migrations.AddField(
+            model_name='checkerresult',
+            name='user_time',
+            field=models.IntegerField(blank=True, help_text='CPU time in user mode of the executed programs in milliseconds', null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+"""
+The processes of the checker pool, see checker.basemodels.check_multiple.
+
+They are started by a fork server instead of being forked from the process which checks
+the solutions, as that process may run other threads (e.g. the sandbox reaper) whose locks
+would be inherited in whatever state they are in. So the workers set up Django themselves,
+and this module must not import any models at the top level.
+"""
+
+import multiprocessing.util
+
+import django
+
+def init_worker(runtime_settings, storage_location):
+    """ Runs once in every process of the pool. runtime_settings are the settings the parent
+    may have changed after loading them (e.g. the test runner), by name. """
+    from django.conf import settings
+    for (name, value) in runtime_settings.items():
+        setattr(settings, name, value)
+    django.setup()
+    from django.core.files.storage import default_storage
+    default_storage.location = storage_location
+    from checker import sandbox
+    # The processes of a pool exit without running the atexit handlers, but with the finalizers of multiprocessing
+    multiprocessing.util.Finalize(None, sandbox.wait_for_reaper, exitpriority=10)
+
+def check(args):
+    from checker.basemodels import check_in_worker
+    return check_in_worker(*args)
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+
+"""
+The sandboxes the checkers run in.
+
+Sandboxes are allocated in settings.SANDBOX_TMPFS_DIR while its quota allows it, and
+in settings.SANDBOX_DIR otherwise. Released sandboxes are deleted by a background thread.
+
+Sandbox templates: The files the CreateFileCheckers of a task copy into the sandbox
+are unpacked once per task, into a template directory next to the sandboxes. The
+CreateFileCheckers then only copy (or link, see use_hardlinks()) the files from the
+template into each new sandbox, instead of unzipping their file again for every solution.
+"""
+
+import os
+import json
+import queue
+import atexit
+import shutil
+import zipfile
+import tempfile
+import logging
+import threading
+from hashlib import sha256
+
+from django.conf import settings
+
+from utilities import file_operations
+
+logger = logging.getLogger(__name__)
+
+# The templates built by this process, by task id
+_templates = {}
+
+def sandbox_base_dir():
+    """ The directory new sandboxes are created in. The tmpfs is used as long as its used space
+    plus the biggest file a check may write stays within the quota. As the file system itself
+    is asked, this holds for all processes allocating sandboxes at once. """
+    if settings.SANDBOX_TMPFS_DIR:
+        try:
+            usage = shutil.disk_usage(settings.SANDBOX_TMPFS_DIR)
+        except OSError as e:
+            logger.warning("Sandbox tmpfs not available: %s", e)
+        else:
+            needed = settings.TEST_MAXFILESIZE * 1024
+            if usage.used + needed <= settings.SANDBOX_TMPFS_QUOTA * 1024 * 1024 and usage.free >= needed:
+                return settings.SANDBOX_TMPFS_DIR
+    return settings.SANDBOX_DIR
+
+def allocate_sandbox():
+    """ Creates a new, empty sandbox and returns its path. """
+    return file_operations.create_tempfolder(sandbox_base_dir())
+
+def disk_usage(path):
+    """ The size of the files in the directory in bytes. """
+    size = 0
+    for dirpath, dirs, files in os.walk(path):
+        for filename in files:
+            try:
+                size += os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError:
+                pass
+    return size
+
+_reaper_lock = threading.Lock()
+_reaper = None
+_reaper_pid = None
+_reaper_queue = None
+
+def release_sandbox(path):
+    """ Deletes the sandbox. Unless settings.SANDBOX_BACKGROUND_DELETION is off, it is deleted
+    by a background thread, so the check does not wait for it. """
+    global _reaper, _reaper_pid, _reaper_queue
+    if not settings.SANDBOX_BACKGROUND_DELETION:
+        shutil.rmtree(path, ignore_errors=True)
+        return
+    with _reaper_lock:
+        # A forked process (e.g. of the checker pool) does not inherit the thread
+        if _reaper is None or _reaper_pid != os.getpid():
+            _reaper_queue = queue.Queue()
+            _reaper = threading.Thread(target=reap, args=(_reaper_queue,), name="sandbox reaper", daemon=True)
+            _reaper.start()
+            _reaper_pid = os.getpid()
+        _reaper_queue.put(path)
+
+def reap(paths):
+    while True:
+        path = paths.get()
+        # Only reported: the checks are limited per file (by TEST_MAXFILESIZE), not per sandbox
+        size = disk_usage(path)
+        if size > settings.TEST_MAXFILESIZE * 1024:
+            logger.info("Sandbox %s used %d kbyte", path, size // 1024)
+        shutil.rmtree(path, ignore_errors=True)
+        paths.task_done()
+
+@atexit.register
+def wait_for_reaper():
+    """ Deletes the remaining released sandboxes before the process exits.
+    Processes of a multiprocessing pool skip atexit, they have to call this themselves (see checker.pool.init_worker). """
+    if _reaper is not None and _reaper_pid == os.getpid():
+        _reaper_queue.join()
+
+class SandboxTemplate:
+    """ A template directory with a subdirectory for every CreateFileChecker, and the manifest
+    {checker id: [(path in the sandbox, path as reported in clashes, is directory)...]} of its files. """
+
+    def __init__(self, key, directory, manifest):
+        self.key = key
+        self.directory = directory
+        self.manifest = manifest
+
+    def provides(self, checker):
+        """ Whether the files of the checker are in this template. """
+        return checker.id in self.manifest
+
+    def materialise(self, checker, tmpdir, file_cb):
+        """ Puts the files of the checker into the sandbox tmpdir, calling file_cb with the path of every file.
+        Returns the files which already existed in the sandbox, as they clash with the files of the solution. """
+        entries = self.manifest[checker.id]
+        clashes = [reported for (path, reported, is_dir) in entries if os.path.exists(os.path.join(tmpdir, path))]
+        for (path, reported, is_dir) in entries:
+            destination = os.path.join(tmpdir, path)
+            if is_dir:
+                file_operations.makedirs(destination.rstrip('/'))
+                continue
+            file_operations.makedirs(os.path.dirname(destination))
+            if os.path.lexists(destination):
+                os.remove(destination)
+            source = os.path.join(self.directory, str(checker.id), path)
+            if not (use_hardlinks() and link(source, destination)):
+                file_operations.copy_file(source, destination)
+            file_cb(path)
+        return clashes
+
+def use_hardlinks():
+    """ Whether the files of the template are hardlinked into the sandboxes. The linked files are only protected
+    by being read-only, so this requires that the tests run as another user (the tester), who cannot chmod them. """
+    return settings.SANDBOX_TEMPLATE_HARDLINKS and settings.USEPRAKTOMATTESTER
+
+def link(source, destination):
+    """ Hardlinks the file, returns False if that is not possible (e.g. across file systems). """
+    try:
+        os.link(source, destination)
+        return True
+    except OSError:
+        return False
+
+def template_key(checkers):
+    """ Changes whenever one of the checkers (or its file) does, or whether the files are hardlinked (as then they are read-only). """
+    digest = sha256()
+    digest.update(repr(use_hardlinks()).encode('utf-8'))
+    for checker in checkers:
+        try:
+            stat = os.stat(checker.file.path)
+            file_version = (stat.st_mtime_ns, stat.st_size)
+        except (OSError, ValueError):
+            file_version = None
+        digest.update(repr((checker.id, checker.version, checker.file.name, file_version, checker.path, checker.filename, checker.unpack_zipfile)).encode('utf-8'))
+    return digest.hexdigest()
+
+def templates_dir():
+    # Next to most sandboxes if the files are hardlinked. Otherwise not on the tmpfs, where they would count against its quota.
+    return os.path.join(settings.SANDBOX_TMPFS_DIR if use_hardlinks() and settings.SANDBOX_TMPFS_DIR else settings.SANDBOX_DIR, 'templates')
+
+def sandbox_template(task):
+    """ Returns the sandbox template of the task, building it if the CreateFileCheckers of the task changed.
+    Returns None if the task has no CreateFileCheckers. """
+    checkers = list(task.createfilechecker_set.all().order_by('id'))
+    if not checkers:
+        return None
+    key = template_key(checkers)
+    template = _templates.get(task.id)
+    if template is None or template.key != key or not os.path.isdir(template.directory):
+        template = load_or_build_template(task, checkers, key)
+        _templates[task.id] = template
+    return template
+
+def remove_templates(task_id):
+    """ Deletes the sandbox templates of the task. """
+    _templates.pop(task_id, None)
+    prefix = "task%d-" % task_id
+    try:
+        names = os.listdir(templates_dir())
+    except OSError:
+        return
+    for name in names:
+        if name.startswith(prefix):
+            shutil.rmtree(os.path.join(templates_dir(), name), ignore_errors=True)
+
+def load_or_build_template(task, checkers, key):
+    prefix = "task%d-" % task.id
+    directory = os.path.join(templates_dir(), prefix + key[:32])
+    if not os.path.isdir(directory):
+        file_operations.makedirs(templates_dir())
+        # Build it aside and move it into place, as other processes may build the same template at the same time
+        build_directory = tempfile.mkdtemp(prefix="build-", dir=templates_dir())
+        build_template(checkers, build_directory)
+        try:
+            os.rename(build_directory, directory)
+        except OSError:
+            shutil.rmtree(build_directory, ignore_errors=True)
+        # The templates for older versions of the checkers are not needed any more
+        for name in os.listdir(templates_dir()):
+            if name.startswith(prefix) and os.path.join(templates_dir(), name) != directory:
+                shutil.rmtree(os.path.join(templates_dir(), name), ignore_errors=True)
+
+    with open(os.path.join(directory, 'manifest.json')) as fd:
+        manifest = dict((int(checker_id), [tuple(entry) for entry in entries]) for (checker_id, entries) in json.load(fd).items())
+    return SandboxTemplate(key, directory, manifest)
+
+def build_template(checkers, directory):
+    """ Unpacks the files of the checkers into the directory and writes the manifest. Checkers whose file
+    cannot be unpacked are left out, they report the error when they run. """
+    manifest = {}
+    for checker in checkers:
+        checker_dir = os.path.join(directory, str(checker.id))
+        cleanpath = checker.path.lstrip("/ ")
+        try:
+            if checker.unpack_zipfile:
+                file_operations.unpack_zipfile_to(checker.file.path, os.path.join(checker_dir, cleanpath))
+                with zipfile.ZipFile(checker.file.path) as zip:
+                    names = zip.namelist()
+                entries = [(os.path.join(cleanpath, name), os.path.join(cleanpath, name), name.endswith('/')) for name in names]
+            else:
+                filename = os.path.basename(checker.filename if checker.filename else checker.file.path)
+                path = os.path.join(cleanpath, filename)
+                file_operations.copy_file(checker.file.path, os.path.join(checker_dir, path))
+                entries = [(path, os.path.join(checker.path, filename), False)]
+        except (OSError, ValueError, zipfile.BadZipfile, file_operations.InvalidZipFile) as e:
+            logger.warning("Could not add the file of %s to the sandbox template: %s", checker, e)
+            shutil.rmtree(checker_dir, ignore_errors=True)
+            continue
+        manifest[checker.id] = entries
+
+    if use_hardlinks():
+        # The sandboxes share the files with the template, so nobody may change them in place
+        for dirpath, dirs, files in os.walk(directory):
+            for filename in files:
+                path = os.path.join(dirpath, filename)
+                os.chmod(path, os.stat(path).st_mode & ~0o222)
+    with open(os.path.join(directory, 'manifest.json'), 'w') as fd:
+        json.dump(manifest, fd)
+    # mkdtemp creates the directory for the owner only
+    os.chmod(directory, 0o755)
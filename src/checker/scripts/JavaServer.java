@@ -0,0 +1,329 @@
+// Long-lived compile and test server for the Praktomat, see utilities/javaserver.py
+// and ./manage.py java_server.
+//
+// Avoids starting a JVM for every javac and JUnit invocation. Requests are
+// handled by a fixed number of threads (the second argument); each request is
+// one connection. Once a thread takes the connection, the server sends a line
+// "ready", and only then the client sends the request:
+//
+//   COMPILE | JUNIT3 | JUNIT4      (command)
+//   dir <sandbox directory>
+//   timeout <seconds>
+//   cp <classpath entry>          (repeated)
+//   arg <argument>                (repeated: javac arguments resp. test class)
+//   <empty line>
+//
+// The answer is a line with the exit code (or "timeout", "oom") followed by the output.
+// Compilations and test runs are stopped after the timeout.
+//
+// The server has to run with a security manager and java-server.policy:
+// Only the classes of the server itself are granted all permissions, code loaded
+// from the sandbox (and the JUnit libraries) gets the permissions of junit.policy.
+// After a timeout, an OutOfMemoryError, or if a test leaves threads behind, the
+// server stops taking requests, as these cannot be cleaned up safely, and exits
+// once the requests being handled are answered. Its supervisor restarts it. So no
+// test sees the threads of an earlier one. The output of System.out and System.err
+// goes to the request of the thread writing it (or of the test which started it).
+// Annotation processors are disabled, as they would run within the server.
+
+import java.io.*;
+import java.lang.reflect.*;
+import java.net.*;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.*;
+import java.security.*;
+import java.util.*;
+import java.util.concurrent.*;
+import javax.tools.JavaCompiler;
+import javax.tools.ToolProvider;
+
+public class JavaServer {
+
+    static final int TIMEOUT = -1000;
+    static final int OUT_OF_MEMORY = -1001;
+
+    /** Set if the server has to be restarted after answering the requests being handled */
+    static volatile boolean restart = false;
+
+    static ServerSocket server;
+
+    /** The output of the request handled by the current thread, inherited by the threads of a test */
+    static final InheritableThreadLocal<PrintStream> requestOutput = new InheritableThreadLocal<PrintStream>();
+
+    /** Stream for System.out and System.err, writing to the output of the current request */
+    static class RequestOutput extends OutputStream {
+        final OutputStream fallback;
+
+        RequestOutput(OutputStream fallback) {
+            this.fallback = fallback;
+        }
+
+        OutputStream target() {
+            PrintStream output = requestOutput.get();
+            return output != null ? output : fallback;
+        }
+
+        @Override
+        public void write(int b) throws IOException {
+            target().write(b);
+        }
+
+        @Override
+        public void write(byte[] b, int off, int len) throws IOException {
+            target().write(b, off, len);
+        }
+
+        @Override
+        public void flush() throws IOException {
+            target().flush();
+        }
+    }
+
+    public static void main(String[] args) throws Exception {
+        int port = Integer.parseInt(args[0]);
+        int threads = args.length > 1 ? Integer.parseInt(args[1]) : 1;
+        System.setOut(new PrintStream(new RequestOutput(System.out), true, "UTF-8"));
+        System.setErr(new PrintStream(new RequestOutput(System.err), true, "UTF-8"));
+        ExecutorService pool = Executors.newFixedThreadPool(threads);
+        server = new ServerSocket(port, 50, InetAddress.getLoopbackAddress());
+        try {
+            while (true) {
+                final Socket socket = server.accept();
+                pool.execute(new Runnable() {
+                    public void run() {
+                        try {
+                            handle(socket);
+                        } catch (Exception e) {
+                            e.printStackTrace();
+                        } finally {
+                            try {
+                                socket.close();
+                            } catch (IOException e) {
+                            }
+                        }
+                    }
+                });
+            }
+        } catch (IOException e) {
+            // restart() closes the server socket
+            if (!restart) {
+                e.printStackTrace();
+            }
+        }
+        pool.shutdown();
+        pool.awaitTermination(1, TimeUnit.HOURS);
+        System.exit(1);
+    }
+
+    /** Stops taking requests; the server exits once the requests being handled are answered */
+    static void restart() {
+        restart = true;
+        try {
+            server.close();
+        } catch (IOException e) {
+        }
+    }
+
+    static void handle(Socket socket) throws Exception {
+        if (restart) {
+            // the client falls back to a new JVM
+            return;
+        }
+        OutputStream out = socket.getOutputStream();
+        out.write("ready\n".getBytes(StandardCharsets.UTF_8));
+        out.flush();
+
+        BufferedReader in = new BufferedReader(new InputStreamReader(socket.getInputStream(), StandardCharsets.UTF_8));
+        String command = in.readLine();
+        if (command == null) {
+            // the client did not wait for the server
+            return;
+        }
+        String dir = null;
+        int timeout = 60;
+        List<String> classpath = new ArrayList<String>();
+        List<String> arguments = new ArrayList<String>();
+        String line;
+        while ((line = in.readLine()) != null && !line.isEmpty()) {
+            int space = line.indexOf(' ');
+            String key = line.substring(0, space);
+            String value = line.substring(space + 1);
+            if (key.equals("dir")) dir = value;
+            else if (key.equals("timeout")) timeout = Integer.parseInt(value);
+            else if (key.equals("cp")) classpath.add(value);
+            else if (key.equals("arg")) arguments.add(value);
+        }
+
+        ByteArrayOutputStream buffer = new ByteArrayOutputStream();
+        PrintStream output = new PrintStream(buffer, true, "UTF-8");
+        int exitCode;
+        requestOutput.set(output);
+        try {
+            if (command.equals("COMPILE")) {
+                exitCode = compile(dir, classpath, arguments, timeout, output);
+            } else {
+                exitCode = runTests(command, dir, classpath, arguments.get(0), timeout, output);
+            }
+        } finally {
+            requestOutput.remove();
+        }
+        output.flush();
+        // JUnit reports an OutOfMemoryError of a test as a failure, but the heap may not have recovered
+        if (exitCode != TIMEOUT && !command.equals("COMPILE") && buffer.toString("UTF-8").contains("java.lang.OutOfMemoryError")) {
+            exitCode = OUT_OF_MEMORY;
+            restart();
+        }
+
+        String status = exitCode == TIMEOUT ? "timeout" : exitCode == OUT_OF_MEMORY ? "oom" : Integer.toString(exitCode);
+        out.write((status + "\n").getBytes(StandardCharsets.UTF_8));
+        // Report paths relative to the sandbox, like javac run within it would
+        out.write(buffer.toString("UTF-8").replace(dir + File.separator, "").getBytes(StandardCharsets.UTF_8));
+        out.flush();
+    }
+
+    static int compile(String dir, List<String> classpath, List<String> arguments, int timeout, final PrintStream output) throws Exception {
+        final JavaCompiler compiler = ToolProvider.getSystemJavaCompiler();
+        final List<String> javacArgs = new ArrayList<String>();
+        javacArgs.add("-nowarn");
+        javacArgs.add("-proc:none");
+        javacArgs.add("-d");
+        javacArgs.add(dir);
+        javacArgs.add("-classpath");
+        javacArgs.add(String.join(File.pathSeparator, classpath));
+        javacArgs.addAll(arguments);
+        final int[] exitCode = { 1 };
+        Thread thread = new Thread(new Runnable() {
+            public void run() {
+                try {
+                    exitCode[0] = compiler.run(null, output, output, javacArgs.toArray(new String[0]));
+                } catch (Throwable e) {
+                    e.printStackTrace(output);
+                }
+            }
+        }, "javac");
+        thread.setDaemon(true);
+        thread.start();
+        thread.join(timeout * 1000L);
+        if (thread.isAlive()) {
+            // javac cannot be stopped
+            restart();
+            return TIMEOUT;
+        }
+        if (exitCode[0] != 0) {
+            return exitCode[0];
+        }
+        // The same checks as scripts/javac does with javap
+        List<Path> classFiles = new ArrayList<Path>();
+        collectClassFiles(Paths.get(dir), classFiles);
+        try (URLClassLoader loader = new URLClassLoader(new URL[] { new File(dir).toURI().toURL() }, null)) {
+            for (Path classFile : classFiles) {
+                String name = Paths.get(dir).relativize(classFile).toString().replace(File.separatorChar, '.');
+                name = name.substring(0, name.length() - ".class".length());
+                if (name.startsWith("java.") || name.startsWith("javax.") || name.startsWith("sun.") || name.startsWith("sunw.")) {
+                    output.println("Bitte benutzen Sie keine \"System-packages\" Methoden zur Loesung.");
+                    return 1;
+                }
+                try {
+                    for (Method method : Class.forName(name, false, loader).getDeclaredMethods()) {
+                        if (Modifier.isNative(method.getModifiers())) {
+                            output.println("Bitte benutzen Sie keine \"native\" Methoden zur Loesung.");
+                            return 1;
+                        }
+                    }
+                } catch (LinkageError | ClassNotFoundException e) {
+                    // classes depending on missing libraries cannot be inspected
+                }
+            }
+        }
+        return 0;
+    }
+
+    static void collectClassFiles(Path dir, List<Path> classFiles) throws IOException {
+        try (DirectoryStream<Path> stream = Files.newDirectoryStream(dir)) {
+            for (Path path : stream) {
+                if (Files.isDirectory(path)) {
+                    collectClassFiles(path, classFiles);
+                } else if (path.toString().endsWith(".class")) {
+                    classFiles.add(path);
+                }
+            }
+        }
+    }
+
+    /** Class loader for the classes of one test run, granting them the permissions of junit.policy */
+    static class SandboxClassLoader extends URLClassLoader {
+        final String dir;
+
+        SandboxClassLoader(URL[] urls, String dir) {
+            super(urls, null);
+            this.dir = dir;
+        }
+
+        @Override
+        protected PermissionCollection getPermissions(CodeSource codesource) {
+            Permissions permissions = new Permissions();
+            permissions.add(new PropertyPermission("user.home", "read"));
+            permissions.add(new FilePermission(System.getProperty("user.home") + File.separator + "junit.properties", "read"));
+            permissions.add(new FilePermission(dir + File.separator + "data" + File.separator + "-", "read"));
+            permissions.add(new RuntimePermission("accessDeclaredMembers"));
+            permissions.add(new RuntimePermission("getStackTrace"));
+            return permissions;
+        }
+    }
+
+    static int runTests(final String runner, String dir, List<String> classpath, final String className, int timeout, final PrintStream output) throws Exception {
+        List<URL> urls = new ArrayList<URL>();
+        for (String entry : classpath) {
+            urls.add(new File(entry).toURI().toURL());
+        }
+        final SandboxClassLoader loader = new SandboxClassLoader(urls.toArray(new URL[0]), dir);
+        final int[] exitCode = { 1 };
+        // the threads the test starts are in this group, too
+        ThreadGroup group = new ThreadGroup("test " + className);
+        // destroyed once its last thread ends
+        group.setDaemon(true);
+
+        Thread thread = new Thread(group, new Runnable() {
+            public void run() {
+                try {
+                    if (runner.equals("JUNIT4")) {
+                        Class<?> core = loader.loadClass("org.junit.runner.JUnitCore");
+                        Class<?> listener = loader.loadClass("org.junit.runner.notification.RunListener");
+                        Object junit = core.getConstructor().newInstance();
+                        Object textListener = loader.loadClass("org.junit.internal.TextListener").getConstructor(PrintStream.class).newInstance(output);
+                        core.getMethod("addListener", listener).invoke(junit, textListener);
+                        Object result = core.getMethod("run", Class[].class).invoke(junit, (Object) new Class<?>[] { loader.loadClass(className) });
+                        exitCode[0] = ((Boolean) result.getClass().getMethod("wasSuccessful").invoke(result)) ? 0 : 1;
+                    } else {
+                        Class<?> textRunner = loader.loadClass("junit.textui.TestRunner");
+                        Object junit = textRunner.getConstructor(PrintStream.class).newInstance(output);
+                        Object result = textRunner.getMethod("start", String[].class).invoke(junit, (Object) new String[] { className });
+                        exitCode[0] = ((Boolean) result.getClass().getMethod("wasSuccessful").invoke(result)) ? 0 : 1;
+                    }
+                } catch (InvocationTargetException e) {
+                    e.getCause().printStackTrace(output);
+                    if (e.getCause() instanceof OutOfMemoryError) {
+                        exitCode[0] = OUT_OF_MEMORY;
+                    }
+                } catch (OutOfMemoryError e) {
+                    exitCode[0] = OUT_OF_MEMORY;
+                } catch (Throwable e) {
+                    e.printStackTrace(output);
+                }
+            }
+        });
+
+        thread.setDaemon(true);
+        thread.start();
+        thread.join(timeout * 1000L);
+        if (thread.isAlive()) {
+            restart();
+            return TIMEOUT;
+        }
+        if (group.activeCount() > 0 || exitCode[0] == OUT_OF_MEMORY) {
+            restart();
+        }
+        loader.close();
+        return exitCode[0];
+    }
+}
@@ -3,13 +3,17 @@
 import os
 from os.path import dirname, join
 from django.conf import settings
+from django.test import override_settings
 from utilities.TestSuite import TestCase
 from utilities.file_operations import copy_file, InvalidZipFile
 import unittest
+from unittest import mock
 
 from solutions.models import Solution, SolutionFile
 from django.core.files import File
 from tasks.models import Task
+from checker.basemodels import checker_dependencies, check_multiple
+from checker import sandbox
 from .compiler import *
 from .checker import *
 
@@ -90,6 +94,40 @@ class TestChecker(TestCase):
         for checkerresult in self.solution.checkerresult_set.all():
             self.assertTrue(checkerresult.passed, checkerresult.log)
 
+    def test_createfile_checker_template(self):
+        src = join(dirname(dirname(dirname(__file__))), 'examples', 'simple_zip_file.zip')
+        dest = join(settings.UPLOAD_ROOT, 'directdeposit', 'simple_zip_file.zip')
+        # circumvent SuspiciousOperation exception
+        copy_file(src, dest)
+        checker = CreateFileChecker.CreateFileChecker.objects.create(
+                    task = self.task,
+                    order = 0,
+                    unpack_zipfile = True,
+                    file = dest
+                    )
+        with mock.patch('checker.sandbox.build_template', wraps=sandbox.build_template) as build_template:
+            self.solution.check_solution()
+            self.solution.check_solution()
+            self.assertEqual(build_template.call_count, 1)
+            self.assertTrue(checker.results.get().passed)
+            # a changed checker needs a new template
+            checker.increment_version()
+            checker.save()
+            self.solution.check_solution()
+            self.assertEqual(build_template.call_count, 2)
+
+    def test_createfile_template_deleted_with_task(self):
+        src = join(dirname(dirname(dirname(__file__))), 'examples', 'simple_zip_file.zip')
+        dest = join(settings.UPLOAD_ROOT, 'directdeposit', 'simple_zip_file.zip')
+        copy_file(src, dest)
+        task = Task.objects.create(title = 'Other task', description = '', publication_date = self.task.publication_date, submission_date = self.task.submission_date)
+        CreateFileChecker.CreateFileChecker.objects.create(task = task, order = 0, unpack_zipfile = True, file = dest)
+        template = sandbox.sandbox_template(task)
+        self.assertTrue(template.directory.startswith(settings.UPLOAD_ROOT))
+        self.assertTrue(os.path.isdir(template.directory))
+        task.delete()
+        self.assertFalse(os.path.exists(template.directory))
+
     def test_createfile_illegal_zip_checker(self):
         src = join(dirname(dirname(dirname(__file__))), 'examples', 'badzipfile.zip')
         dest = join(settings.UPLOAD_ROOT, 'directdeposit', 'badzipfile.zip')
@@ -187,6 +225,7 @@ class TestChecker(TestCase):
                 self.assertIn('Timeout occured!', checkerresult.log, "Test result does not mention timeout")
                 self.assertFalse(checkerresult.passed, "Test succeed (no timeout?)")
                 self.assertNotIn('done', checkerresult.log, "Test did finish (no timeout?)")
+                self.assertEqual(checkerresult.cache_key, '', "Timed out result may be reused")
 
 
     @unittest.skipIf('TRAVIS' in os.environ, "ulimit doesn’t seem to work on travis")
@@ -415,3 +454,101 @@ class TestChecker(TestCase):
         for checkerresult in self.solution.checkerresult_set.all():
             self.assertIn('Could not find file', checkerresult.log, "Test did not complain (%s)" % checkerresult.log)
             self.assertFalse(checkerresult.passed, checkerresult.log)
+
+    def test_checker_dependencies(self):
+        checkers = [
+            CreateFileChecker.CreateFileChecker(task = self.task, order = 0),
+            JavaBuilder.JavaBuilder(task = self.task, order = 1),
+            LineWidthChecker.LineWidthChecker(task = self.task, order = 2),
+            JUnitChecker.JUnitChecker(task = self.task, order = 3),
+            KeepFileChecker.KeepFileChecker(task = self.task, order = 4),
+            ScriptChecker.ScriptChecker(task = self.task, order = 5),
+            ]
+        dependencies = checker_dependencies(checkers)
+        self.assertEqual(dependencies, [set(), {0}, {1}, {1}, {1}, {1, 2, 3, 4}])
+
+    @override_settings(NUMBER_OF_CHECKERS_RUN_IN_PARALLEL=4)
+    def test_no_concurrent_checkers_in_transaction(self):
+        # The test case runs in a transaction, like Task.import_Tasks
+        LineCounter.LineCounter.objects.create(task = self.task, order = 0)
+        LineWidthChecker.LineWidthChecker.objects.create(task = self.task, order = 1)
+        with mock.patch('checker.basemodels.ThreadPoolExecutor', side_effect=AssertionError("threads were used")):
+            self.solution.check_solution()
+        self.assertEqual(self.solution.checkerresult_set.count(), 2)
+
+    def test_check_multiple_reports_errors(self):
+        second = Solution.objects.create(task = self.task, author = self.solution.author)
+        reported = []
+        def progress(solution_id, done, total, error):
+            reported.append((solution_id, done, total, error is not None))
+        with mock.patch.object(Solution, 'check_solution', autospec=True, side_effect=[RuntimeError("broken"), None]):
+            succeeded = check_multiple([self.solution, second], progress = progress)
+        self.assertEqual(succeeded, 1)
+        self.assertEqual(reported, [(self.solution.id, 1, 2, True), (second.id, 2, 2, False)])
+
+    def test_cached_results(self):
+        checker = KeepFileChecker.KeepFileChecker.objects.create(
+            task = self.task,
+            order = 0,
+            filename = "GgT.java",
+            )
+        self.solution.check_solution()
+        result = self.solution.checkerresult_set.get()
+        self.assertTrue(result.cache_key)
+
+        # An identical solution reuses the result instead of running the checker again
+        self.solution.copy()
+        self.solution.checkerresult_set.all().delete()
+        with mock.patch.object(KeepFileChecker.KeepFileChecker, 'run', side_effect=AssertionError("checker was run")):
+            self.solution.check_solution()
+        cloned = self.solution.checkerresult_set.get()
+        self.assertNotEqual(cloned.id, result.id)
+        self.assertEqual(cloned.log, result.log)
+        self.assertEqual(cloned.artefacts.get().path(), "GgT.java")
+
+        # Editing the checker invalidates its results
+        checker.invalidate_cached_results()
+        with mock.patch.object(KeepFileChecker.KeepFileChecker, 'run', side_effect=AssertionError("checker was run")):
+            self.assertRaises(AssertionError, self.solution.check_solution)
+
+    @override_settings(CACHE_CHECKER_RESULTS=False)
+    def test_incremental_check(self):
+        line_counter = LineCounter.LineCounter.objects.create(
+            task = self.task,
+            order = 0,
+            )
+        keep_file = KeepFileChecker.KeepFileChecker.objects.create(
+            task = self.task,
+            order = 1,
+            filename = "GgT.java",
+            )
+        self.solution.check_solution(True)
+        line_counter_result = line_counter.results.get()
+        keep_file_result = keep_file.results.get()
+
+        # Only the changed checker is run again
+        keep_file.increment_version()
+        keep_file.save()
+        with mock.patch.object(LineCounter.LineCounter, 'run', side_effect=AssertionError("checker was run")):
+            self.solution.check_solution(True, incremental = True)
+        self.assertEqual(line_counter.results.get().id, line_counter_result.id)
+        self.assertNotEqual(keep_file.results.get().id, keep_file_result.id)
+        self.assertEqual(keep_file.results.get().checker_version, 2)
+
+
+class TestSandbox(TestCase):
+    def test_tmpfs_quota(self):
+        tmpfs = join(settings.UPLOAD_ROOT, 'tmpfs')
+        os.makedirs(tmpfs)
+        with override_settings(SANDBOX_TMPFS_DIR = tmpfs, SANDBOX_TMPFS_QUOTA = 1024 * 1024 * 1024):
+            path = sandbox.allocate_sandbox()
+            self.assertEqual(dirname(path), tmpfs)
+        with override_settings(SANDBOX_TMPFS_DIR = tmpfs, SANDBOX_TMPFS_QUOTA = 0):
+            self.assertEqual(dirname(sandbox.allocate_sandbox()), settings.SANDBOX_DIR)
+
+    def test_release(self):
+        path = sandbox.allocate_sandbox()
+        copy_file(__file__, join(path, 'tests.py'))
+        sandbox.release_sandbox(path)
+        sandbox.wait_for_reaper()
+        self.assertFalse(os.path.exists(path))
@@ -131,6 +131,52 @@ def load_defaults(settings):
     # up the processing
     d.SANDBOX_DIR = join(UPLOAD_ROOT, 'SolutionSandbox')
 
+    # If set, sandboxes are created in this directory instead (typically a tmpfs
+    # mount), as long as no more than SANDBOX_TMPFS_QUOTA megabytes of it are
+    # used. When it is full, SANDBOX_DIR is used again. The quota applies to
+    # the whole file system, including the sandbox templates if they are
+    # hardlinked (see SANDBOX_TEMPLATE_HARDLINKS). Within a sandbox, a check may
+    # write files of up to TEST_MAXFILESIZE each; the total size of a sandbox
+    # is not limited, sandboxes larger than that are only logged.
+    d.SANDBOX_TMPFS_DIR = None
+    d.SANDBOX_TMPFS_QUOTA = 256
+
+    # Delete sandboxes after the check in a background thread
+    d.SANDBOX_BACKGROUND_DELETION = True
+
+    # Megabytes of decoded solution file texts kept in memory by every process
+    d.SOLUTION_FILE_TEXT_CACHE_SIZE = 32
+
+    d.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+    # The syntax highlighted solution files are cached on disk, shared by all
+    # processes, with at most MAX_ENTRIES files (the oldest are culled first).
+    # Both caches are added to CACHES unless it configures these aliases itself.
+    CACHES.setdefault('highlight', {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': join(UPLOAD_ROOT, 'HighlightCache'),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    })
+    # The statistics of the tasks, dropped when their solutions or attestations change.
+    # As a tutor only sees their tutorials, changes of the tutorials show after the TIMEOUT.
+    CACHES.setdefault('statistics', {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': join(UPLOAD_ROOT, 'StatisticsCache'),
+        'TIMEOUT': 3600,
+    })
+
+    # Highlight the files of new solutions in a background thread right after
+    # the upload, so that they are in the cache when tutors look at them.
+    d.HIGHLIGHT_ON_UPLOAD = True
+    # Number of threads highlighting new solutions, and number of solutions
+    # waiting for them (uploads beyond that are highlighted when viewed).
+    d.HIGHLIGHT_ON_UPLOAD_THREADS = 1
+    d.HIGHLIGHT_ON_UPLOAD_QUEUE = 100
+
     d.ROOT_URLCONF = 'urls'
 
     d.LOGIN_REDIRECT_URL = 'task_list'
@@ -218,6 +264,21 @@ def load_defaults(settings):
     d.EMAIL_HOST_PASSWORD = ""
     d.EMAIL_USE_TLS = False
 
+    # Mails are put into an outbox (see utilities.models.OutgoingMail). They are sent by
+    # ./manage.py send_outbox if USE_MAIL_WORKER is enabled, and otherwise, once the transaction
+    # queueing them is committed, by a background thread of the process which queued them (or by
+    # the process itself, if MAIL_OUTBOX_BACKGROUND_SENDER is disabled). Both reuse one SMTP
+    # connection for all pending mails, and try failed mails again after a growing delay, up to
+    # MAIL_OUTBOX_MAX_ATTEMPTS times. Mails being sent for more than MAIL_OUTBOX_STALE_AFTER
+    # seconds are assumed to belong to a dead sender and are sent again.
+    # These retries are only reliable with the worker: The background thread retries only as
+    # long as its process lives, and without it failed mails wait for the next mail queued.
+    # So without USE_MAIL_WORKER, run ./manage.py send_outbox --once regularly, e.g. from cron.
+    d.USE_MAIL_WORKER = False
+    d.MAIL_OUTBOX_BACKGROUND_SENDER = True
+    d.MAIL_OUTBOX_MAX_ATTEMPTS = 5
+    d.MAIL_OUTBOX_STALE_AFTER = 600
+
     # TinyMCE
 
     d.TINYMCE_JS_URL = STATIC_URL + 'frameworks/tiny_mce/tiny_mce_src.js'
@@ -268,6 +329,31 @@ def load_defaults(settings):
     d.JUNIT38='junit'
     d.JAVA_LIBS = { 'junit3' : '/usr/share/java/junit.jar', 'junit4' : '/usr/share/java/junit4.jar' }
     d.JAVAP='javap'
+
+    # Port of the long-lived compile and test server for Java, which saves
+    # starting a new JVM for every JavaBuilder and JUnitChecker run. Start it
+    # with ./manage.py java_server. Without it (or if it is not running) javac
+    # and JUnit are run as separate processes. The server is not used with
+    # USEPRAKTOMATTESTER or USESAFEDOCKER, as it would bypass their isolation,
+    # nor for tests with a data/ directory or a custom runner. The tests of
+    # all students share the memory (TEST_MAXMEM) of the server; it restarts
+    # after a test timed out, ran out of memory or left threads behind.
+    # It handles JAVA_SERVER_THREADS requests at once. A request which is not
+    # taken by one of them within JAVA_SERVER_QUEUE_TIMEOUT seconds is run as
+    # a separate process instead; the time limit of a request starts when the
+    # server takes it.
+    d.JAVA_SERVER_PORT = None
+    d.JAVA_SERVER_THREADS = 4
+    d.JAVA_SERVER_QUEUE_TIMEOUT = 10
+
+    # The files of the CreateFileCheckers of a task are unpacked once into a
+    # template next to the sandboxes, from where they are copied into every
+    # sandbox. Set this to True to hardlink them instead. The linked files are
+    # read-only, so tests cannot change them; this only takes effect with
+    # USEPRAKTOMATTESTER, as the owner of the files could make them writable
+    # again and change the template for all later solutions.
+    d.SANDBOX_TEMPLATE_HARDLINKS = False
+
     d.GHC='ghc'
     d.SCALA='scala'
     d.SCALAC='scalac'
@@ -327,6 +413,10 @@ def load_defaults(settings):
     # for example: JUnitChecker, DejaGnuChecker
     d.TEST_TIMEOUT=60
 
+    # Seconds a timed out check gets to exit after SIGTERM before it is killed
+    # with SIGKILL.
+    d.TEST_KILL_GRACE_PERIOD=1
+
     # Amount of memory available to the checker, in megabytes
     # (this is currently only supported with USESAFEDOCKER=True)
     d.TEST_MAXMEM=100
@@ -341,8 +431,36 @@ def load_defaults(settings):
     # JUnitChecker, ScriptChecker,
     d.TEST_MAXLOGSIZE=64
 
+    # Maximal size (in kbyte) of the output of an external check which is
+    # kept in memory. Only the beginning and the end of longer output are
+    # kept.
+    d.TEST_MAXOUTPUTSIZE=1024
+
+    # Number of worker processes rechecking solutions (e.g. "run all checkers"
+    # in the admin). The pool is started on first use and kept afterwards.
     d.NUMBER_OF_TASKS_TO_BE_CHECKED_IN_PARALLEL = 1
 
+    # Number of checkers of a single solution which may run concurrently.
+    # Checkers which only read the sandbox (e.g. LineWidthChecker) or which
+    # work in a private copy of it (JUnitChecker, CheckStyleChecker) run in
+    # parallel, all other checkers still run on their own in their order.
+    d.NUMBER_OF_CHECKERS_RUN_IN_PARALLEL = 1
+
+    # Reuse checker results if a solution with identical files of the same
+    # author was already checked by a checker with the same configuration,
+    # instead of running the checker again.
+    d.CACHE_CHECKER_RESULTS = True
+
+    # Enable to check uploaded solutions in the background: The upload returns
+    # immediately and the checkers are run by one or more instances of
+    #   ./manage.py checker_worker
+    # If disabled, solutions are still checked within the upload request.
+    d.USE_CHECKER_WORKER = False
+
+    # How often a worker tries to check a solution before giving up, if the
+    # checking fails with an internal error or the worker is killed.
+    d.CHECKER_JOB_MAX_ATTEMPTS = 3
+
     d.MIMETYPE_ADDITIONAL_EXTENSIONS = \
         [("text/plain", ".properties"),
          ("text/x-r-script", ".R"),
@@ -15,6 +15,9 @@ BASE_PATH = '/'
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# The in-memory test database is not visible to other threads
+MAIL_OUTBOX_BACKGROUND_SENDER = False
+
 UPLOAD_ROOT = join(dirname(dirname(dirname(__file__))), 'data')
 
 SECRET_KEY = "not-so-secret"
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solutions', '0006_remove_tar_support'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='solutionfile',
+            name='stored_as_utf8',
+            field=models.BooleanField(default=False, editable=False, help_text='The text file was converted to UTF-8 on save(), so it can be copied into the sandbox as it is.'),
+        ),
+    ]
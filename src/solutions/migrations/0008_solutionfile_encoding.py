@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solutions', '0007_solutionfile_stored_as_utf8'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='solutionfile',
+            name='encoding',
+            field=models.CharField(blank=True, editable=False, help_text='Detected character set of the text file as uploaded.', max_length=50),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:58
+
+from django.db import migrations, models
+import solutions.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solutions', '0008_solutionfile_encoding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='solutionfile',
+            name='utf8_file',
+            field=models.FileField(blank=True, editable=False, help_text='The text file converted to UTF-8, if it was uploaded in another encoding.', max_length=500, upload_to=solutions.models.get_solutionfile_utf8_path),
+        ),
+        migrations.AlterField(
+            model_name='solutionfile',
+            name='stored_as_utf8',
+            field=models.BooleanField(default=False, editable=False, help_text='The text of the file is stored as UTF-8 (in utf8_file, or in file itself if it was uploaded as UTF-8), so it can be copied into the sandbox as it is.'),
+        ),
+    ]
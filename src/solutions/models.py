@@ -5,12 +5,14 @@ import tempfile
 import mimetypes
 import shutil
 import os, re
+from urllib.parse import urlparse
 
 from hashlib import sha256
 
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
 from django.core.files import File
+from django.core.files.base import ContentFile
 from django.db.models import Max
 from django.db import transaction
 from django.conf import settings
@@ -18,9 +20,12 @@ from django.template.loader import render_to_string
 from django.db.models.signals import post_delete
 from django.dispatch.dispatcher import receiver
 from django.core.mail import EmailMessage
+from django.template import loader
 
 from accounts.models import User
 from utilities import encoding, file_operations
+from utilities.lru import LRUCache
+from utilities.models import queue_mails
 from configuration import get_settings
 
 # TODO: This is duplicated from solutions/forms.py. Where should this go?
@@ -70,10 +75,30 @@ class Solution(models.Model):
             self.task.need_to_re_run_jplag()
         super(Solution, self).save(*args, **kwargs) # Call the "real" save() method.
 
-    def check_solution(self, run_secret = 0, debug_keep_tmp = False):
+    def check_solution(self, run_secret = 0, debug_keep_tmp = False, incremental = False):
         """Builds and tests this solution."""
         from checker.basemodels import check_solution
-        check_solution(self, run_secret, debug_keep_tmp)
+        check_solution(self, run_secret, debug_keep_tmp, incremental)
+
+    def finish_submission(self, uploader = None):
+        """ To be called once the checkers of a regular submission have run.
+        Sends the submission confirmation and makes this the final solution if it was accepted,
+        unless a newer solution of the author already became final in the meantime. """
+        if self.accepted:
+            send_confirmation_email(self, uploader)
+
+        if self.accepted or get_settings().accept_all_solutions:
+            if not self.task.solutions(self.author).filter(number__gt=self.number, final=True).exists():
+                self.final = True
+                self.save()
+
+    def get_hash(self):
+        """ SHA-256 of the paths and contents of all files of this solution """
+        s = sha256()
+        for file in self.solutionfile_set.all().order_by('file'):
+            s.update(file.path().encode('utf-8'))
+            s.update(file.get_hash().encode('ascii'))
+        return s.hexdigest()
 
     def attestations_by(self, user):
         return self.attestation_set.filter(author=user)
@@ -113,12 +138,22 @@ def get_solutionfile_upload_path(instance, filename):
     solution = instance.solution
     return 'SolutionArchive/Task_' + str(solution.task.id) + '/User_' + solution.author.username + '/Solution_' + str(solution.id) + '/' + filename
 
+def get_solutionfile_utf8_path(instance, filename):
+    # next to the uploaded files, in a hidden directory
+    return get_solutionfile_upload_path(instance, '.utf8/' + filename)
+
+# Decoded texts of solution files, by (id, file name)
+solution_file_texts = LRUCache(settings.SOLUTION_FILE_TEXT_CACHE_SIZE * 1024 * 1024)
+
 class SolutionFile(models.Model):
     """docstring for SolutionFile"""
 
     solution = models.ForeignKey(Solution, on_delete=models.CASCADE)
     file = models.FileField(upload_to = get_solutionfile_upload_path, max_length=500, help_text = _('Source code file as part of a solution an archive file (.zip) containing multiple solution files.'))
     mime_type = models.CharField(max_length=100, help_text = _("Guessed file type. Automatically  set on save()."))
+    encoding = models.CharField(max_length=50, blank = True, editable = False, help_text = _("Detected character set of the text file as uploaded."))
+    stored_as_utf8 = models.BooleanField(default = False, editable = False, help_text = _("The text of the file is stored as UTF-8 (in utf8_file, or in file itself if it was uploaded as UTF-8), so it can be copied into the sandbox as it is."))
+    utf8_file = models.FileField(upload_to = get_solutionfile_utf8_path, max_length=500, blank = True, editable = False, help_text = _("The text file converted to UTF-8, if it was uploaded in another encoding."))
 
     # ignore hidden or os-specific files, etc. in zipfiles
     regex = r'(' + '|'.join([
@@ -145,14 +180,34 @@ class SolutionFile(models.Model):
         else:
             self.mime_type = mimetypes.guess_type(self.file.name)[0]
             models.Model.save(self, force_insert, force_update, using)
+            if not self.isBinary() and not self.stored_as_utf8:
+                self.store_as_utf8(using)
+
+    def store_as_utf8(self, using=None):
+        """ Stores the text of the file as UTF-8 once, instead of converting it on every copy into a sandbox.
+        The uploaded file itself is kept as it is. """
+        content = read_file(self.file)
+        self.encoding = encoding.get_charset(content) if content else "utf-8"
+        normalised = encoding.get_utf8(content.decode(self.encoding))
+        if normalised != content:
+            self.utf8_file.save(self.path(), ContentFile(normalised), save=False)
+        self.stored_as_utf8 = True
+        models.Model.save(self, using=using, update_fields=['encoding', 'stored_as_utf8', 'utf8_file'])
+
+    def utf8_text_file(self):
+        """ The stored file with the UTF-8 text of this file, None if there is none (e.g. for files uploaded before they were converted on save()). """
+        if self.utf8_file:
+            return self.utf8_file
+        if self.stored_as_utf8:
+            return self.file
+        return None
 
     def __str__(self):
         return self.file.name.rpartition('/')[2]
 
     def get_hash(self):
-        self.file.seek(0)
         s = sha256()
-        s.update(self.file.read())
+        s.update(read_file(self.file))
         return s.hexdigest()
 
     def isBinary(self):
@@ -169,37 +224,63 @@ class SolutionFile(models.Model):
         return self.file.name[len(get_solutionfile_upload_path(self, '')):]
 
     def content(self):
-        """docstring for content"""
+        """ The text of the file. Decoded texts are kept in an LRU cache, as solution files don't change. """
         if self.isBinary():
             return "Binary Data"
-        else:
-            return encoding.get_unicode(self.file.read())
+        key = (self.pk, self.file.name)
+        text = solution_file_texts.get(key)
+        if text is None:
+            text_file = self.utf8_text_file()
+            if text_file is not None:
+                text = read_file(text_file).decode("utf-8")
+            else:
+                content = read_file(self.file)
+                if not self.encoding:
+                    # Files uploaded before the encoding was detected on save()
+                    self.encoding = encoding.get_charset(content) if content else "utf-8"
+                    if self.pk is not None:
+                        SolutionFile.objects.filter(pk=self.pk).update(encoding=self.encoding)
+                text = content.decode(self.encoding)
+            if self.pk is not None:
+                solution_file_texts.put(key, text)
+        return text
 
     def copyTo(self, directory):
         """ Copies this file to the given directory """
         new_file_path = os.path.join(directory, self.path())
         if self.isBinary():
-            full_directory = os.path.join(directory, os.path.dirname(self.path()))
-            if not os.path.exists(full_directory):
-                file_operations.makedirs(full_directory)
-            shutil.copy(self.file.file.name, new_file_path)
+            file_operations.copy_file(self.file.path, new_file_path)
+        elif self.utf8_text_file() is not None:
+            file_operations.copy_file(self.utf8_text_file().path, new_file_path)
         else:
             file_operations.create_file(new_file_path, self.content())
 
+def read_file(field_file):
+    """ Reads the content of the stored file with a handle of its own, as the SolutionFile may be shared
+    by several threads (e.g. by checkers running concurrently). """
+    if not field_file._committed:
+        field_file.open('rb')
+        return field_file.read()
+    with field_file.storage.open(field_file.name, 'rb') as fd:
+        return fd.read()
+
 # from http://stackoverflow.com/questions/5372934
 @receiver(post_delete, sender=SolutionFile)
 def solution_file_delete(sender, instance, **kwargs):
     # Pass false so FileField doesn't save the model.
-    filename = os.path.join(settings.UPLOAD_ROOT, instance.file.name)
-    instance.file.delete(False)
-    # Remove left over empty directories
-    dirname = os.path.dirname(filename)
-    try:
-        while os.path.basename(dirname) != "SolutionArchive":
-            os.rmdir(dirname)
-            dirname = os.path.dirname(dirname)
-    except OSError:
-        pass
+    for field_file in [instance.utf8_file, instance.file]:
+        if not field_file:
+            continue
+        filename = os.path.join(settings.UPLOAD_ROOT, field_file.name)
+        field_file.delete(False)
+        # Remove left over empty directories
+        dirname = os.path.dirname(filename)
+        try:
+            while os.path.basename(dirname) != "SolutionArchive":
+                os.rmdir(dirname)
+                dirname = os.path.dirname(dirname)
+        except OSError:
+            pass
 
 
 
@@ -322,42 +403,20 @@ path_regexp = re.compile(r'[^-]*-[^-]*-(.*)')
 def id_for_path(path):
     return path_regexp.match(path).group(1)
 
-class ConfirmationMessage(EmailMessage):
-    """
-    Special EmailMessage to combine headers set by OpenSSL S/MIME and django sendmail.
-    """
-    def __init__(self, subject='', body='', from_email=None, to=None, bcc=None,
-                 connection=None, attachments=None, headers=None, cc=None,
-                 reply_to=None):
-        super(ConfirmationMessage, self).__init__(
-            subject, body, from_email, to, bcc, connection, attachments,
-            headers, cc, reply_to,
-        )
-
-    def message(self):
-        message = super(ConfirmationMessage, self).message()
-        return MessageWrapper(message)
-
-class MessageWrapper():
-    def __init__(self, message):
-        self.message = message
-
-    # Django supplies Strings as "linesep" (and not Bytes)
-    def as_bytes(self, linesep='\n'):
-        # byte version of linesep
-        linesep_bytes = linesep.encode('ascii')
-        # Construct the message with the full S/MIME mail as body
-        msg = self.message.as_bytes(linesep=linesep)
-        # Now, use the S/MIME headers as headers for the email
-        lines = msg.split(linesep_bytes)
-        if (lines[0] != b'Content-Type: text/plain; charset="utf-8"' or
-                lines[1] != b'MIME-Version: 1.0' or
-                not re.match(b'Content-Transfer-Encoding: (7|8)bit', lines[2])):
-            raise AssertionError('Assumptions on message format violated')
-        i = lines.index(b'')
-        j = lines[i+1:].index(b'') + i + 1
-        transformed = lines[i+1:j] + lines[3:i] + lines[j+1:]
-        return linesep_bytes.join(transformed)
-
-    def get_charset(self):
-        return None
+def send_confirmation_email(solution, uploader = None):
+    """ Queues a submission confirmation, signed with settings.PRIVATE_KEY when it is sent, to the author of the solution.
+    uploader is set if someone else uploaded the solution in the name of the author. """
+    if not solution.author.email:
+        return
+    base_host = urlparse(settings.BASE_HOST)
+    t = loader.get_template('solutions/submission_confirmation_email.html')
+    c = {
+        'protocol': base_host.scheme,
+        'domain': base_host.netloc,
+        'site_name': settings.SITE_NAME,
+        'solution': solution,
+    }
+    if uploader:
+        # in case someone else uploaded the solution, add this to the email
+        c['uploader'] = uploader
+    queue_mails([EmailMessage(_("%s submission confirmation") % settings.SITE_NAME, t.render(c), None, [solution.author.email])], sign=True)
@@ -1,8 +1,16 @@
 from django import template
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection as db_connection, transaction
 from django.template.defaultfilters import stringfilter
 from django.utils.safestring import mark_safe
 from django.utils.html import escape
+import logging
+import os
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
 from pygments import highlight
 from pygments.formatters import HtmlFormatter
 from pygments.lexers import get_lexer_by_name, guess_lexer, guess_lexer_for_filename, ClassNotFound
@@ -11,6 +19,8 @@ from pygments.lexers._mapping import LEXERS
 # This is a hack to register our Isabelle Lexer without patching pygments or using setuptools' entry_points.
 LEXERS['IsarLexer'] = ('utilities.isar_lexer', 'Isabelle/Isar', ('isabelle',), ('*.thy',), ('text/x-isabelle',))
 
+logger = logging.getLogger(__name__)
+
 register = template.Library()
 
 def get_lexer(value, arg):
@@ -18,22 +28,72 @@ def get_lexer(value, arg):
         return guess_lexer(value)
     return guess_lexer_for_filename(arg, value) #get_lexer_by_name(arg)
 
+def cached_highlight(value, filename, diff=False, **options):
+    """ Highlights value as HTML, cached by its content, the file name (which determines the lexer) and the formatter options.
+    If diff, value is a diff and the result is passed through highlight_diff as well. """
+    # Only the file name matters to the lexer, not the directory
+    lexer_key = os.path.basename(filename) if filename is not None else None
+    key = "highlight-" + sha256(repr((sha256(value.encode('utf-8')).hexdigest(), lexer_key, diff, sorted(options.items()))).encode('utf-8')).hexdigest()
+    cache = caches['highlight']
+    html = cache.get(key)
+    if html is None:
+        try:
+            html = highlight(value, get_lexer(value, filename), HtmlFormatter(**options))
+        except ClassNotFound:
+            html = "<pre>%s</pre>" % escape(value)
+        if diff:
+            html = highlight_diff(html)
+        cache.set(key, html)
+    return mark_safe(html)
+
 @register.filter(name='highlight')
 @stringfilter
 def colorize(value, arg=None):
-    try:
-        return mark_safe(highlight(value, get_lexer(value, arg), HtmlFormatter()))
-    except ClassNotFound:
-        return mark_safe("<pre>%s</pre>" % escape(value))
+    return cached_highlight(value, arg)
 
 
 @register.filter(name='highlight_table')
 @stringfilter
 def colorize_table(value,arg=None):
-    try:
-        return mark_safe(highlight(value, get_lexer(value, arg), HtmlFormatter(linenos='table')))
-    except ClassNotFound:
-        return mark_safe("<pre>%s</pre>" % escape(value))
+    return cached_highlight(value, arg, linenos='table')
+
+
+@register.filter(name='highlight_diff_table')
+@stringfilter
+def colorize_diff_table(value,arg=None):
+    "highlight_table followed by highlight_diff"
+    return cached_highlight(value, arg, diff=True, linenos='table')
+
+_highlighter_lock = threading.Lock()
+_highlighter = None
+_highlighter_slots = None
+
+def highlight_in_background(solution):
+    """ Highlights the text files of the solution in a background thread, the way solution_files_inline.html shows them,
+    once the current transaction is committed. The files are read in that thread, not in the request.
+    If settings.HIGHLIGHT_ON_UPLOAD_QUEUE solutions are waiting already, they are highlighted when they are viewed. """
+    global _highlighter, _highlighter_slots
+    if not settings.HIGHLIGHT_ON_UPLOAD:
+        return
+    with _highlighter_lock:
+        if _highlighter is None:
+            _highlighter = ThreadPoolExecutor(max_workers=settings.HIGHLIGHT_ON_UPLOAD_THREADS)
+            _highlighter_slots = threading.BoundedSemaphore(settings.HIGHLIGHT_ON_UPLOAD_QUEUE)
+    if not _highlighter_slots.acquire(blocking=False):
+        return
+    solution_id = solution.id
+    def run():
+        from solutions.models import SolutionFile
+        try:
+            for solution_file in SolutionFile.objects.filter(solution_id=solution_id):
+                if not solution_file.isBinary():
+                    colorize_table(solution_file.content(), solution_file.file.name)
+        except Exception:
+            logger.exception("Highlighting solution %d failed", solution_id)
+        finally:
+            _highlighter_slots.release()
+            db_connection.close()
+    transaction.on_commit(lambda: _highlighter.submit(run))
 
 rx_diff_pm = re.compile('^(?P<first_line>\d*</pre></div></td><td class="code"><div class="highlight"><pre>)?(?P<line>(<span class=".*?">)?(?P<plusminus>\+|-).*?)(?P<endtag></pre>)?$')
 rx_diff_questionmark = re.compile('(?P<line>(<span class="\w*">)?\?.*$)')
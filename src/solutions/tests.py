@@ -1,12 +1,23 @@
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
 from os.path import dirname, join
 from datetime import datetime, timedelta
 
 from utilities.TestSuite import TestCase
 from django.test.client import Client
+from django.test import override_settings
+from django.core.management import call_command
 from django.urls import reverse
 
-from solutions.models import Solution
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from solutions.models import Solution, SolutionFile, read_file
+from solutions.templatetags import highlight
 from tasks.models import Task
+from checker.basemodels import CheckerJob, queue_check
 
 class TestViews(TestCase):
     def setUp(self):
@@ -30,6 +41,79 @@ class TestViews(TestCase):
                             }, follow=True)
         self.assertRedirectsToView(response, 'solution_detail')
 
+    @override_settings(USE_CHECKER_WORKER=True)
+    def test_post_solution_queued(self):
+        path = join(dirname(dirname(dirname(__file__))), 'examples', 'Tasks', 'AMI', 'ModelSolution(flat).zip')
+        with open(path, 'rb') as f:
+            response = self.client.post(reverse('solution_list', args=[self.task.id]), data={
+                                'solutionfile_set-INITIAL_FORMS': '0',
+                                'solutionfile_set-TOTAL_FORMS': '3',
+                                'solutionfile_set-0-file': f
+                            }, follow=True)
+        self.assertRedirectsToView(response, 'solution_checking')
+        job = CheckerJob.objects.get(status=CheckerJob.PENDING)
+        self.assertEqual(job.priority, CheckerJob.PRIORITY_HIGH)
+
+        call_command('checker_worker', once=True, verbosity=0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, CheckerJob.DONE)
+        self.assertTrue(job.solution.final)
+
+        response = self.client.get(reverse('solution_checking', args=[job.solution.id]), follow=True)
+        self.assertRedirectsToView(response, 'solution_detail')
+
+    def test_newer_submission_takes_precedence(self):
+        older = Solution.objects.create(task = self.task, author = self.task.solution_set.all()[0].author)
+        newer = Solution.objects.create(task = self.task, author = older.author)
+        older_job = CheckerJob.enqueue(older, submission=True)
+        newer_job = CheckerJob.enqueue(newer, submission=True)
+        self.assertEqual(CheckerJob.claim_next(), newer_job)
+        older_job.refresh_from_db()
+        self.assertEqual(older_job.priority, CheckerJob.PRIORITY_LOW)
+
+    def test_failed_attempt_retried_without_worker(self):
+        solution = Solution.objects.create(task = self.task, author = self.task.solution_set.all()[0].author)
+        with mock.patch('checker.basemodels.check_solution', side_effect=[RuntimeError("killed"), None]) as check:
+            job = queue_check(solution, submission=True)
+        self.assertEqual(check.call_count, 2)
+        self.assertEqual(job.status, CheckerJob.DONE)
+        self.assertEqual(job.attempts, 2)
+
+    def test_job_claimed_by_worker(self):
+        solution = Solution.objects.create(task = self.task, author = self.task.solution_set.all()[0].author)
+        # a worker claims the job before the request can
+        with mock.patch.object(CheckerJob, 'claim', return_value=False), mock.patch('checker.basemodels.check_solution') as check:
+            job = queue_check(solution)
+        self.assertFalse(check.called)
+        self.assertEqual(job.status, CheckerJob.PENDING)
+
+    @override_settings(CHECKER_JOB_MAX_ATTEMPTS=2)
+    def test_failing_job_gives_up_without_worker(self):
+        solution = Solution.objects.create(task = self.task, author = self.task.solution_set.all()[0].author)
+        with mock.patch('checker.basemodels.check_solution', side_effect=RuntimeError("broken checker")) as check:
+            job = queue_check(solution, submission=True)
+        self.assertEqual(check.call_count, 2)
+        self.assertEqual(job.status, CheckerJob.FAILED)
+        self.assertIn("broken checker", job.error)
+        self.assertFalse(Solution.objects.get(pk=solution.pk).final)
+
+        response = self.client.get(reverse('solution_checking', args=[solution.id]))
+        self.assertContains(response, "could not be checked")
+        response = self.client.get(reverse('solution_checking_status', args=[solution.id]))
+        self.assertTrue(response.json()['failed'])
+
+    @override_settings(CHECKER_JOB_MAX_ATTEMPTS=2)
+    def test_stale_job_fails_after_max_attempts(self):
+        solution = Solution.objects.create(task = self.task, author = self.task.solution_set.all()[0].author)
+        job = CheckerJob.enqueue(solution)
+        for attempt in range(2):
+            self.assertTrue(job.claim())
+            CheckerJob.objects.filter(pk=job.pk).update(started=datetime.now() - timedelta(hours=2))
+            CheckerJob.requeue_stale(timedelta(hours=1))
+            job.refresh_from_db()
+        self.assertEqual(job.status, CheckerJob.FAILED)
+        self.assertEqual(job.attempts, 2)
+
     def test_post_solution_expired(self):
         self.task.submission_date = datetime.now() - timedelta(hours=3)
         self.task.save()
@@ -48,6 +132,67 @@ class TestViews(TestCase):
         self.assertEqual(response.status_code, 200)
 
 
+class TestSolutionFile(TestCase):
+    def test_stored_as_utf8(self):
+        solution = Solution.objects.all()[0]
+        solution_file = SolutionFile(solution = solution, file = SimpleUploadedFile('Umlaut.java', 'class Umlaut { String s = "äöü"; }'.encode('iso-8859-1')))
+        solution_file.save()
+        self.assertTrue(solution_file.stored_as_utf8)
+        self.assertNotEqual(solution_file.encoding, 'utf-8')
+        # the uploaded file is kept as it is
+        with open(solution_file.file.path, 'rb') as f:
+            self.assertEqual(f.read(), 'class Umlaut { String s = "äöü"; }'.encode('iso-8859-1'))
+        with open(solution_file.utf8_file.path, 'rb') as f:
+            self.assertEqual(f.read(), 'class Umlaut { String s = "äöü"; }'.encode('utf-8'))
+        solution_file = SolutionFile.objects.get(pk = solution_file.pk)
+        self.assertEqual(solution_file.content(), 'class Umlaut { String s = "äöü"; }')
+        # the second time, the text comes from the cache
+        with mock.patch.object(solution_file.utf8_file.storage, 'open') as open_file:
+            self.assertEqual(solution_file.content(), 'class Umlaut { String s = "äöü"; }')
+            self.assertFalse(open_file.called)
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        solution_file.copyTo(directory)
+        with open(join(directory, 'Umlaut.java'), 'rb') as f:
+            self.assertEqual(f.read(), 'class Umlaut { String s = "äöü"; }'.encode('utf-8'))
+
+    def test_content_concurrently(self):
+        solution_file = SolutionFile.objects.all()[0]
+        with open(solution_file.file.path, 'rb') as f:
+            expected = f.read()
+        # the threads share the SolutionFile, like checkers running concurrently
+        texts = []
+        def read():
+            for i in range(20):
+                texts.append(read_file(solution_file.file))
+                solution_file.get_hash()
+        threads = [threading.Thread(target=read) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(set(texts), {expected})
+
+    def test_deleted_with_utf8_copy(self):
+        solution = Solution.objects.all()[0]
+        solution_file = SolutionFile(solution = solution, file = SimpleUploadedFile('Umlaut.java', 'class Umlaut { String s = "äöü"; }'.encode('iso-8859-1')))
+        solution_file.save()
+        paths = [solution_file.file.path, solution_file.utf8_file.path]
+        solution_file.delete()
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+
+class TestHighlight(TestCase):
+    def test_cached(self):
+        with mock.patch('solutions.templatetags.highlight.highlight', wraps=highlight.highlight) as pygments_highlight:
+            html = highlight.colorize_table('class Foo {}', 'Task_1/Foo.java')
+            self.assertIn('class="highlighttable"', html)
+            self.assertEqual(highlight.colorize_table('class Foo {}', 'Task_2/Foo.java'), html)
+            self.assertEqual(pygments_highlight.call_count, 1)
+            # different formatter options
+            highlight.colorize('class Foo {}', 'Task_1/Foo.java')
+            self.assertEqual(pygments_highlight.call_count, 2)
+
 def test_concurrently(times):
     """
     Add this decorator to small pieces of code that you want to test
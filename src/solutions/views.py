@@ -1,35 +1,28 @@
-import zipfile
-import tempfile
-
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render, get_object_or_404
 from django.http import Http404
-from django.http import HttpResponseRedirect, HttpResponse
+from django.http import HttpResponseRedirect, HttpResponse, JsonResponse
 from django.urls import reverse
 from django.views.decorators.cache import cache_control
-from django.template import loader
 from django.conf import settings
-from django.core.mail import send_mail, get_connection
 from django.utils.translation import ugettext_lazy as _
-from django.contrib.sites.requests import RequestSite
 
 
 from datetime import datetime
 
 from tasks.models import Task, HtmlInjector
 from attestation.models import Attestation
-from solutions.models import Solution, SolutionFile, get_solutions_zip, ConfirmationMessage
+from solutions.models import Solution, SolutionFile, get_solutions_zip
 from solutions.forms import SolutionFormSet
 from accounts.views import access_denied
 from accounts.models import User
 from configuration import get_settings
 from checker.basemodels import CheckerResult
-from checker.basemodels import check_solution
+from checker.basemodels import check_solution, queue_check, CheckerJob
+from solutions.templatetags.highlight import highlight_in_background
 from django.db import transaction
 
-from utilities.safeexec import execute_arglist
-
 @login_required
 @cache_control(must_revalidate=True, no_cache=True, no_store=True, max_age=0) #reload the page from the server even if the user used the back button
 def solution_list(request, task_id, user_id=None):
@@ -54,36 +47,11 @@ def solution_list(request, task_id, user_id=None):
             solution.save()
             formset.save()
             run_all_checker = bool(User.objects.filter(id=user_id, tutorial__tutors__pk=request.user.id) or request.user.is_trainer)
-            solution.check_solution(run_all_checker)
-
-            if solution.accepted:
-                # Send submission confirmation email
-                t = loader.get_template('solutions/submission_confirmation_email.html')
-                c = {
-                    'protocol': request.is_secure() and "https" or "http",
-                    'domain': RequestSite(request).domain,
-                    'site_name': settings.SITE_NAME,
-                    'solution': solution,
-                }
-                if user_id:
-                    # in case someone else uploaded the solution, add this to the email
-                    c['uploader'] = request.user
-                with tempfile.NamedTemporaryFile(mode='w+') as tmp:
-                    tmp.write("Content-Type: text/plain; charset=utf-8\n")
-                    tmp.write("Content-Transfer-Encoding: quoted-printable\n\n")
-                    tmp.write(t.render(c))
-                    tmp.seek(0)
-                    [signed_mail, __, __, __, __]  = execute_arglist(["openssl", "smime", "-sign", "-signer", settings.CERTIFICATE, "-inkey", settings.PRIVATE_KEY, "-in", tmp.name], ".", unsafe=True)
-                connection = get_connection()
-                message = ConfirmationMessage(_("%s submission confirmation") % settings.SITE_NAME, signed_mail, None, [solution.author.email], connection=connection)
-                if solution.author.email:
-                    message.send()
-
-            if solution.accepted or get_settings().accept_all_solutions:
-                solution.final = True
-                solution.save()
-
-            return HttpResponseRedirect(reverse('solution_detail', args=[solution.id]))
+            uploader = request.user if user_id else None
+            queue_check(solution, run_all_checker, submission=True, uploader=uploader)
+            highlight_in_background(solution)
+
+            return HttpResponseRedirect(reverse('solution_checking', args=[solution.id]))
     else:
         formset = SolutionFormSet()
 
@@ -106,9 +74,10 @@ def test_upload(request, task_id):
         if formset.is_valid():
             solution.save()
             formset.save()
-            solution.check_solution(run_secret = True)
+            queue_check(solution, run_all = True)
+            highlight_in_background(solution)
 
-            return HttpResponseRedirect(reverse('solution_detail_full', args=[solution.id]))
+            return HttpResponseRedirect(reverse('solution_checking_full', args=[solution.id]))
     else:
         formset = SolutionFormSet()
 
@@ -126,9 +95,10 @@ def test_upload_student(request, task_id):
         if formset.is_valid():
             solution.save()
             formset.save()
-            solution.check_solution(run_secret = False)
+            queue_check(solution, run_all = False)
+            highlight_in_background(solution)
 
-            return HttpResponseRedirect(reverse('solution_detail', args=[solution.id]))
+            return HttpResponseRedirect(reverse('solution_checking', args=[solution.id]))
     else:
         formset = SolutionFormSet()
 
@@ -176,6 +146,44 @@ def solution_detail(request, solution_id, full):
                       }
                      )
 
+def may_see_checking(user, solution, full):
+    return ((solution.author == user or user.is_trainer or user.is_superuser or (solution.author.tutorial and solution.author.tutorial.tutors.filter(id=user.id)))
+            and (not full or user.is_trainer or user.is_tutor or user.is_superuser))
+
+@login_required
+@cache_control(must_revalidate=True, no_cache=True, no_store=True, max_age=0)
+def solution_checking(request, solution_id, full):
+    """ Shown while the checkers of a freshly uploaded solution are waiting in the queue or running, or if checking it failed. """
+    solution = get_object_or_404(Solution, pk=solution_id)
+    if not may_see_checking(request.user, solution, full):
+        return access_denied(request)
+
+    job = solution.checkerjob_set.order_by('-id').first()
+    detail_url = reverse('solution_detail_full' if full else 'solution_detail', args=[solution.id])
+    if job is None or job.status == CheckerJob.DONE:
+        return HttpResponseRedirect(detail_url)
+
+    return render(request, "solutions/solution_checking.html",
+                {"solution": solution, "job": job, "detail_url": detail_url})
+
+@login_required
+@cache_control(must_revalidate=True, no_cache=True, no_store=True, max_age=0)
+def solution_checking_status(request, solution_id):
+    """ Polled by the checking page. """
+    solution = get_object_or_404(Solution, pk=solution_id)
+    if not may_see_checking(request.user, solution, False):
+        return access_denied(request)
+
+    job = solution.checkerjob_set.order_by('-id').first()
+    if job is None:
+        return JsonResponse({'finished': True})
+    return JsonResponse({
+        'finished': job.is_finished(),
+        'failed': job.status == CheckerJob.FAILED,
+        'status': job.get_status_display(),
+        'queue_position': job.queue_position() if job.status == CheckerJob.PENDING else 0,
+    })
+
 @login_required
 def solution_download(request, solution_id, full):
     solution = get_object_or_404(Solution, pk=solution_id)
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.shortcuts import render
 from django.contrib.auth.admin import UserAdmin
 from django.db import models
@@ -17,6 +17,9 @@ import tasks.views
 
 from checker.admin import CheckerInline
 from timeit import default_timer as timer
+import logging
+
+logger = logging.getLogger(__name__)
 
 admin.autodiscover()
 
@@ -51,7 +54,7 @@ class TaskAdmin(admin.ModelAdmin):
     date_hierarchy = 'publication_date'
     save_on_top = True
     inlines = [MediaInline] + [HtmlInjectorInline] + CheckerInline.__subclasses__() + [ RatingAdminInline]
-    actions = ['export_tasks', 'run_all_checkers']
+    actions = ['export_tasks', 'run_all_checkers', 'run_changed_checkers']
 
     formfield_overrides = {
         models.TextField: {'widget': TinyMCE()},
@@ -74,14 +77,27 @@ class TaskAdmin(admin.ModelAdmin):
         return response
 
 
-    def run_all_checkers(self, request, queryset):
+    def run_all_checkers(self, request, queryset, incremental = False):
         """ Rerun all checkers including "not always" action """
         start = timer()
         count = 0
+        failed = []
+        def progress(solution_id, done, total, error):
+            if error is not None:
+                failed.append(solution_id)
+                logger.error("Checking solution %d failed:\n%s", solution_id, error)
+            logger.info("Checked %d of %d final solutions", done, total)
         for task in queryset:
-            count += task.check_all_final_solutions()
+            count += task.check_all_final_solutions(progress, incremental)
         end = timer()
-        self.message_user(request, "%d final solutions were successfully checked (%d seconds elapsed)." % (count, end-start))
+        self.message_user(request, "%d final solutions were successfully checked (%d seconds elapsed)." % (count - len(failed), end-start))
+        if failed:
+            self.message_user(request, "Checking the solutions %s failed." % ", ".join(str(solution_id) for solution_id in failed), messages.ERROR)
+
+    def run_changed_checkers(self, request, queryset):
+        """ Rerun only the checkers changed since the last run (and those depending on them) action """
+        self.run_all_checkers(request, queryset, incremental = True)
+    run_changed_checkers.short_description = "Rerun changed checkers on final solutions"
 
     def get_urls(self):
         """ Add URL to task import """
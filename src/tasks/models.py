@@ -53,10 +53,11 @@ class Task(models.Model):
         """returns whether the task has expired"""
         return self.submission_date + timedelta(hours=1) < datetime.now()
 
-    def check_all_final_solutions(self):
+    def check_all_final_solutions(self, progress = None, incremental = False):
+        """ Reruns all checkers (if incremental: only the changed ones) on the final solutions, see checker.basemodels.check_multiple """
         from checker.basemodels import check_multiple
         final_solutions = self.solution_set.filter(final=True)
-        count = check_multiple(final_solutions, True)
+        count = check_multiple(final_solutions, True, progress = progress, incremental = incremental)
 
         if self.expired():
                 self.all_checker_finished = True
@@ -236,12 +237,18 @@ class Task(models.Model):
                 # save modelsolution, media and checker, update task id
                 if isinstance(object, SolutionFile):
                     object.solution_id = solution_id_map[object.solution_id]
+                    # The UTF-8 copy is not exported, the text is decoded from the file itself
+                    object.utf8_file = ''
+                    object.stored_as_utf8 = False
+                    object.encoding = ''
                 else:
                     object.task_id = task_id_map[object.task_id]
 
                 from django.core.files import File
                 for file_field in [x for x in object.__class__._meta.fields if isinstance(x, models.FileField)]:
                     file_field_instance = object.__getattribute__(file_field.attname)
+                    if not file_field_instance:
+                        continue
                     temp_file = tempfile.NamedTemporaryFile()                        # autodeleted
                     temp_file.write(zip.open(file_field_instance.name).read())
                     file_field_instance.save(file_field_instance.name, File(temp_file))
@@ -1,5 +1,6 @@
 from os.path import dirname, join
 from datetime import datetime, timedelta
+from unittest import mock
 
 from utilities.TestSuite import TestCase
 from django.urls import reverse
@@ -81,3 +82,9 @@ class TestStaffViews(TestCase):
     def test_task_run_all_checker_parallel(self):
         with self.settings(NUMBER_OF_TASKS_TO_BE_CHECKED_IN_PARALLEL=4):
             self.test_task_run_all_checker()
+
+    def test_no_checker_pool_in_transaction(self):
+        # the test runs in a transaction, the processes of a pool would not see its data
+        with self.settings(NUMBER_OF_TASKS_TO_BE_CHECKED_IN_PARALLEL=2), mock.patch('multiprocessing.get_context') as get_context:
+            self.test_task_run_all_checker()
+        self.assertFalse(get_context.called)
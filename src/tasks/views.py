@@ -21,7 +21,7 @@ from solutions.models import Solution, SolutionFile
 from accounts.models import User
 from accounts.views import access_denied
 from attestation.models import Attestation
-from attestation.views import user_task_attestation_map
+from attestation.views import user_attestations
 from configuration import get_settings
 
 @login_required
@@ -35,9 +35,7 @@ def taskList(request):
         tutors = None
     trainers = User.objects.filter(groups__name="Trainer")
 
-    # we only have a single user here, so the rating_list only contains a single row;
-    # this row belongs to the given user
-    (_, attestations, threshold, calculated_grade) = user_task_attestation_map([request.user], tasks)[0]
+    (attestations, threshold, calculated_grade) = user_attestations(request.user, tasks)
     attestations = list(map(lambda a, b: (a,)+b, tasks, attestations))
 
     def tasksWithSolutions(tasks):
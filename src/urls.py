@@ -40,6 +40,9 @@ urlpatterns = [
     # Solutions
     url(r'^solutions/(?P<solution_id>\d+)/$', solutions.views.solution_detail, name='solution_detail',kwargs={'full' : False}),
     url(r'^solutions/(?P<solution_id>\d+)/full/$', solutions.views.solution_detail, name='solution_detail_full', kwargs={'full': True}),
+    url(r'^solutions/(?P<solution_id>\d+)/checking/$', solutions.views.solution_checking, name='solution_checking', kwargs={'full' : False}),
+    url(r'^solutions/(?P<solution_id>\d+)/checking/full/$', solutions.views.solution_checking, name='solution_checking_full', kwargs={'full' : True}),
+    url(r'^solutions/(?P<solution_id>\d+)/checking/status$', solutions.views.solution_checking_status, name='solution_checking_status'),
     url(r'^solutions/(?P<solution_id>\d+)/download$', solutions.views.solution_download, name='solution_download',kwargs={'full' : False}),
     url(r'^solutions/(?P<solution_id>\d+)/download/(?P<full>full)/$', solutions.views.solution_download, name='solution_download'),
     url(r'^solutions/(?P<solution_id>\d+)/run_checker$', solutions.views.solution_run_checker, name='solution_run_checker'),
@@ -55,6 +58,7 @@ urlpatterns = [
 
     #Attestation
     url(r'^tasks/(?P<task_id>\d+)/attestation/statistics$', attestation.views.statistics, name='statistics'),
+    url(r'^tasks/(?P<task_id>\d+)/attestation/statistics.json$', attestation.views.statistics_json, name='statistics_json'),
     url(r'^tasks/(?P<task_id>\d+)/attestation/$', attestation.views.attestation_list, name='attestation_list'),
     url(r'^tasks/(?P<task_id>\d+)/attestation/new$', attestation.views.new_attestation_for_task, name='new_attestation_for_task'),
     url(r'^solutions/(?P<solution_id>\d+)/attestation/new$', attestation.views.new_attestation_for_solution, name='new_attestation_for_solution', kwargs={'force_create' : False}),
@@ -14,6 +14,11 @@ class TestSuiteRunner(DiscoverRunner):
         # storage object is lazy and is not updated by simply updating the settings
         from django.core.files.storage import default_storage
         default_storage.location = self.testSuiteUploadRoot
+        settings.SANDBOX_DIR = join(self.testSuiteUploadRoot, 'SolutionSandbox')
+        # the configured caches may be shared with the production instance
+        for (alias, location) in [('highlight', 'HighlightCache'), ('statistics', 'StatisticsCache')]:
+            settings.CACHES[alias] = dict(settings.CACHES[alias], BACKEND='django.core.cache.backends.filebased.FileBasedCache',
+                                          LOCATION=join(self.testSuiteUploadRoot, location))
 
     def setup_databases(self, **kwargs):
         """ Prefill database with some testdata. Rollbacks ensure that the database is in the state after create_test_data().
@@ -34,6 +39,13 @@ class TestSuiteRunner(DiscoverRunner):
 
 class TestCase(DjangoTestCase):
 
+    def run_commit_hooks(self):
+        """ Runs the functions registered with transaction.on_commit, which never run by themselves, as every test is rolled back. """
+        from django.db import connection
+        while connection.run_on_commit:
+            (_, func) = connection.run_on_commit.pop(0)
+            func()
+
     def assertRedirectsToView(self, response, view):
         """ Asserts whether the request was redirected to a specifivc view function. """
         from urllib.parse import urlparse
@@ -0,0 +1,25 @@
+from django.contrib import admin
+
+from utilities.models import OutgoingMail, send_outbox_in_background
+
+class OutgoingMailAdmin(admin.ModelAdmin):
+    model = OutgoingMail
+    list_display = ["subject", "recipients", "status", "attempts", "created", "next_attempt", "sent"]
+    readonly_fields = ["subject", "body", "from_email", "to", "bcc", "headers", "sign", "status", "attempts", "error", "created", "last_attempt", "next_attempt", "sent"]
+    list_filter = ["status", "sign", "created"]
+    search_fields = ["subject", "to"]
+    actions = ['resend']
+
+    def recipients(self, mail):
+        return ", ".join(mail.to.splitlines())
+
+    def resend(self, request, queryset):
+        """ Send the selected mails again """
+        count = queryset.exclude(status=OutgoingMail.SENDING).update(status=OutgoingMail.PENDING, attempts=0, next_attempt=None)
+        send_outbox_in_background()
+        self.message_user(request, "%d mails were queued again." % count)
+
+    def has_add_permission(self, request):
+        return False
+
+admin.site.register(OutgoingMail, OutgoingMailAdmin)
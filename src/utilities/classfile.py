@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+"""
+A minimal reader for Java class files: Just enough of the format (constant pool,
+class name and method table) to find the class containing a main method without
+starting javap.
+"""
+
+import struct
+
+ACC_PUBLIC = 0x0001
+ACC_STATIC = 0x0008
+
+MAIN_DESCRIPTOR = "([Ljava/lang/String;)V"
+
+# Sizes of the constant pool entries (besides Utf8) by tag
+CONSTANT_SIZES = {
+    3: 4,   # Integer
+    4: 4,   # Float
+    5: 8,   # Long
+    6: 8,   # Double
+    7: 2,   # Class
+    8: 2,   # String
+    9: 4,   # Fieldref
+    10: 4,  # Methodref
+    11: 4,  # InterfaceMethodref
+    12: 4,  # NameAndType
+    15: 3,  # MethodHandle
+    16: 2,  # MethodType
+    17: 4,  # Dynamic
+    18: 4,  # InvokeDynamic
+    19: 2,  # Module
+    20: 2,  # Package
+}
+
+class ClassFormatError(Exception):
+    pass
+
+class ClassFile:
+    """ The name and the methods [(access_flags, name, descriptor)...] of a class. """
+
+    def __init__(self, name, access_flags, methods):
+        self.name = name
+        self.access_flags = access_flags
+        self.methods = methods
+
+    def has_main_method(self):
+        """ Whether the class has a 'public static void main(String[])' (or 'String...') method. """
+        for (access_flags, name, descriptor) in self.methods:
+            if name == "main" and descriptor == MAIN_DESCRIPTOR and access_flags & ACC_PUBLIC and access_flags & ACC_STATIC:
+                return True
+        return False
+
+def parse(data):
+    """ Parses the bytes of a class file. Raises ClassFormatError if it is not one. """
+    try:
+        return _parse(data)
+    except (struct.error, IndexError, KeyError) as e:
+        raise ClassFormatError("Invalid class file: %s" % e)
+
+def _parse(data):
+    (magic, _, _, count) = struct.unpack_from(">IHHH", data, 0)
+    if magic != 0xCAFEBABE:
+        raise ClassFormatError("Not a class file")
+    offset = 10
+
+    # Only the Utf8 and Class entries are needed, the others are skipped
+    utf8 = {}
+    classes = {}
+    index = 1
+    while index < count:
+        tag = data[offset]
+        offset += 1
+        if tag == 1:
+            (length,) = struct.unpack_from(">H", data, offset)
+            # Modified UTF-8 differs from UTF-8 only in characters irrelevant for names
+            utf8[index] = data[offset + 2:offset + 2 + length].decode('utf-8', errors='replace')
+            offset += 2 + length
+        elif tag in CONSTANT_SIZES:
+            if tag == 7:
+                (classes[index],) = struct.unpack_from(">H", data, offset)
+            offset += CONSTANT_SIZES[tag]
+            if tag in (5, 6):
+                # Long and Double take up two entries
+                index += 1
+        else:
+            raise ClassFormatError("Unknown constant pool tag %d" % tag)
+        index += 1
+
+    (access_flags, this_class, _, interfaces_count) = struct.unpack_from(">HHHH", data, offset)
+    offset += 8 + 2 * interfaces_count
+    name = utf8[classes[this_class]].replace("/", ".")
+
+    (offset, _) = _parse_members(data, offset, utf8)   # fields
+    (offset, methods) = _parse_members(data, offset, utf8)
+    return ClassFile(name, access_flags, methods)
+
+def _parse_members(data, offset, utf8):
+    """ Parses a field or method table. Returns the offset after it and [(access_flags, name, descriptor)...]. """
+    (count,) = struct.unpack_from(">H", data, offset)
+    offset += 2
+    members = []
+    for _ in range(count):
+        (access_flags, name_index, descriptor_index, attributes_count) = struct.unpack_from(">HHHH", data, offset)
+        offset += 8
+        for _ in range(attributes_count):
+            (_, length) = struct.unpack_from(">HI", data, offset)
+            offset += 6 + length
+        members.append((access_flags, utf8[name_index], utf8[descriptor_index]))
+    return (offset, members)
+
+def parse_file(path):
+    with open(path, 'rb') as f:
+        return parse(f.read())
@@ -25,8 +25,7 @@ def makedirs(path):
         os.chmod(path, 0o770)
 
 
-def create_file(path, content, override=True, binary=False):
-    """ """
+def prepare_file(path, override):
     dirname = os.path.dirname(path)
     if not os.path.exists(dirname):
         makedirs(dirname)
@@ -36,30 +35,37 @@ def create_file(path, content, override=True, binary=False):
                 os.remove(path)
             else: # throw exception
                 raise Exception('File already exists')
-    with open(path, 'wb') as fd:
-        if binary:
-            fd.write(content)
-        else:
-            fd.write(encoding.get_utf8(encoding.get_unicode(content)))
+
+def set_file_permissions(path):
     if (gid):
         # chown :praktomat <path>
         os.chown(path, -1, gid)
         # rwxrwx---     access for praktomattester:praktomat
         os.chmod(path, 0o770)
 
+def create_file(path, content, override=True, binary=False):
+    """ """
+    prepare_file(path, override)
+    with open(path, 'wb') as fd:
+        if binary:
+            fd.write(content)
+        else:
+            fd.write(encoding.get_utf8(encoding.get_unicode(content)))
+    set_file_permissions(path)
+
 
 def copy_file(from_path, to_path, to_is_directory=False, override=True):
-    """ """
+    """ Copies the bytes of the file, within the kernel where possible (shutil uses sendfile on Linux) """
     if to_is_directory:
         to_path = os.path.join(to_path, os.path.basename(from_path))
-    with open(from_path, "rb") as fd:
-        create_file(to_path, fd.read(), override=override, binary=True)
+    prepare_file(to_path, override)
+    shutil.copyfile(from_path, to_path)
+    set_file_permissions(to_path)
 
 
 def create_tempfolder(path):
     makedirs(path)
-    tempfile.tempdir = path
-    new_tmpdir = tempfile.mkdtemp()
+    new_tmpdir = tempfile.mkdtemp(dir=path)
     if (gid):
         os.chown(new_tmpdir, -1, gid)
     os.chmod(new_tmpdir, 0o770)
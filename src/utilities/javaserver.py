@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+"""
+Client for the long-lived compile and test server (checker/scripts/JavaServer.java,
+started by ./manage.py java_server), which saves starting a JVM for every javac and JUnit run.
+All functions return None if the server may not be used (see available()), is not reachable
+or does not take the request within settings.JAVA_SERVER_QUEUE_TIMEOUT seconds, so the caller
+can fall back to execute_arglist. The request is only sent once the server has taken it, and from
+then on the caller must not fall back, as the server may still be working in the sandbox.
+"""
+
+import os
+import socket
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+def available():
+    """ Whether the server may be used: It is configured, and programs are neither run as the tester user
+    nor in docker, as the server would bypass that isolation. """
+    return bool(settings.JAVA_SERVER_PORT) and not settings.USEPRAKTOMATTESTER and not settings.USESAFEDOCKER
+
+def request(command, directory, classpath, arguments, timeout):
+    """ Sends a request to the server. Returns [output, exitcode, timed_out, oom_ed, truncated] or None. """
+    if not available():
+        return None
+    lines = [command, "dir " + directory, "timeout %d" % timeout]
+    lines += ["cp " + entry for entry in classpath]
+    lines += ["arg " + argument for argument in arguments]
+    message = ("\n".join(lines) + "\n\n").encode('utf-8')
+    try:
+        connection = socket.create_connection(("127.0.0.1", settings.JAVA_SERVER_PORT), timeout=settings.JAVA_SERVER_QUEUE_TIMEOUT)
+    except OSError as e:
+        logger.warning("Java server not available, falling back to a new JVM: %s", e)
+        return None
+    chunks = []
+    size = 0
+    with connection:
+        try:
+            # sent once one of the threads of the server handles the connection
+            ready = read_line(connection)
+        except OSError as e:
+            logger.warning("Java server busy, falling back to a new JVM: %s", e)
+            return None
+        if ready != b"ready":
+            # the server is restarting
+            return None
+        try:
+            connection.settimeout(timeout + settings.TEST_KILL_GRACE_PERIOD + 5)
+            connection.sendall(message)
+            while True:
+                chunk = connection.recv(65536)
+                if not chunk:
+                    break
+                if size < settings.TEST_MAXOUTPUTSIZE * 1024:
+                    chunks.append(chunk)
+                size += len(chunk)
+        except OSError as e:
+            # The request may still be processed, so a new JVM must not work in the same sandbox
+            logger.warning("Java server did not answer: %s", e)
+            return ["Java server: no answer within the time limit", 1, True, False, False]
+    (status, _, output) = b"".join(chunks).partition(b"\n")
+    if not status:
+        # The server died while handling the request, it does not work in the sandbox any more
+        return None
+    output = output.decode('utf-8', errors='replace')
+    truncated = size > settings.TEST_MAXOUTPUTSIZE * 1024
+    if status == b"timeout":
+        return [output, 1, True, False, truncated]
+    if status == b"oom":
+        return [output, 1, False, True, truncated]
+    return [output, int(status), False, False, truncated]
+
+def read_line(connection):
+    """ Reads a line (without the newline) byte by byte, so nothing after it is consumed. """
+    line = b""
+    while not line.endswith(b"\n"):
+        byte = connection.recv(1)
+        if not byte:
+            break
+        line += byte
+    return line.rstrip(b"\n")
+
+def absolute_classpath(directory, classpath):
+    return [os.path.join(directory, entry) for entry in classpath]
+
+def compile_java(directory, classpath, flags, filenames, timeout):
+    """ Compiles the files with javac in the directory. Relative paths in the classpath and the filenames are relative to it. """
+    return request("COMPILE", directory, absolute_classpath(directory, classpath), flags + [os.path.join(directory, filename) for filename in filenames], timeout)
+
+def run_junit(directory, classpath, junit_version, class_name, timeout):
+    """ Runs the JUnit test class_name with JUnit 3 or 4 (junit_version being "junit3" or "junit4"). """
+    return request(junit_version.upper(), directory, absolute_classpath(directory, classpath), [class_name], timeout)
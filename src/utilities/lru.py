@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from collections import OrderedDict
+
+class LRUCache:
+    """ A thread-safe cache, which drops the least recently used values as soon as the total
+    size of its values (as computed by sizeof) exceeds max_size. """
+
+    def __init__(self, max_size, sizeof=len):
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.size = 0
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._values:
+                return default
+            self._values.move_to_end(key)
+            return self._values[key]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        if size > self.max_size:
+            return
+        with self._lock:
+            if key in self._values:
+                self.size -= self.sizeof(self._values.pop(key))
+            self._values[key] = value
+            self.size += size
+            while self.size > self.max_size:
+                (_, dropped) = self._values.popitem(last=False)
+                self.size -= self.sizeof(dropped)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._values)
@@ -0,0 +1,48 @@
+"""
+Management utility to send the mails in the outbox.
+"""
+
+import signal
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from utilities.models import OutgoingMail, send_outbox
+
+class Command(BaseCommand):
+    help = 'Send the mails in the outbox. Several workers may run at once.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', dest='once', default=False,
+                            help='Exit as soon as no mail is due.')
+        parser.add_argument('--sleep', type=float, dest='sleep', default=5,
+                            help='Seconds to wait before polling the outbox again.')
+        parser.add_argument('--stale-after', type=int, dest='stale_after', default=settings.MAIL_OUTBOX_STALE_AFTER,
+                            help='Seconds after which a mail being sent is assumed to belong to a dead worker and is queued again.')
+
+    def handle(self, *args, **options):
+        verbosity = int(options.get('verbosity', 1))
+        stale_after = timedelta(seconds=options['stale_after'])
+        self.stopping = False
+
+        def stop(signum, frame):
+            # finish the current batch, then exit
+            self.stopping = True
+        previous_handlers = [(signum, signal.signal(signum, stop)) for signum in (signal.SIGTERM, signal.SIGINT)]
+
+        try:
+            while not self.stopping:
+                close_old_connections()
+                OutgoingMail.requeue_stale(stale_after)
+                sent = send_outbox()
+                if verbosity >= 1 and sent:
+                    self.stdout.write("Sent %d mails\n" % sent)
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        finally:
+            for signum, handler in previous_handlers:
+                signal.signal(signum, handler)
@@ -0,0 +1,34 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutgoingMail',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.TextField()),
+                ('body', models.TextField()),
+                ('from_email', models.CharField(blank=True, help_text='Empty for settings.DEFAULT_FROM_EMAIL.', max_length=254)),
+                ('to', models.TextField(help_text='One address per line.')),
+                ('bcc', models.TextField(blank=True, help_text='One address per line.')),
+                ('headers', models.TextField(blank=True, help_text='Additional headers, as JSON object.')),
+                ('status', models.CharField(choices=[('P', 'Pending'), ('S', 'Sending'), ('D', 'Sent'), ('F', 'Failed')], default='P', max_length=1)),
+                ('attempts', models.IntegerField(default=0, help_text='Number of times sending this mail was tried.')),
+                ('error', models.TextField(blank=True, help_text='Traceback of the last failed attempt.')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('sent', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['created', 'id'],
+            },
+        ),
+    ]
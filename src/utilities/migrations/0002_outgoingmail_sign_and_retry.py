@@ -0,0 +1,28 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('utilities', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outgoingmail',
+            name='last_attempt',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='outgoingmail',
+            name='next_attempt',
+            field=models.DateTimeField(blank=True, help_text='A failed mail is not sent again before this time.', null=True),
+        ),
+        migrations.AddField(
+            model_name='outgoingmail',
+            name='sign',
+            field=models.BooleanField(default=False, help_text='Sign the mail with S/MIME when it is sent.'),
+        ),
+    ]
@@ -0,0 +1,214 @@
+import json
+import logging
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+from django.db import models, connection as db_connection, transaction
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils.translation import ugettext_lazy as _
+
+from utilities import smime
+
+logger = logging.getLogger(__name__)
+
+class OutgoingMail(models.Model):
+    """ An email waiting in the outbox.
+
+    Mails are queued with queue_mails and sent by the send_outbox management
+    command if settings.USE_MAIL_WORKER is enabled, otherwise by a background
+    thread of the process which queued them. Both send all pending mails over
+    one SMTP connection. Failed mails are tried again after a growing delay,
+    up to settings.MAIL_OUTBOX_MAX_ATTEMPTS times, and mails whose sender died
+    are queued again after settings.MAIL_OUTBOX_STALE_AFTER seconds. The
+    background thread sets a timer for this, which is lost when the process
+    exits, so without the worker send_outbox --once has to run periodically. """
+
+    PENDING = 'P'
+    SENDING = 'S'
+    SENT = 'D'
+    FAILED = 'F'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+
+    subject = models.TextField()
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True, help_text=_('Empty for settings.DEFAULT_FROM_EMAIL.'))
+    to = models.TextField(help_text=_('One address per line.'))
+    bcc = models.TextField(blank=True, help_text=_('One address per line.'))
+    headers = models.TextField(blank=True, help_text=_('Additional headers, as JSON object.'))
+    sign = models.BooleanField(default=False, help_text=_('Sign the mail with S/MIME when it is sent.'))
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0, help_text=_('Number of times sending this mail was tried.'))
+    error = models.TextField(blank=True, help_text=_('Traceback of the last failed attempt.'))
+    created = models.DateTimeField(auto_now_add=True)
+    last_attempt = models.DateTimeField(null=True, blank=True)
+    next_attempt = models.DateTimeField(null=True, blank=True, help_text=_('A failed mail is not sent again before this time.'))
+    sent = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created', 'id']
+
+    def __str__(self):
+        return "%s (%s)" % (self.subject, self.get_status_display())
+
+    @classmethod
+    def from_message(cls, message, sign=False):
+        """ An unsaved outbox entry for the EmailMessage. """
+        return cls(subject=message.subject, body=message.body, from_email=message.from_email or '',
+                   to="\n".join(message.to), bcc="\n".join(message.bcc),
+                   headers=json.dumps(message.extra_headers) if message.extra_headers else '', sign=sign)
+
+    @classmethod
+    def pending(cls):
+        """ The mails which are due to be sent. """
+        return cls.objects.filter(status=cls.PENDING).filter(models.Q(next_attempt=None) | models.Q(next_attempt__lte=datetime.now()))
+
+    @classmethod
+    def requeue_stale(cls, max_age):
+        """ Returns mails to the outbox whose sender did not finish them within max_age (a timedelta), e.g. because it was killed. """
+        return cls.objects.filter(status=cls.SENDING, last_attempt__lt=datetime.now() - max_age).update(status=cls.PENDING, next_attempt=None)
+
+    @classmethod
+    def next_due(cls, max_age):
+        """ The time at which the next failed mail is due to be sent again, or the next mail being sent is stale (see requeue_stale), or None. """
+        retry = cls.objects.filter(status=cls.PENDING).aggregate(due=models.Min('next_attempt'))['due']
+        oldest_sending = cls.objects.filter(status=cls.SENDING).aggregate(last_attempt=models.Min('last_attempt'))['last_attempt']
+        stale = oldest_sending + max_age if oldest_sending is not None else None
+        times = [time for time in (retry, stale) if time is not None]
+        return min(times) if times else None
+
+    def message(self, connection=None):
+        headers = json.loads(self.headers) if self.headers else None
+        if self.sign:
+            return smime.SignedMessage(self.subject, smime.sign(self.body), self.from_email or None, self.to.splitlines(), self.bcc.splitlines(),
+                                       connection=connection, headers=headers)
+        return EmailMessage(self.subject, self.body, self.from_email or None, self.to.splitlines(), self.bcc.splitlines(),
+                            connection=connection, headers=headers)
+
+    def claim(self):
+        """ Marks this mail as being sent. Returns False if another process was faster. """
+        now = datetime.now()
+        claimed = OutgoingMail.objects.filter(pk=self.pk, status=self.PENDING) \
+                                      .update(status=self.SENDING, last_attempt=now, attempts=models.F('attempts') + 1)
+        if claimed:
+            self.status = self.SENDING
+            self.last_attempt = now
+            self.attempts += 1
+        return bool(claimed)
+
+    def send(self, connection):
+        """ Sends a claimed mail over the (open) connection and records the outcome. """
+        assert self.status == self.SENDING
+        try:
+            connection.send_messages([self.message(connection)])
+        except Exception:
+            logger.warning("Could not send mail %d", self.pk, exc_info=True)
+            self.error = traceback.format_exc()
+            if self.attempts < settings.MAIL_OUTBOX_MAX_ATTEMPTS:
+                # one minute after the first attempt, then twice as long after every attempt
+                self.status = self.PENDING
+                self.next_attempt = datetime.now() + timedelta(minutes=2 ** (self.attempts - 1))
+            else:
+                self.status = self.FAILED
+            # The connection may be broken, it is opened again for the next mail
+            connection.close()
+        else:
+            self.error = ''
+            self.status = self.SENT
+            self.sent = datetime.now()
+        self.save(update_fields=['status', 'error', 'next_attempt', 'sent'])
+        return self.status == self.SENT
+
+def queue_mails(messages, sign=False):
+    """ Puts the EmailMessages into the outbox. They are sent once the current transaction is committed.
+    With sign, they are signed with S/MIME by the sender. """
+    OutgoingMail.objects.bulk_create([OutgoingMail.from_message(message, sign) for message in messages])
+    if settings.USE_MAIL_WORKER:
+        return
+    if settings.MAIL_OUTBOX_BACKGROUND_SENDER:
+        transaction.on_commit(send_outbox_in_background)
+    else:
+        transaction.on_commit(send_outbox)
+
+def send_outbox(batch_size=100):
+    """ Sends the pending mails which are due, reusing one SMTP connection. Returns the number of mails sent. """
+    sent = 0
+    connection = get_connection()
+    try:
+        while True:
+            mails = list(OutgoingMail.pending()[:batch_size])
+            if not mails:
+                return sent
+            for mail in mails:
+                if mail.claim() and mail.send(connection):
+                    sent += 1
+    finally:
+        connection.close()
+
+_sender_lock = threading.Lock()
+_sender = None
+_sender_again = False
+_retry_timer = None
+_retry_at = None
+
+def send_outbox_in_background():
+    """ Sends the pending mails in a background thread. If it is running already, it goes on until the outbox is empty. """
+    global _sender, _sender_again
+    with _sender_lock:
+        if _sender is not None:
+            _sender_again = True
+            return
+        _sender = threading.Thread(target=run_sender, name="outbox sender", daemon=True)
+        _sender.start()
+
+def run_sender():
+    global _sender, _sender_again
+    try:
+        while True:
+            due = send_due_mails()
+            with _sender_lock:
+                if not _sender_again:
+                    _sender = None
+                    schedule_sender(due)
+                    return
+                _sender_again = False
+    finally:
+        db_connection.close()
+
+def send_due_mails():
+    """ Queues the stale mails again and sends the pending mails which are due. Returns when the sender has to run again, or None. """
+    stale_after = timedelta(seconds=settings.MAIL_OUTBOX_STALE_AFTER)
+    try:
+        OutgoingMail.requeue_stale(stale_after)
+        send_outbox()
+        return OutgoingMail.next_due(stale_after)
+    except Exception:
+        logger.exception("Sending the outbox failed")
+        return datetime.now() + timedelta(minutes=1)
+
+def schedule_sender(due):
+    """ Starts the background sender at the time due, unless it is started earlier already. Requires _sender_lock. """
+    global _retry_timer, _retry_at
+    if due is None:
+        return
+    if _retry_timer is not None:
+        if _retry_at <= due:
+            return
+        _retry_timer.cancel()
+    _retry_at = due
+    _retry_timer = threading.Timer(max(0, (due - datetime.now()).total_seconds()), retry_sender)
+    _retry_timer.daemon = True
+    _retry_timer.start()
+
+def retry_sender():
+    global _retry_timer, _retry_at
+    with _sender_lock:
+        _retry_timer = None
+        _retry_at = None
+    send_outbox_in_background()
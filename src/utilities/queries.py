@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+"""
+Counting the database queries of bulk operations, to report them to the user.
+"""
+
+from django.db import connection
+
+class QueryCounter:
+    """ Counts the queries executed on the default database within the with block. """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        return self._wrapper.__exit__(*args)
+
+def chunks(items, size=500):
+    """ Splits the items into lists of at most size items, e.g. to stay below the limit of query parameters. """
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
@@ -7,11 +7,169 @@ import subprocess
 import signal
 import subprocess
 import resource
+import selectors
+import logging
 
 from django.conf import settings
 
-def execute_arglist(args, working_directory, environment_variables={}, timeout=None, maxmem=None, fileseeklimit=None, extradirs=[], unsafe=False, error_to_output=True, filenumberlimit=128):
-    """ Wrapper to execute Commands with the praktomat testuser. Excpects Command as list of arguments, the first being the execeutable to run. """
+logger = logging.getLogger(__name__)
+
+class BoundedOutput:
+    """ Collects the output of a process, but keeps only its beginning and its end, at most limit bytes in total. """
+
+    def __init__(self, limit):
+        self._head_limit = limit // 2
+        self._tail_limit = limit - self._head_limit
+        self._head = bytearray()
+        self._tail = bytearray()
+        self.dropped = 0
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        room = self._head_limit - len(self._head)
+        if room > 0:
+            self._head.extend(data[:room])
+            data = data[room:]
+        self._tail.extend(data)
+        excess = len(self._tail) - self._tail_limit
+        if excess > 0:
+            del self._tail[:excess]
+            self.dropped += excess
+
+    def truncated(self):
+        return self.dropped > 0
+
+    def getvalue(self):
+        if self.truncated():
+            return bytes(self._head) + ("\n...\n[%d bytes of output omitted]\n...\n" % self.dropped).encode('ascii') + bytes(self._tail)
+        return bytes(self._head + self._tail)
+
+def read_output(buffers, deadline):
+    """ Reads from the pipes into the buffers ({file descriptor: BoundedOutput}) until all pipes are closed.
+    Returns False if the deadline (as time.time()) passed before. """
+    # unlike select.select, selectors also handle file descriptors >= FD_SETSIZE of long running processes
+    with selectors.DefaultSelector() as selector:
+        for fd in buffers:
+            selector.register(fd, selectors.EVENT_READ)
+        open_fds = len(buffers)
+        while open_fds:
+            wait = None
+            if deadline is not None:
+                wait = deadline - time.time()
+                if wait <= 0:
+                    return False
+            for key, _ in selector.select(wait):
+                data = os.read(key.fd, 65536)
+                if data:
+                    buffers[key.fd].write(data)
+                else:
+                    selector.unregister(key.fd)
+                    open_fds -= 1
+    return True
+
+def session_processes(sid):
+    """ The pids of the living processes in the session sid, as listed in /proc. """
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(os.path.join('/proc', entry, 'stat')) as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # the command name in parentheses may contain spaces, the state and the session id follow it
+        fields = stat[stat.rindex(')') + 2:].split()
+        if int(fields[3]) == sid and fields[0] != 'Z':
+            pids.append(int(entry))
+    return pids
+
+def signal_session(process, sig, sudo_prefix):
+    """ Sends the signal to all processes in the session of the process (which is its session leader),
+    including those which moved to a process group of their own.
+    Falls back to pkill (with sudo_prefix, if given) if the processes belong to another user. """
+    # a process may have moved to a group of its own, and the group may be gone already
+    for pid in session_processes(process.pid):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+        except PermissionError:
+            subprocess.call(sudo_prefix + ["pkill", "-%d" % sig, "-s", str(process.pid)])
+            return
+
+class ResourceUsage(dict):
+    """ Resources used by an executed process and its children:
+    user_time and system_time (in milliseconds), max_rss (in kbytes), page_faults, output_size (in bytes),
+    if it timed out, kill_time (milliseconds from the timeout until it was gone), and the flags timed_out, oom_ed and truncated
+    as returned by execute_arglist. """
+
+    def __init__(self):
+        super(ResourceUsage, self).__init__(user_time=0, system_time=0, max_rss=0, page_faults=0, output_size=0, kill_time=None,
+                                            timed_out=False, oom_ed=False, truncated=False)
+
+    def add_rusage(self, rusage):
+        self['user_time'] += int(rusage.ru_utime * 1000)
+        self['system_time'] += int(rusage.ru_stime * 1000)
+        self['max_rss'] = max(self['max_rss'], rusage.ru_maxrss)
+        self['page_faults'] += rusage.ru_majflt + rusage.ru_minflt
+
+def wait_process(process, timeout, usage):
+    """ Like process.wait(timeout), but reaps the process with os.wait4 to add its resource usage
+    (including that of its waited for children) to usage. """
+    if process.returncode is not None:
+        return process.returncode
+    deadline = None if timeout is None else time.time() + timeout
+    delay = 0.0005
+    while True:
+        pid, status, rusage = os.wait4(process.pid, 0 if deadline is None else os.WNOHANG)
+        if pid == process.pid:
+            usage.add_rusage(rusage)
+            if os.WIFSIGNALED(status):
+                process.returncode = -os.WTERMSIG(status)
+            else:
+                process.returncode = os.WEXITSTATUS(status)
+            return process.returncode
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise subprocess.TimeoutExpired(process.args, timeout)
+        delay = min(delay * 2, remaining, .05)
+        time.sleep(delay)
+
+def session_exists(sid):
+    return bool(session_processes(sid))
+
+def wait_for_session(process, timeout, usage):
+    """ Waits until the process has terminated and no process of its session is left, at most timeout seconds.
+    Returns whether the session has exited. """
+    deadline = time.time() + timeout
+    try:
+        wait_process(process, timeout, usage)
+    except subprocess.TimeoutExpired:
+        return False
+    while session_exists(process.pid):
+        if time.time() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+def kill_session(process, sudo_prefix, grace_period, usage):
+    """ Terminates the process and all its children: Sends SIGTERM, and SIGKILL if they did not exit within the grace period.
+    Returns the number of seconds it took. """
+    start = time.time()
+    signal_session(process, signal.SIGTERM, sudo_prefix)
+    if not wait_for_session(process, grace_period, usage):
+        signal_session(process, signal.SIGKILL, sudo_prefix)
+        wait_for_session(process, grace_period, usage)
+    elapsed = time.time() - start
+    logger.info("Session %d %s %.3f seconds after the timeout", process.pid, "exited" if process.returncode is not None else "did not exit", elapsed)
+    return elapsed
+
+def execute_arglist(args, working_directory, environment_variables={}, timeout=None, maxmem=None, fileseeklimit=None, extradirs=[], unsafe=False, error_to_output=True, filenumberlimit=128, maxoutputsize=None):
+    """ Wrapper to execute Commands with the praktomat testuser. Excpects Command as list of arguments, the first being the execeutable to run.
+    Of the output (and error) only the first and last maxoutputsize/2 kbytes are kept (default: settings.TEST_MAXOUTPUTSIZE).
+    Returns [output, error, exitcode, timed_out, oom_ed, truncated, usage], usage being a ResourceUsage. """
     assert isinstance(args, list)
 
 
@@ -53,8 +211,8 @@ def execute_arglist(args, working_directory, environment_variables={}, timeout=N
         command = []
     command += args[:]
 
-
-    # TODO: Dont even read in output longer than fileseeklimit. This might be most conveniently done by supplying a file like object instead of PIPE
+    if maxoutputsize is None:
+        maxoutputsize = settings.TEST_MAXOUTPUTSIZE
 
     def prepare_subprocess():
         # create a new session for the spawned subprocess using os.setsid,
@@ -78,22 +236,31 @@ def execute_arglist(args, working_directory, environment_variables={}, timeout=N
         env=environment,
         preexec_fn=prepare_subprocess)
 
+    output = BoundedOutput(maxoutputsize * 1024)
+    error = None if error_to_output else BoundedOutput(maxoutputsize * 1024)
+    buffers = {process.stdout.fileno(): output}
+    if error is not None:
+        buffers[process.stderr.fileno()] = error
+    deadline = time.time() + timeout if timeout is not None else None
+
+    usage = ResourceUsage()
     timed_out = False
     oom_ed = False
     try:
-        [output, error] = process.communicate(timeout=timeout)
+        if not read_output(buffers, deadline):
+            raise subprocess.TimeoutExpired(command, timeout)
+        wait_process(process, None if deadline is None else max(deadline - time.time(), 0), usage)
     except subprocess.TimeoutExpired:
         timed_out = True
-        term_cmd = ["pkill", "-TERM", "-s", str(process.pid)]
-        kill_cmd = ["pkill", "-KILL", "-s", str(process.pid)]
-        if not unsafe and settings.USEPRAKTOMATTESTER:
-            term_cmd = sudo_prefix + term_cmd
-            kill_cmd = sudo_prefix + kill_cmd
-        subprocess.call(term_cmd)
-        time.sleep(5)
-        subprocess.call(kill_cmd)
-        [output, error] = process.communicate()
-        #killpg(process.pid, signal.SIGKILL)
+        kill_time = kill_session(process, sudo_prefix if not unsafe and settings.USEPRAKTOMATTESTER else [], settings.TEST_KILL_GRACE_PERIOD, usage)
+        usage['kill_time'] = int(kill_time * 1000)
+        # Collect what is left in the pipes, unless some escaped child still holds them open
+        read_output(buffers, time.time() + settings.TEST_KILL_GRACE_PERIOD)
+        wait_process(process, None, usage)
+    finally:
+        process.stdout.close()
+        if process.stderr is not None:
+            process.stderr.close()
 
     if settings.USESAFEDOCKER and process.returncode == 23: #magic value
         timed_out = True
@@ -101,4 +268,7 @@ def execute_arglist(args, working_directory, environment_variables={}, timeout=N
     if settings.USESAFEDOCKER and process.returncode == 24: #magic value
         oom_ed = True
 
-    return [output.decode('utf-8'), error, process.returncode, timed_out, oom_ed]
+    truncated = output.truncated() or (error is not None and error.truncated())
+    usage['output_size'] = output.size + (error.size if error is not None else 0)
+    usage.update(timed_out=timed_out, oom_ed=oom_ed, truncated=truncated)
+    return [output.getvalue().decode('utf-8', errors='replace'), error and error.getvalue(), process.returncode, timed_out, oom_ed, truncated, usage]
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+"""
+S/MIME signed mails, signed with settings.CERTIFICATE and settings.PRIVATE_KEY by openssl.
+"""
+
+import re
+import tempfile
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+
+from utilities.safeexec import execute_arglist
+
+class SigningError(Exception):
+    pass
+
+def sign(text):
+    """ Returns the S/MIME signed mail (headers and body) with the text as its body. """
+    with tempfile.NamedTemporaryFile(mode='w+') as tmp:
+        tmp.write("Content-Type: text/plain; charset=utf-8\n")
+        tmp.write("Content-Transfer-Encoding: quoted-printable\n\n")
+        tmp.write(text)
+        tmp.flush()
+        [signed_mail, error, exitcode, __, __, __, __]  = execute_arglist(["openssl", "smime", "-sign", "-signer", settings.CERTIFICATE, "-inkey", settings.PRIVATE_KEY, "-in", tmp.name], ".", unsafe=True)
+    if exitcode != 0:
+        raise SigningError("openssl smime failed (%s): %s" % (exitcode, signed_mail))
+    return signed_mail
+
+class SignedMessage(EmailMessage):
+    """
+    Special EmailMessage to combine headers set by OpenSSL S/MIME and django sendmail.
+    The body is a mail signed by sign().
+    """
+    def __init__(self, subject='', body='', from_email=None, to=None, bcc=None,
+                 connection=None, attachments=None, headers=None, cc=None,
+                 reply_to=None):
+        super(SignedMessage, self).__init__(
+            subject, body, from_email, to, bcc, connection, attachments,
+            headers, cc, reply_to,
+        )
+
+    def message(self):
+        message = super(SignedMessage, self).message()
+        return MessageWrapper(message)
+
+class MessageWrapper():
+    def __init__(self, message):
+        self.message = message
+
+    # Django supplies Strings as "linesep" (and not Bytes)
+    def as_bytes(self, linesep='\n'):
+        # byte version of linesep
+        linesep_bytes = linesep.encode('ascii')
+        # Construct the message with the full S/MIME mail as body
+        msg = self.message.as_bytes(linesep=linesep)
+        # Now, use the S/MIME headers as headers for the email
+        lines = msg.split(linesep_bytes)
+        if (lines[0] != b'Content-Type: text/plain; charset="utf-8"' or
+                lines[1] != b'MIME-Version: 1.0' or
+                not re.match(b'Content-Transfer-Encoding: (7|8)bit', lines[2])):
+            raise AssertionError('Assumptions on message format violated')
+        i = lines.index(b'')
+        j = lines[i+1:].index(b'') + i + 1
+        transformed = lines[i+1:j] + lines[3:i] + lines[j+1:]
+        return linesep_bytes.join(transformed)
+
+    def get_charset(self):
+        return None
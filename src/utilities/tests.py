@@ -0,0 +1,298 @@
+# -*- encoding: utf8
+
+import os
+import sys
+import time
+import struct
+import socket
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+from django.test.utils import override_settings
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.core.management import call_command
+from django.db import transaction
+from io import StringIO
+
+from utilities.TestSuite import TestCase
+from utilities.safeexec import execute_arglist, BoundedOutput
+from utilities import javaserver, classfile
+from utilities.lru import LRUCache
+from utilities.models import OutgoingMail, queue_mails, send_outbox, send_due_mails
+
+
+class TestSafeExec(TestCase):
+    def test_bounded_output(self):
+        output = BoundedOutput(10)
+        output.write(b"abc")
+        self.assertFalse(output.truncated())
+        self.assertEqual(output.getvalue(), b"abc")
+        output.write(b"defghijklmnop")
+        self.assertTrue(output.truncated())
+        self.assertEqual(output.dropped, 6)
+        value = output.getvalue()
+        self.assertTrue(value.startswith(b"abcde"))
+        self.assertTrue(value.endswith(b"lmnop"))
+
+    def test_execute_arglist(self):
+        [output, error, exitcode, timed_out, oom_ed, truncated, usage] = execute_arglist([sys.executable, "-c", "print('hello')"], tempfile.gettempdir(), unsafe=True)
+        self.assertEqual(output, "hello\n")
+        self.assertEqual(exitcode, 0)
+        self.assertFalse(timed_out)
+        self.assertFalse(truncated)
+        self.assertGreater(usage['max_rss'], 0)
+        self.assertEqual(usage['output_size'], 6)
+        self.assertIsNone(usage['kill_time'])
+
+    def test_execute_arglist_long_output(self):
+        [output, error, exitcode, timed_out, oom_ed, truncated, usage] = execute_arglist([sys.executable, "-c", "import sys\nfor i in range(100000): sys.stdout.write('x' * 99 + '\\n')"], tempfile.gettempdir(), unsafe=True, maxoutputsize=16)
+        self.assertEqual(exitcode, 0)
+        self.assertTrue(truncated)
+        self.assertLess(len(output), 17 * 1024)
+
+    def test_execute_arglist_timeout(self):
+        start = time.time()
+        # ignores SIGTERM, so it has to be killed
+        [output, error, exitcode, timed_out, oom_ed, truncated, usage] = execute_arglist([sys.executable, "-c", "import signal, time\nsignal.signal(signal.SIGTERM, signal.SIG_IGN)\nprint('started', flush=True)\ntime.sleep(30)"], tempfile.gettempdir(), unsafe=True, timeout=1)
+        self.assertTrue(timed_out)
+        self.assertEqual(output, "started\n")
+        self.assertIsNotNone(usage['kill_time'])
+        self.assertLess(time.time() - start, 5)
+
+    def test_execute_arglist_timeout_process_group(self):
+        # the child leaves the process group, but not the session
+        [output, error, exitcode, timed_out, oom_ed, truncated, usage] = execute_arglist([sys.executable, "-c", "import os, sys, time\nif os.fork() == 0:\n    os.setpgrp()\n    print(os.getpid(), flush=True)\n    sys.stdout.close()\n    time.sleep(30)\ntime.sleep(30)"], tempfile.gettempdir(), unsafe=True, timeout=1)
+        self.assertTrue(timed_out)
+        child = int(output.split()[0])
+        self.assertFalse(os.path.exists("/proc/%d" % child) and open("/proc/%d/stat" % child).read().split(") ")[1][0] != 'Z')
+
+
+class TestJavaServer(TestCase):
+    def serve(self, response):
+        """ Answers one request like JavaServer.java would, returns the port and the received request. """
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen(1)
+        received = []
+
+        def answer():
+            (connection, _) = server.accept()
+            connection.sendall(b"ready\n")
+            data = b""
+            while not data.endswith(b"\n\n"):
+                data += connection.recv(4096)
+            received.append(data.decode('utf-8'))
+            connection.sendall(response)
+            connection.close()
+            server.close()
+        thread = threading.Thread(target=answer)
+        thread.start()
+        self.addCleanup(thread.join)
+        return (server.getsockname()[1], received)
+
+    def test_compile(self):
+        (port, received) = self.serve(b"1\nFoo.java:1: error: ';' expected\n")
+        with override_settings(JAVA_SERVER_PORT=port):
+            [output, exitcode, timed_out, oom_ed, truncated] = javaserver.compile_java("/sandbox", [".", "/usr/share/java/junit.jar"], ["-encoding", "utf-8"], ["Foo.java"], 10)
+        self.assertEqual(exitcode, 1)
+        self.assertFalse(timed_out)
+        self.assertEqual(output, "Foo.java:1: error: ';' expected\n")
+        self.assertEqual(received[0], "COMPILE\ndir /sandbox\ntimeout 10\ncp /sandbox/.\ncp /usr/share/java/junit.jar\narg -encoding\narg utf-8\narg /sandbox/Foo.java\n\n")
+
+    def test_junit_timeout(self):
+        (port, received) = self.serve(b"timeout\n.")
+        with override_settings(JAVA_SERVER_PORT=port):
+            [output, exitcode, timed_out, oom_ed, truncated] = javaserver.run_junit("/sandbox", ["."], "junit4", "FooTest", 10)
+        self.assertTrue(timed_out)
+        self.assertTrue(received[0].startswith("JUNIT4\n"))
+
+    def test_junit_out_of_memory(self):
+        (port, received) = self.serve(b"oom\njava.lang.OutOfMemoryError: Java heap space\n")
+        with override_settings(JAVA_SERVER_PORT=port):
+            [output, exitcode, timed_out, oom_ed, truncated] = javaserver.run_junit("/sandbox", ["."], "junit4", "FooTest", 10)
+        self.assertTrue(oom_ed)
+        self.assertFalse(timed_out)
+        self.assertEqual(exitcode, 1)
+
+    def test_no_answer(self):
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen(1)
+        self.addCleanup(server.close)
+        def take():
+            (connection, _) = server.accept()
+            connection.sendall(b"ready\n")
+            self.addCleanup(connection.close)
+        thread = threading.Thread(target=take)
+        thread.start()
+        # the client waits for timeout + TEST_KILL_GRACE_PERIOD + 5 seconds after the server took the request
+        with override_settings(JAVA_SERVER_PORT=server.getsockname()[1], TEST_KILL_GRACE_PERIOD=-4):
+            response = javaserver.compile_java("/sandbox", ["."], [], ["Foo.java"], 0)
+        thread.join()
+        # the server may still be compiling, so the caller must not fall back to javac
+        self.assertIsNotNone(response)
+        self.assertTrue(response[2])
+
+    def test_busy(self):
+        # the server does not take the connection, all of its threads are busy
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen(1)
+        self.addCleanup(server.close)
+        with override_settings(JAVA_SERVER_PORT=server.getsockname()[1], JAVA_SERVER_QUEUE_TIMEOUT=0.5):
+            self.assertIsNone(javaserver.compile_java("/sandbox", ["."], [], ["Foo.java"], 10))
+
+    def test_isolation(self):
+        (port, received) = self.serve(b"0\n")
+        for isolation in [{'USEPRAKTOMATTESTER': True}, {'USESAFEDOCKER': True}]:
+            with override_settings(JAVA_SERVER_PORT=port, **isolation):
+                self.assertIsNone(javaserver.run_junit("/sandbox", ["."], "junit4", "FooTest", 10))
+        self.assertEqual(received, [])
+        # let the server thread finish
+        with override_settings(JAVA_SERVER_PORT=port):
+            javaserver.run_junit("/sandbox", ["."], "junit4", "FooTest", 10)
+
+    def test_fallback(self):
+        self.assertIsNone(javaserver.run_junit("/sandbox", ["."], "junit4", "FooTest", 10))
+        # nothing listens on the port
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        port = server.getsockname()[1]
+        server.close()
+        with override_settings(JAVA_SERVER_PORT=port):
+            self.assertIsNone(javaserver.run_junit("/sandbox", ["."], "junit4", "FooTest", 10))
+
+
+def class_file_bytes(name, methods):
+    """ Assembles a class file for the class name with methods [(access_flags, name, descriptor)...]. """
+    pool = []
+    def utf8(value):
+        encoded = value.encode('utf-8')
+        pool.append(struct.pack(">BH", 1, len(encoded)) + encoded)
+        return len(pool)
+    pool.append(struct.pack(">BQ", 5, 42))    # a Long, taking up two entries
+    pool.append(b"")
+    this_class = utf8(name.replace(".", "/"))
+    pool.append(struct.pack(">BH", 7, this_class))
+    this_class = len(pool)
+    members = b""
+    for (access_flags, method_name, descriptor) in methods:
+        code = utf8("Code")
+        members += struct.pack(">HHHH", access_flags, utf8(method_name), utf8(descriptor), 1) + struct.pack(">HI", code, 3) + b"abc"
+    return (struct.pack(">IHHH", 0xCAFEBABE, 0, 52, len(pool) + 1) + b"".join(pool)
+            + struct.pack(">HHHH", 0x21, this_class, 0, 0) + struct.pack(">H", 0)
+            + struct.pack(">H", len(methods)) + members + struct.pack(">H", 0))
+
+class TestClassFile(TestCase):
+    def test_main_method(self):
+        parsed = classfile.parse(class_file_bytes("de.praktomat.Main", [(0x0001, "<init>", "()V"), (0x0009, "main", "([Ljava/lang/String;)V")]))
+        self.assertEqual(parsed.name, "de.praktomat.Main")
+        self.assertEqual(len(parsed.methods), 2)
+        self.assertTrue(parsed.has_main_method())
+
+    def test_no_main_method(self):
+        # not static
+        parsed = classfile.parse(class_file_bytes("Main", [(0x0001, "main", "([Ljava/lang/String;)V")]))
+        self.assertFalse(parsed.has_main_method())
+        parsed = classfile.parse(class_file_bytes("Main", [(0x0009, "main", "()V")]))
+        self.assertFalse(parsed.has_main_method())
+
+    def test_invalid(self):
+        self.assertRaises(classfile.ClassFormatError, classfile.parse, b"no class file")
+        self.assertRaises(classfile.ClassFormatError, classfile.parse, class_file_bytes("Main", [])[:20])
+
+
+class TestLRUCache(TestCase):
+    def test_size_limit(self):
+        cache = LRUCache(10)
+        cache.put("a", "12345")
+        cache.put("b", "1234")
+        self.assertEqual(cache.get("a"), "12345")
+        # drops b, which was used less recently than a
+        cache.put("c", "12")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "12345")
+        self.assertEqual(cache.size, 7)
+        # too big to be cached at all
+        cache.put("d", "x" * 11)
+        self.assertIsNone(cache.get("d"))
+        self.assertEqual(len(cache), 2)
+
+
+class TestOutbox(TestCase):
+    def test_queue_mails(self):
+        queue_mails([EmailMessage("Subject", "Body", None, ["user@praktomat.com"], ["trainer@praktomat.com"], headers={'Reply-To': 'tutor@praktomat.com'}),
+                     EmailMessage("Other", "Body", None, ["other@praktomat.com"])])
+        self.run_commit_hooks()
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].bcc, ["trainer@praktomat.com"])
+        self.assertEqual(mail.outbox[0].extra_headers, {'Reply-To': 'tutor@praktomat.com'})
+        self.assertEqual(OutgoingMail.objects.filter(status=OutgoingMail.SENT).count(), 2)
+
+    def test_failed_mail(self):
+        with override_settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend', EMAIL_HOST='127.0.0.1', EMAIL_PORT=1):
+            queue_mails([EmailMessage("Subject", "Body", None, ["user@praktomat.com"])])
+            self.run_commit_hooks()
+        outgoing = OutgoingMail.objects.get()
+        self.assertEqual(outgoing.status, OutgoingMail.PENDING)
+        self.assertEqual(outgoing.attempts, 1)
+        self.assertIn("ConnectionRefusedError", outgoing.error)
+        # not due yet
+        self.assertEqual(send_outbox(), 0)
+
+        outgoing.next_attempt = None
+        outgoing.save()
+        call_command('send_outbox', once=True, stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(OutgoingMail.objects.get().status, OutgoingMail.SENT)
+
+    def test_retry_in_background(self):
+        with override_settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend', EMAIL_HOST='127.0.0.1', EMAIL_PORT=1):
+            queue_mails([EmailMessage("Subject", "Body", None, ["user@praktomat.com"])])
+            self.run_commit_hooks()
+        # the background sender runs again when the mail is due
+        self.assertEqual(send_due_mails(), OutgoingMail.objects.get().next_attempt)
+
+        OutgoingMail.objects.update(status=OutgoingMail.SENDING, last_attempt=datetime.now() - timedelta(minutes=5))
+        with override_settings(MAIL_OUTBOX_STALE_AFTER=600):
+            self.assertEqual(send_due_mails(), OutgoingMail.objects.get().last_attempt + timedelta(minutes=10))
+        with override_settings(MAIL_OUTBOX_STALE_AFTER=60):
+            self.assertIsNone(send_due_mails())
+        self.assertEqual(OutgoingMail.objects.get().status, OutgoingMail.SENT)
+
+    def test_rolled_back(self):
+        try:
+            with transaction.atomic():
+                queue_mails([EmailMessage("Subject", "Body", None, ["user@praktomat.com"])])
+                raise RuntimeError("rolled back")
+        except RuntimeError:
+            pass
+        self.run_commit_hooks()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(OutgoingMail.objects.exists())
+
+    def test_give_up(self):
+        with override_settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend', EMAIL_HOST='127.0.0.1', EMAIL_PORT=1, MAIL_OUTBOX_MAX_ATTEMPTS=1):
+            queue_mails([EmailMessage("Subject", "Body", None, ["user@praktomat.com"])])
+            self.run_commit_hooks()
+        self.assertEqual(OutgoingMail.objects.get().status, OutgoingMail.FAILED)
+
+    def test_signed_mail(self):
+        queue_mails([EmailMessage("Subject", "Body", None, ["user@praktomat.com"])], sign=True)
+        self.run_commit_hooks()
+        self.assertEqual(len(mail.outbox), 1)
+        message = mail.outbox[0].message().as_bytes()
+        self.assertIn(b"multipart/signed", message)
+        self.assertIn(b"Subject: Subject", message)
+
+    def test_worker(self):
+        with override_settings(USE_MAIL_WORKER=True):
+            queue_mails([EmailMessage("Subject", "Body", None, ["user@praktomat.com"])])
+            self.run_commit_hooks()
+        self.assertEqual(len(mail.outbox), 0)
+        output = StringIO()
+        call_command('send_outbox', once=True, stdout=output)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(output.getvalue(), "Sent 1 mails\n")